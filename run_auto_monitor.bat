@@ -11,9 +11,6 @@ cd /d %~dp0
 echo 【加载虚拟环境...】
 call .venv\Scripts\activate
 
-echo 【正在检查环境...】
-python tests\test_environment.py
-
 echo.
 echo 【正在运行主脚本...】
 python src\nju_electric_monitor_auto.py
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+低电量告警模块
+规则引擎支持电量阈值与预计可用天数阈值，带回差、去重、冷却时间和免打扰时段；
+通知通过可插拔的通道（SMTP、Webhook、桌面通知、文件）在后台线程中批量异步发送并自动重试
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import smtplib
+import logging
+import threading
+import subprocess
+import urllib.request
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.header import Header
+
+from safe_io import atomic_write
+from reading_store import DEFAULT_ROOM
+
+ALERT_STATE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'alert_state.json')
+
+# 支持的规则指标：从统计摘要中取值
+METRICS = {
+    "balance": lambda summary: summary.get("balance"),
+    "days_to_empty": lambda summary: (summary.get("forecast") or {}).get("days_to_empty"),
+}
+METRIC_NAMES = {"balance": "剩余电量", "days_to_empty": "预计可用天数"}
+METRIC_UNITS = {"balance": "度", "days_to_empty": "天"}
+
+
+class AlertRule:
+    """单条告警规则：指标低于below时触发，回升到clear_above以上时解除"""
+
+    def __init__(self, name, metric, below, clear_above=None, cooldown_minutes=360,
+                 severity="warning", notify_on_clear=True):
+        if metric not in METRICS:
+            raise ValueError(f"不支持的告警指标: {metric}")
+        self.name = name
+        self.metric = metric
+        self.below = float(below)
+        self.clear_above = float(clear_above) if clear_above is not None else self.below
+        self.cooldown = timedelta(minutes=cooldown_minutes)
+        self.severity = severity
+        self.notify_on_clear = notify_on_clear
+
+    @classmethod
+    def from_config(cls, item):
+        """从配置字典创建规则"""
+        return cls(
+            name=item.get("name", item["metric"]),
+            metric=item["metric"],
+            below=item["below"],
+            clear_above=item.get("clear_above"),
+            cooldown_minutes=item.get("cooldown_minutes", 360),
+            severity=item.get("severity", "warning"),
+            notify_on_clear=item.get("notify_on_clear", True),
+        )
+
+
+class QuietHours:
+    """免打扰时段，支持跨越午夜（如 23:00-07:00）"""
+
+    def __init__(self, start, end):
+        self.start = datetime.strptime(start, "%H:%M").time()
+        self.end = datetime.strptime(end, "%H:%M").time()
+
+    def contains(self, moment):
+        """判断时间是否处于免打扰时段"""
+        now = moment.time()
+        if self.start <= self.end:
+            return self.start <= now < self.end
+        return now >= self.start or now < self.end
+
+
+class AlertEngine:
+    """告警规则引擎，状态持久化以便在多次运行之间去重"""
+
+    def __init__(self, rules, quiet_hours=None, state_path=ALERT_STATE_PATH):
+        self.rules = rules
+        self.quiet_hours = quiet_hours
+        self.state_path = state_path
+        self.state = self.load_state()
+
+    def load_state(self):
+        """加载各房间各规则的告警状态（房间 -> 规则名 -> 状态）"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # 旧版本的状态只按规则名保存，属于默认房间
+        legacy = {name: item for name, item in state.items() if "active" in item}
+        if legacy:
+            state = {room: rules for room, rules in state.items() if room not in legacy}
+            state.setdefault(DEFAULT_ROOM, {}).update(legacy)
+        return state
+
+    def save_state(self):
+        """原子地保存告警状态"""
+        with atomic_write(self.state_path) as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+
+    def evaluate(self, summary, now=None, room=DEFAULT_ROOM):
+        """根据房间的统计摘要评估所有规则，返回需要发送的通知列表；各房间的告警状态互不影响"""
+        now = now or datetime.now()
+        room = str(room)
+        quiet = self.quiet_hours is not None and self.quiet_hours.contains(now)
+        room_state = self.state.setdefault(room, {})
+        notifications = []
+        for rule in self.rules:
+            # 免打扰时段内解除的告警，在时段结束后补发解除通知（时间为实际解除的时间）
+            pending = room_state.get(rule.name, {}).get("pending_resolved")
+            if pending and not quiet:
+                del room_state[rule.name]["pending_resolved"]
+                notifications.append(self._notification(
+                    rule, pending["value"], "resolved", datetime.fromisoformat(pending["time"]), room))
+            value = METRICS[rule.metric](summary)
+            if value is None:
+                continue
+            state = room_state.setdefault(rule.name, {"active": False, "last_notified": None})
+            if not state["active"] and value < rule.below:
+                state["active"] = True
+                state["since"] = now.isoformat(timespec='seconds')
+                # 解除通知还未补发就再次触发：对用户而言告警一直未解除，继续沿用上次告警的冷却时间
+                pending = state.pop("pending_resolved", None)
+                state["last_notified"] = pending["last_notified"] if pending else None
+            elif state["active"] and value >= rule.clear_above:
+                state["active"] = False
+                # 只有发出过告警的规则才需要发送解除通知
+                if rule.notify_on_clear and state["last_notified"]:
+                    if quiet:
+                        state["pending_resolved"] = {"value": value, "time": now.isoformat(timespec='seconds'),
+                                                     "last_notified": state["last_notified"]}
+                    else:
+                        notifications.append(self._notification(rule, value, "resolved", now, room))
+                state["last_notified"] = None
+                continue
+
+            if not state["active"] or quiet:
+                # 免打扰时段内的告警保持待发送状态，之后的评估会补发
+                continue
+            last_notified = state["last_notified"]
+            if last_notified and now - datetime.fromisoformat(last_notified) < rule.cooldown:
+                continue
+            state["last_notified"] = now.isoformat(timespec='seconds')
+            notifications.append(self._notification(rule, value, "firing", now, room))
+        self.save_state()
+        return notifications
+
+    @staticmethod
+    def _notification(rule, value, status, now, room=DEFAULT_ROOM):
+        """构造一条通知；监控多个房间时消息以房间号开头"""
+        name = METRIC_NAMES[rule.metric]
+        if room != DEFAULT_ROOM:
+            name = f"房间 {room} {name}"
+        unit = METRIC_UNITS[rule.metric]
+        if status == "firing":
+            message = f"{name}仅剩 {value:.2f} {unit}，低于告警阈值 {rule.below:g} {unit}"
+        else:
+            message = f"{name}已恢复到 {value:.2f} {unit}"
+        return {
+            "rule": rule.name,
+            "room": room,
+            "metric": rule.metric,
+            "status": status,
+            "severity": rule.severity,
+            "value": value,
+            "threshold": rule.below,
+            "time": now.isoformat(timespec='seconds'),
+            "message": message,
+        }
+
+
+def format_batch(notifications):
+    """把一批通知格式化为标题与正文"""
+    firing = [n for n in notifications if n["status"] == "firing"]
+    subject = "【电费告警】" + firing[0]["message"] if firing else "【电费告警解除】" + notifications[0]["message"]
+    if len(notifications) > 1:
+        subject += f" 等{len(notifications)}条"
+    body = "\n".join(f"[{n['time']}] {n['message']}" for n in notifications)
+    return subject, body
+
+
+class SMTPSink:
+    """邮件通知通道"""
+
+    def __init__(self, host="localhost", port=25, sender="", to=None, username="", password="",
+                 use_tls=False, use_ssl=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender or username
+        self.to = to if isinstance(to, list) else [to] if to else []
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+
+    def send(self, notifications):
+        """发送一封包含整批通知的邮件"""
+        subject, body = format_batch(notifications)
+        msg = MIMEText(body, 'plain', 'utf-8')
+        msg['Subject'] = Header(subject, 'utf-8')
+        msg['From'] = self.sender
+        msg['To'] = ", ".join(self.to)
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        with smtp_class(self.host, self.port, timeout=self.timeout) as server:
+            if self.use_tls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+            server.sendmail(self.sender, self.to, msg.as_string())
+
+
+class WebhookSink:
+    """Webhook通知通道：以JSON格式POST整批通知"""
+
+    def __init__(self, url, timeout=10, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    def send(self, notifications):
+        """POST通知到Webhook地址"""
+        subject, body = format_batch(notifications)
+        payload = json.dumps({"title": subject, "text": body, "alerts": notifications}, ensure_ascii=False)
+        req = urllib.request.Request(
+            self.url, data=payload.encode('utf-8'), method='POST',
+            headers={"Content-Type": "application/json; charset=utf-8", **self.headers}
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            if resp.status >= 300:
+                raise RuntimeError(f"Webhook返回状态码 {resp.status}")
+
+
+class DesktopSink:
+    """桌面通知通道：优先使用plyer，否则使用系统自带命令"""
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+
+    def send(self, notifications):
+        """弹出一条桌面通知"""
+        subject, body = format_batch(notifications)
+        try:
+            from plyer import notification
+            notification.notify(title=subject, message=body, app_name="南京大学电费监控", timeout=self.timeout)
+            return
+        except ImportError:
+            pass
+        if sys.platform == "darwin":
+            script = f'display notification {json.dumps(body)} with title {json.dumps(subject)}'
+            subprocess.run(["osascript", "-e", script], check=True, timeout=self.timeout)
+        elif shutil.which("notify-send"):
+            subprocess.run(["notify-send", subject, body], check=True, timeout=self.timeout)
+        else:
+            raise RuntimeError("当前系统不支持桌面通知，请安装plyer（pip install plyer）")
+
+
+class FileSink:
+    """文件通知通道：以JSON行格式追加通知"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(os.path.dirname(__file__), '..', 'data', 'alerts.jsonl')
+
+    def send(self, notifications):
+        """追加写入通知"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for item in notifications:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+SINK_TYPES = {
+    "smtp": SMTPSink,
+    "webhook": WebhookSink,
+    "desktop": DesktopSink,
+    "file": FileSink,
+}
+
+
+def create_sink(item):
+    """根据配置创建通知通道"""
+    options = dict(item)
+    sink_type = options.pop("type")
+    if sink_type not in SINK_TYPES:
+        raise ValueError(f"不支持的通知通道: {sink_type}")
+    if sink_type == "smtp" and "from" in options:
+        options["sender"] = options.pop("from")
+    return SINK_TYPES[sink_type](**options)
+
+
+class NotificationDispatcher:
+    """后台通知分发线程：批量合并通知，每个通道独立重试"""
+
+    def __init__(self, sinks, batch_seconds=2.0, retry_count=3, retry_backoff=2.0, logger=None):
+        self.sinks = sinks
+        self.batch_seconds = batch_seconds
+        self.retry_count = retry_count
+        self.retry_backoff = retry_backoff
+        self.logger = logger or logging.getLogger(__name__)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._worker, name="alert-dispatcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, task):
+        """提交一个任务：通知列表，或返回通知列表的可调用对象"""
+        self.queue.put(task)
+
+    def close(self, timeout=30):
+        """发送剩余通知并停止后台线程"""
+        self.queue.put(None)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            self.logger.warning("告警通知未能在超时时间内全部发送")
+
+    def _collect(self, task):
+        """执行任务并返回通知列表"""
+        try:
+            return task() if callable(task) else list(task)
+        except Exception as e:
+            self.logger.error(f"告警规则评估失败: {e}")
+            return []
+
+    def _worker(self):
+        """后台线程：在批处理窗口内合并通知后统一发送"""
+        stopping = False
+        while not stopping:
+            task = self.queue.get()
+            if task is None:
+                break
+            batch = self._collect(task)
+            deadline = time.monotonic() + self.batch_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    task = self.queue.get(timeout=max(remaining, 0)) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if task is None:
+                    stopping = True
+                    break
+                batch.extend(self._collect(task))
+            if batch:
+                self._deliver(batch)
+
+    def _deliver(self, batch):
+        """向所有通道发送一批通知，失败时按指数退避重试"""
+        for sink in self.sinks:
+            sink_name = type(sink).__name__
+            for attempt in range(self.retry_count + 1):
+                try:
+                    sink.send(batch)
+                    self.logger.info(f"告警通知已通过 {sink_name} 发送（{len(batch)} 条）")
+                    break
+                except Exception as e:
+                    if attempt >= self.retry_count:
+                        self.logger.error(f"告警通知通过 {sink_name} 发送失败: {e}")
+                    else:
+                        delay = self.retry_backoff * (2 ** attempt)
+                        self.logger.warning(f"告警通知通过 {sink_name} 发送失败: {e}，{delay:.0f} 秒后重试")
+                        time.sleep(delay)
+
+
+class AlertManager:
+    """把规则引擎和通知分发组合在一起：评估与发送都在后台线程中进行"""
+
+    def __init__(self, engine, dispatcher):
+        self.engine = engine
+        self.dispatcher = dispatcher
+
+    @classmethod
+    def from_config(cls, config, logger=None):
+        """根据配置中的alerts部分创建告警管理器，未配置规则时返回None"""
+        if not config or not config.get("rules"):
+            return None
+        rules = [AlertRule.from_config(item) for item in config["rules"]]
+        quiet = config.get("quiet_hours")
+        quiet_hours = QuietHours(quiet["start"], quiet["end"]) if quiet else None
+        sinks = [create_sink(item) for item in config.get("sinks", [{"type": "file"}])]
+        engine = AlertEngine(rules, quiet_hours, config.get("state_path", ALERT_STATE_PATH))
+        dispatcher = NotificationDispatcher(
+            sinks,
+            batch_seconds=config.get("batch_seconds", 2.0),
+            retry_count=config.get("retry_count", 3),
+            retry_backoff=config.get("retry_backoff", 2.0),
+            logger=logger,
+        )
+        return cls(engine, dispatcher)
+
+    def submit(self, summary, room=DEFAULT_ROOM):
+        """提交一个房间的统计摘要，规则评估在后台线程中完成"""
+        self.dispatcher.submit(lambda: self.engine.evaluate(summary, room=room))
+
+    def close(self, timeout=30):
+        """等待所有通知发送完毕"""
+        self.dispatcher.close(timeout)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成验证码生成器
+生成与统一身份认证验证码统计特征相近的4位字母数字验证码（尺寸、背景色、字符颜色、
+干扰线与噪点、旋转和扭曲），参数可根据采集到的真实样本校准；
+给定随机种子时结果完全确定，可批量生成带标签的数据集，
+或以流的形式提供给识别测试、回放替身服务器和训练任务
+
+用法：
+    python src/captcha_generator.py --count 10000 --out data/synthetic_captchas --seed 42
+    python src/captcha_generator.py --calibrate data/captcha_debug.png
+    python src/captcha_generator.py --bench 5000
+"""
+
+import io
+import os
+import math
+import sys
+import csv
+import json
+import time
+import glob
+import argparse
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from captcha_preprocess import preprocess_captcha_image
+
+PROFILE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'captcha_profile.json')
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+# 根据 data/captcha_debug.png 估计的默认参数
+DEFAULT_PROFILE = {
+    "width": 74,
+    "height": 34,
+    "length": 4,
+    "background_color": [225, 217, 217],
+    "background_std": 9.0,
+    "ink_color": [74, 60, 52],
+    "ink_std": 22.0,
+    "char_height": 22,
+    "text_left": 4,
+    "text_right": 66,
+    "noise_density": 0.12,
+    "noise_lines": 3,
+    "rotation": 15.0,
+    "warp_amplitude": 1.5,
+}
+
+FONT_CANDIDATES = (
+    "arialbd.ttf", "arial.ttf", "DejaVuSans-Bold.ttf", "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/Library/Fonts/Arial Bold.ttf",
+)
+
+
+def load_profile(path=PROFILE_PATH):
+    """加载校准参数，没有校准文件时使用默认参数"""
+    profile = dict(DEFAULT_PROFILE)
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            profile.update(json.load(f))
+    return profile
+
+
+def calibrate(sample_paths, base=None):
+    """根据真实验证码样本估计背景色、字符颜色、字符高度和噪点密度"""
+    profile = dict(base or DEFAULT_PROFILE)
+    backgrounds, inks, noise, heights, lefts, rights, sizes = [], [], [], [], [], [], []
+    for path in sample_paths:
+        pixels = np.asarray(Image.open(path).convert('RGB'), dtype=np.float32)
+        gray = pixels.mean(axis=2)
+        sizes.append(gray.shape)
+        background = pixels[gray > 200]
+        ink = pixels[gray < 100]
+        if len(background):
+            backgrounds.append(background)
+        if len(ink):
+            inks.append(ink)
+            rows = np.nonzero((gray < 100).any(axis=1))[0]
+            cols = np.nonzero((gray < 100).any(axis=0))[0]
+            heights.append(rows[-1] - rows[0] + 1)
+            lefts.append(cols[0])
+            rights.append(cols[-1])
+        noise.append(float(((gray >= 100) & (gray < 200)).mean()))
+    if not sizes:
+        raise ValueError("没有可用的验证码样本")
+    profile["height"], profile["width"] = (int(v) for v in np.median(sizes, axis=0))
+    if backgrounds:
+        background = np.concatenate(backgrounds)
+        profile["background_color"] = [int(v) for v in np.median(background, axis=0)]
+        profile["background_std"] = round(float(background.std(axis=0).mean()), 2)
+    if inks:
+        ink = np.concatenate(inks)
+        profile["ink_color"] = [int(v) for v in ink.mean(axis=0)]
+        profile["ink_std"] = round(float(ink.std(axis=0).mean()), 2)
+        profile["char_height"] = int(np.median(heights))
+        profile["text_left"] = int(np.median(lefts))
+        profile["text_right"] = int(np.median(rights))
+    # 中间灰度像素一部分来自字符边缘的抗锯齿，只把其中一部分计为噪点
+    profile["noise_density"] = round(float(np.median(noise)) * 0.4, 4)
+    return profile
+
+
+def find_font(size):
+    """查找可用的TrueType字体，找不到时使用Pillow内置字体"""
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+class CaptchaGenerator:
+    """可复现的合成验证码生成器"""
+
+    def __init__(self, seed=None, profile=None, alphabet=ALPHABET):
+        self.profile = profile or load_profile()
+        self.alphabet = alphabet
+        self.rng = np.random.default_rng(seed)
+        self.width = self.profile["width"]
+        self.height = self.profile["height"]
+        # 每个字符的字形只渲染一次，之后只做旋转和着色
+        self.font = find_font(int(self.profile["char_height"] * 1.2))
+        self.glyphs = {ch: self._render_glyph(ch) for ch in alphabet}
+        self._columns = np.arange(self.width)
+        self._rows = np.arange(self.height)[:, None]
+
+    def _render_glyph(self, ch):
+        """把单个字符渲染为灰度遮罩"""
+        left, top, right, bottom = self.font.getbbox(ch)
+        mask = Image.new('L', (right - left + 4, bottom - top + 4), 0)
+        ImageDraw.Draw(mask).text((2 - left, 2 - top), ch, fill=255, font=self.font)
+        return mask
+
+    def _transform_glyph(self, glyph, angle, scale):
+        """旋转字形并缩放到字符高度：旋转与缩放合成一次仿射变换，只重采样一次"""
+        w, h = glyph.size
+        radians = math.radians(angle)
+        cos, sin = abs(math.cos(radians)), abs(math.sin(radians))
+        # 旋转后外接矩形的高度缩放到 char_height × scale
+        scale = self.profile["char_height"] / max(w * sin + h * cos, 1) * scale
+        out_w = max(int((w * cos + h * sin) * scale), 1)
+        out_h = max(int((w * sin + h * cos) * scale), 1)
+        # 输出像素到字形像素的逆映射（与Image.rotate相同的旋转方向），以两者的中心对齐
+        a, b = math.cos(radians) / scale, -math.sin(radians) / scale
+        d, e = math.sin(radians) / scale, math.cos(radians) / scale
+        c = w / 2 - a * out_w / 2 - b * out_h / 2
+        f = h / 2 - d * out_w / 2 - e * out_h / 2
+        return glyph.transform((out_w, out_h), Image.AFFINE, (a, b, c, d, e, f), Image.BILINEAR)
+
+    def random_text(self):
+        """随机生成验证码文字"""
+        indices = self.rng.integers(0, len(self.alphabet), self.profile["length"])
+        return "".join(self.alphabet[i] for i in indices)
+
+    def generate(self, text=None):
+        """生成一张验证码，返回 (PIL图像, 文字)"""
+        profile = self.profile
+        rng = self.rng
+        text = text or self.random_text()
+        height, width = self.height, self.width
+
+        # 字符遮罩：逐个旋转后粘贴，水平方向均匀分布在文字区域内；随机参数一次性抽取
+        mask = Image.new('L', (width, height), 0)
+        span = (profile["text_right"] - profile["text_left"]) / len(text)
+        angles = rng.uniform(-profile["rotation"], profile["rotation"], len(text))
+        scales = rng.uniform(0.9, 1.1, len(text))
+        offsets = rng.integers(-2, 3, (len(text), 2))
+        for i, ch in enumerate(text):
+            glyph = self._transform_glyph(self.glyphs.get(ch) or self._render_glyph(ch), angles[i], scales[i])
+            x = int(profile["text_left"] + span * i + (span - glyph.width) / 2 + offsets[i, 0])
+            y = int((height - glyph.height) / 2 + offsets[i, 1])
+            mask.paste(glyph, (x, y), glyph)
+
+        # 正弦扭曲：每一列按不同的偏移量上下移动
+        alpha = np.asarray(mask, dtype=np.float32) / 255.0
+        phase = rng.uniform(0, 2 * np.pi)
+        period = rng.uniform(0.6, 1.2) * width
+        shifts = np.rint(profile["warp_amplitude"] * np.sin(2 * np.pi * self._columns / period + phase)).astype(int)
+        alpha = alpha[np.clip(self._rows - shifts, 0, height - 1), self._columns]
+
+        # 干扰线叠加在字符遮罩上
+        if profile["noise_lines"]:
+            lines = Image.new('L', (width, height), 0)
+            draw = ImageDraw.Draw(lines)
+            ends = rng.integers(0, (width, height, width, height), (profile["noise_lines"], 4))
+            shades = rng.integers(60, 140, profile["noise_lines"])
+            for (x0, y0, x1, y1), shade in zip(ends.tolist(), shades.tolist()):
+                draw.line([(x0, y0), (x1, y1)], fill=shade, width=1)
+            alpha = np.maximum(alpha, np.asarray(lines, dtype=np.float32) / 255.0)
+
+        # 背景、字符颜色和噪点
+        background = np.asarray(profile["background_color"], dtype=np.float32)
+        ink = np.asarray(profile["ink_color"], dtype=np.float32) + rng.normal(0, profile["ink_std"], 3)
+        image = background + profile["background_std"] * rng.standard_normal((height, width, 1), dtype=np.float32)
+        alpha = alpha[..., None]
+        image += alpha * (ink.astype(np.float32) - image)
+        speckle = rng.random((height, width), dtype=np.float32) < profile["noise_density"]
+        image[speckle] = rng.uniform(120, 200, (int(speckle.sum()), 1))
+        return Image.fromarray(np.clip(image, 0, 255).astype(np.uint8), 'RGB'), text
+
+    def png_bytes(self, text=None):
+        """生成PNG格式的验证码，返回 (字节, 文字)"""
+        image, text = self.generate(text)
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue(), text
+
+    def stream(self, count=None, preprocessed=False):
+        """流式产出 (图像, 文字)，count为None时无限产出"""
+        produced = 0
+        while count is None or produced < count:
+            image, text = self.generate()
+            if preprocessed:
+                image = preprocess_captcha_image(image)
+            yield image, text
+            produced += 1
+
+    def write_dataset(self, out_dir, count, preprocessed=False):
+        """生成带标签的数据集：图片文件与labels.csv"""
+        os.makedirs(out_dir, exist_ok=True)
+        labels_path = os.path.join(out_dir, 'labels.csv')
+        with open(labels_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["file", "label"])
+            for i, (image, text) in enumerate(self.stream(count, preprocessed)):
+                name = f"{i:06d}_{text}.png"
+                image.save(os.path.join(out_dir, name))
+                writer.writerow([name, text])
+        return labels_path
+
+
+def benchmark(count, seed=0, preprocessed=False):
+    """测量生成速度（张/秒）"""
+    generator = CaptchaGenerator(seed)
+    start = time.perf_counter()
+    for _ in generator.stream(count, preprocessed):
+        pass
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="合成验证码生成器")
+    parser.add_argument("--count", type=int, default=1000, help="生成数量")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic_captchas'),
+                        help="输出目录")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--preprocessed", action="store_true", help="输出预处理（二值化降噪）后的图像")
+    parser.add_argument("--calibrate", nargs="+", metavar="IMAGE", help="根据真实验证码样本校准参数并保存")
+    parser.add_argument("--bench", type=int, metavar="N", help="只测量生成N张验证码的速度")
+    args = parser.parse_args()
+
+    if args.calibrate:
+        paths = [p for pattern in args.calibrate for p in glob.glob(pattern)]
+        profile = calibrate(paths)
+        with open(PROFILE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=4, ensure_ascii=False)
+        print(f"已根据 {len(paths)} 张样本校准参数，保存到 {PROFILE_PATH}")
+        print(json.dumps(profile, ensure_ascii=False, indent=4))
+        return
+    if args.bench:
+        rate = benchmark(args.bench, args.seed, args.preprocessed)
+        print(f"生成速度: {rate:.0f} 张/秒")
+        return
+
+    start = time.perf_counter()
+    labels_path = CaptchaGenerator(args.seed).write_dataset(args.out, args.count, args.preprocessed)
+    elapsed = time.perf_counter() - start
+    print(f"已生成 {args.count} 张验证码（{args.count / elapsed:.0f} 张/秒），标签文件: {labels_path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+验证码OCR后端
+两种后端提供与 easyocr.Reader.readtext 相同的接口（返回 [(bbox, 文字, 置信度)]），监控脚本按配置选择：
+    easyocr  EasyOCR的中英文检测与识别模型（默认，需要PyTorch）
+    onnx     从EasyOCR英文识别模型导出并int8量化的ONNX模型，用ONNX Runtime在CPU上运行，
+             只输出字母和数字；不加载检测模型，也不需要PyTorch，模型加载只需几十毫秒
+
+ONNX模型需先在装有EasyOCR（PyTorch）和onnxruntime的环境中导出一次，之后监控程序只需要onnxruntime：
+    python src/captcha_ocr.py export                       # 导出到 models/captcha_en_int8.onnx
+    python src/captcha_ocr.py read data/captcha_debug.png --backend onnx
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), '..')
+EASYOCR_MODEL_DIR = os.path.join(ROOT_DIR, 'models', 'ocr_models')
+ONNX_MODEL_PATH = os.path.join(ROOT_DIR, 'models', 'captcha_en_int8.onnx')
+
+OCR_BACKENDS = ("easyocr", "onnx")
+# 验证码只含字母和数字
+ALLOWLIST = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def onnx_model_path(config=None):
+    """配置中的ONNX模型路径，相对路径相对于项目根目录"""
+    model_path = (config or {}).get("model_path") or ONNX_MODEL_PATH
+    return model_path if os.path.isabs(model_path) else os.path.join(ROOT_DIR, model_path)
+
+
+def metadata_path(model_path):
+    """ONNX模型旁的说明文件：字符表、输入高度与归一化参数"""
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+class EasyOCRBackend:
+    """EasyOCR识别器；easyocr（及PyTorch）在创建时才导入"""
+
+    name = "easyocr"
+
+    def __init__(self, model_dir=EASYOCR_MODEL_DIR, languages=('ch_sim', 'en'), logger=None):
+        import easyocr
+        self.reader = easyocr.Reader(
+            list(languages),
+            gpu=False,
+            model_storage_directory=model_dir,
+            download_enabled=True
+        )
+
+    def readtext(self, image):
+        return self.reader.readtext(image)
+
+
+class ONNXCaptchaBackend:
+    """int8量化的英文识别模型（CRNN + CTC），整张验证码作为一行文字识别，不做文字检测"""
+
+    name = "onnx"
+
+    def __init__(self, model_path=ONNX_MODEL_PATH, allowlist=ALLOWLIST, threads=1, logger=None):
+        # 与easyocr相同，推理库在创建时才导入：OCR放在子进程中运行时主进程不加载它
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("未安装onnxruntime，无法使用onnx后端（pip install onnxruntime）")
+        with open(metadata_path(model_path), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # 第0类为CTC空白
+        self.classes = [None] + list(meta["charset"])
+        self.height = meta.get("height", 64)
+        self.mean = meta.get("mean", 0.5)
+        self.std = meta.get("std", 0.5)
+        # 不在允许字符中的类别在解码时置零，与EasyOCR的allowlist行为一致
+        allowed = set(allowlist)
+        self.ignore = np.array([i for i, ch in enumerate(self.classes) if ch is not None and ch not in allowed],
+                               dtype=np.int64)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def prepare(self, image):
+        """转为灰度、按比例缩放到模型的输入高度并归一化，返回 [1, 1, 高, 宽]"""
+        if not isinstance(image, Image.Image):
+            image = Image.fromarray(np.asarray(image))
+        image = image.convert('L')
+        width = max(int(np.ceil(image.width * self.height / image.height)), self.height)
+        image = image.resize((width, self.height), Image.BILINEAR)
+        pixels = np.asarray(image, dtype=np.float32) / 255.0
+        return ((pixels - self.mean) / self.std)[None, None]
+
+    def decode(self, logits):
+        """CTC贪心解码，返回 (文字, 置信度)；置信度与EasyOCR相同，为各字符概率之积的 2/√n 次方"""
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        probs = np.exp(logits)
+        if len(self.ignore):
+            probs[:, self.ignore] = 0.0
+        probs /= probs.sum(axis=-1, keepdims=True)
+        best = probs.argmax(axis=-1)
+        keep = (best != 0) & np.concatenate(([True], best[1:] != best[:-1]))
+        if not keep.any():
+            return "", 0.0
+        text = "".join(self.classes[i] for i in best[keep])
+        chosen = probs[np.flatnonzero(keep), best[keep]]
+        return text, float(np.prod(chosen) ** (2.0 / np.sqrt(len(chosen))))
+
+    def readtext(self, image):
+        tensor = self.prepare(image)
+        logits = self.session.run(None, {self.input_name: tensor})[0][0]
+        text, prob = self.decode(logits)
+        if not text:
+            return []
+        height, width = tensor.shape[2:]
+        return [([[0, 0], [width, 0], [width, height], [0, height]], text, prob)]
+
+
+def create_reader(config=None, logger=None):
+    """按配置创建OCR后端；onnx后端不可用（未安装onnxruntime或模型未导出）时改用EasyOCR"""
+    config = config or {}
+    logger = logger or logging.getLogger(__name__)
+    backend = config.get("backend", "easyocr")
+    if backend == "onnx":
+        model_path = onnx_model_path(config)
+        try:
+            start = time.perf_counter()
+            reader = ONNXCaptchaBackend(model_path, config.get("allowlist", ALLOWLIST),
+                                        config.get("threads", 1), logger)
+            logger.info(f"ONNX验证码识别模型加载完成，耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+            return reader
+        except (RuntimeError, OSError, ValueError, KeyError) as e:
+            logger.warning(f"onnx后端不可用，改用EasyOCR: {e}")
+    return EasyOCRBackend(config.get("model_dir") or EASYOCR_MODEL_DIR, logger=logger)
+
+
+def export_onnx(output=ONNX_MODEL_PATH, model_dir=EASYOCR_MODEL_DIR, quantize=True):
+    """把EasyOCR的英文识别模型导出为ONNX并做int8动态量化（需要easyocr、torch和onnxruntime）"""
+    import torch
+    import easyocr
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    # quantize=False：导出前不能做PyTorch的动态量化
+    reader = easyocr.Reader(['en'], gpu=False, detector=False, quantize=False,
+                            model_storage_directory=model_dir, download_enabled=True)
+    model = reader.recognizer.eval()
+
+    class Recognizer(torch.nn.Module):
+        """与EasyOCR模型的forward相同，用mean代替AdaptiveAvgPool2d((None, 1))以支持可变宽度"""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, image):
+            visual = self.model.FeatureExtraction(image).permute(0, 3, 1, 2).mean(dim=3)
+            contextual = self.model.SequenceModeling(visual)
+            return self.model.Prediction(contextual.contiguous())
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, "recognizer.onnx")
+        torch.onnx.export(Recognizer(model), torch.zeros(1, 1, 64, 160), fp32_path,
+                          input_names=["image"], output_names=["logits"],
+                          dynamic_axes={"image": {3: "width"}, "logits": {1: "steps"}}, opset_version=13)
+        if quantize:
+            quantize_dynamic(fp32_path, output, weight_type=QuantType.QInt8)
+        else:
+            os.replace(fp32_path, output)
+    with open(metadata_path(output), 'w', encoding='utf-8') as f:
+        json.dump({"charset": reader.character, "height": 64, "mean": 0.5, "std": 0.5,
+                   "source": "easyocr en", "quantized": quantize}, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="验证码OCR后端")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="导出int8量化的ONNX识别模型")
+    export.add_argument("-o", "--output", default=ONNX_MODEL_PATH, help="输出路径")
+    export.add_argument("--no-quantize", action="store_true", help="不做int8量化")
+    read = sub.add_parser("read", help="识别一张验证码图片")
+    read.add_argument("image")
+    read.add_argument("--backend", choices=OCR_BACKENDS, default="onnx")
+    read.add_argument("--model", help="ONNX模型路径")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        path = export_onnx(args.output, quantize=not args.no_quantize)
+        print(f"已导出: {path}（{os.path.getsize(path) / 1024 / 1024:.1f} MB）")
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    start = time.perf_counter()
+    reader = create_reader({"backend": args.backend, "model_path": args.model})
+    loaded = time.perf_counter()
+    results = reader.readtext(np.array(Image.open(args.image)))
+    print(f"后端: {reader.name}，加载 {(loaded - start) * 1000:.0f} ms，识别 {(time.perf_counter() - loaded) * 1000:.0f} ms")
+    for _, text, prob in results:
+        print(f"{text}  (置信度: {prob:.3f})")
+    if not results:
+        print("未识别到任何内容")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
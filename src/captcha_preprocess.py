@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+验证码图像预处理
+供监控脚本、验证码生成器和识别测试共用，不依赖浏览器与OCR模型
+"""
+
+from PIL import Image, ImageFilter
+
+# 二值化阈值
+BINARY_THRESHOLD = 128
+
+
+def preprocess_captcha_image(img):
+    """预处理验证码图像：放大、灰度、二值化、中值滤波降噪"""
+    # 转换为RGB模式
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    # 调整图像大小 - 使用兼容的重采样方法
+    try:
+        img = img.resize((img.width * 2, img.height * 2), Image.Resampling.LANCZOS)
+    except AttributeError:
+        # 如果Resampling不可用，使用ANTIALIAS
+        img = img.resize((img.width * 2, img.height * 2), Image.ANTIALIAS)
+
+    # 转换为灰度图
+    gray_img = img.convert('L')
+
+    # 二值化处理
+    binary_img = gray_img.point(lambda x: 0 if x < BINARY_THRESHOLD else 255, '1')
+
+    # 确保二值化后的图像为 uint8 类型
+    binary_img = binary_img.convert('L')
+    binary_img = binary_img.point(lambda x: 255 if x > 0 else 0, '1')
+    binary_img = binary_img.convert('L')
+
+    # 降噪处理
+    return binary_img.filter(ImageFilter.MedianFilter(size=3))
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置文件管理
+读取指定路径的配置文件并选择配置方案（profile），按模式校验各项设置（账号与房间、间隔、
+告警规则、容错与调试设置等），常驻运行时检测配置文件的变化并重新加载：
+新配置无效时保留当前配置并记录错误，不中断运行
+
+配置方案写在 "profiles" 中，选中的方案覆盖顶层设置（字典逐层合并，其他值直接替换）：
+    {"username": "...", "profiles": {"test": {"url": "http://127.0.0.1:8900/epay/h5/nju/electric/index"}}}
+选择顺序：命令行 --profile > 环境变量 NJU_MONITOR_PROFILE > 配置中的 "profile"
+
+用法：
+    python src/config_manager.py [配置文件] [--profile 方案]    # 校验配置并输出合并后的结果（不含密码）
+"""
+
+import os
+import sys
+import json
+import copy
+import logging
+import argparse
+
+from safe_io import atomic_write
+from alerting import AlertRule, QuietHours, SINK_TYPES
+from captcha_ocr import OCR_BACKENDS
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config.json')
+PROFILE_ENV = "NJU_MONITOR_PROFILE"
+
+# 配置文件不存在时创建的默认配置
+DEFAULT_CONFIG = {
+    "username": "",
+    "password": "",
+    "auto_login": True,
+    "headless_mode": True,
+    "captcha_retry_count": 3,
+    "log_level": "INFO"
+}
+
+NUMBER = (int, float)
+
+# 顶层设置的类型
+FIELD_TYPES = {
+    "url": str,
+    "room": (str, int),
+    "username": str,
+    "password": str,
+    "auto_login": bool,
+    "headless_mode": bool,
+    "chromedriver_path": str,
+    "captcha_retry_count": int,
+    "captcha_confidence_threshold": NUMBER,
+    "save_captcha_images": bool,
+    "chart_days": NUMBER,
+    "interval_minutes": NUMBER,
+    "log_level": str,
+    "preflight": bool,
+    "accounts": list,
+    "profile": str,
+    "profiles": dict,
+    "alerts": dict,
+    "resilience": dict,
+    "debug_capture": dict,
+    "ocr": dict,
+    "logging": dict,
+}
+
+# 只在浏览器启动时读取的设置：常驻运行时修改后，要到浏览器下次重启才生效
+RESTART_FIELDS = ("headless_mode", "chromedriver_path")
+
+
+class ConfigError(ValueError):
+    """配置文件无法读取或未通过校验，errors为全部问题"""
+
+    def __init__(self, errors, path=None):
+        self.errors = list(errors)
+        self.path = path
+        super().__init__("；".join(self.errors))
+
+
+def deep_merge(base, override):
+    """字典逐层合并，override中的非字典值直接替换"""
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def resolve_profile(raw, profile=None):
+    """按选择顺序合并配置方案，返回 (生效的配置, 方案名)"""
+    profile = profile or os.environ.get(PROFILE_ENV) or raw.get("profile")
+    base = {key: value for key, value in raw.items() if key not in ("profiles", "profile")}
+    if not profile:
+        return base, None
+    profiles = raw.get("profiles") or {}
+    if profile not in profiles:
+        raise ConfigError([f"配置方案不存在: {profile}（可选：{', '.join(profiles) or '无'}）"])
+    return deep_merge(base, profiles[profile]), profile
+
+
+def _is_type(value, types):
+    # bool是int的子类，数值项不接受true/false
+    if isinstance(value, bool) and bool not in (types if isinstance(types, tuple) else (types,)):
+        return False
+    return isinstance(value, types)
+
+
+def _check_number(errors, name, value, minimum=None, maximum=None, integer=False):
+    if not _is_type(value, int if integer else NUMBER):
+        errors.append(f"{name} 应为{'整数' if integer else '数字'}，实际为 {value!r}")
+    elif (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        bounds = f"{'' if minimum is None else minimum} ~ {'' if maximum is None else maximum}"
+        errors.append(f"{name} 超出范围（{bounds}）: {value}")
+
+
+def validate_config(config):
+    """校验生效的配置，返回 (错误列表, 警告列表)"""
+    errors, warnings = [], []
+    for key, value in config.items():
+        types = FIELD_TYPES.get(key)
+        if types is None:
+            warnings.append(f"未知的配置项: {key}")
+        elif not _is_type(value, types):
+            errors.append(f"{key} 类型错误: {value!r}")
+    if errors:
+        return errors, warnings
+
+    if "log_level" in config and not isinstance(logging.getLevelName(config["log_level"]), int):
+        errors.append(f"log_level 无效: {config['log_level']}")
+    for name, minimum, maximum, integer in (("captcha_retry_count", 1, None, True),
+                                            ("captcha_confidence_threshold", 0, 1, False),
+                                            ("chart_days", 0, None, False),
+                                            ("interval_minutes", 0.1, None, False)):
+        if name in config:
+            _check_number(errors, name, config[name], minimum, maximum, integer)
+
+    rooms = set()
+    for i, account in enumerate(config.get("accounts", [])):
+        name = f"accounts[{i}]"
+        if not isinstance(account, dict) or "room" not in account:
+            errors.append(f"{name} 应为包含 room 的对象")
+            continue
+        room = str(account["room"])
+        if room in rooms:
+            errors.append(f"{name} 房间重复: {room}")
+        rooms.add(room)
+        for key in ("username", "password"):
+            if key in account and not isinstance(account[key], str):
+                errors.append(f"{name}.{key} 应为字符串")
+
+    alerts = config.get("alerts") or {}
+    for i, item in enumerate(alerts.get("rules", [])):
+        try:
+            AlertRule.from_config(item)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            errors.append(f"alerts.rules[{i}] 无效: {e}")
+    if alerts.get("quiet_hours"):
+        try:
+            QuietHours(alerts["quiet_hours"]["start"], alerts["quiet_hours"]["end"])
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append(f"alerts.quiet_hours 无效: {e}")
+    for i, item in enumerate(alerts.get("sinks", [])):
+        if not isinstance(item, dict) or item.get("type") not in SINK_TYPES:
+            errors.append(f"alerts.sinks[{i}] 通知通道类型无效（可选：{', '.join(SINK_TYPES)}）")
+
+    resilience = config.get("resilience") or {}
+    for key in ("page_timeout", "page_load_timeout", "probe_timeout"):
+        if key in resilience:
+            _check_number(errors, f"resilience.{key}", resilience[key], 0)
+    for kind, policy in (resilience.get("retry") or {}).items():
+        for key, value in (policy or {}).items():
+            _check_number(errors, f"resilience.retry.{kind}.{key}", value, 0)
+    for key, value in (resilience.get("breaker") or {}).items():
+        _check_number(errors, f"resilience.breaker.{key}", value, 0)
+
+    debug = config.get("debug_capture") or {}
+    for key, minimum, maximum in (("max_runs", 1, None), ("max_mb", 0, None), ("sample_rate", 0, 1)):
+        if key in debug:
+            _check_number(errors, f"debug_capture.{key}", debug[key], minimum, maximum)
+
+    ocr = config.get("ocr") or {}
+    if "backend" in ocr and ocr["backend"] not in OCR_BACKENDS:
+        errors.append(f"ocr.backend 无效: {ocr['backend']!r}（可选：{', '.join(OCR_BACKENDS)}）")
+    for key in ("model_path", "model_dir", "allowlist"):
+        if key in ocr and not isinstance(ocr[key], str):
+            errors.append(f"ocr.{key} 应为字符串")
+    if "threads" in ocr:
+        _check_number(errors, "ocr.threads", ocr["threads"], 1, None, True)
+    if "worker" in ocr and not isinstance(ocr["worker"], bool):
+        errors.append("ocr.worker 应为true或false")
+    for key, minimum in (("idle_ttl", 0), ("timeout", 1)):
+        if key in ocr:
+            _check_number(errors, f"ocr.{key}", ocr[key], minimum)
+    return errors, warnings
+
+
+class ConfigManager:
+    """配置文件的读取、校验、变化检测与写回"""
+
+    def __init__(self, path=None, profile=None, logger=None):
+        self.path = path or DEFAULT_CONFIG_PATH
+        self.profile = profile
+        self.logger = logger or logging.getLogger(__name__)
+        self.raw = {}
+        self.config = {}
+        self.active_profile = None
+        self.warnings = []
+        self._stamp = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self):
+        """读取并校验配置文件，返回 (原始配置, 生效的配置, 方案名, 警告)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ConfigError([f"无法读取配置文件 {self.path}: {e}"], self.path)
+        if not isinstance(raw, dict):
+            raise ConfigError(["配置文件顶层应为对象"], self.path)
+        config, profile = resolve_profile(raw, self.profile)
+        errors, warnings = validate_config(config)
+        if errors:
+            raise ConfigError(errors, self.path)
+        return raw, config, profile, warnings
+
+    def load(self):
+        """加载配置，文件不存在时创建默认配置；配置无效时抛出ConfigError"""
+        if not os.path.exists(self.path):
+            with atomic_write(self.path) as f:
+                json.dump(DEFAULT_CONFIG, f, indent=4, ensure_ascii=False)
+        stamp = self._file_stamp()
+        self.raw, self.config, self.active_profile, self.warnings = self._read()
+        self._stamp = stamp
+        return self.config
+
+    def changed(self):
+        """配置文件在上次读取后是否被修改过"""
+        return self._file_stamp() != self._stamp
+
+    def reload(self):
+        """文件有变化时重新加载，返回有变化的配置项集合；文件未变化或新配置无效时返回空集合"""
+        if not self.changed():
+            return set()
+        stamp = self._file_stamp()
+        try:
+            raw, config, profile, warnings = self._read()
+        except ConfigError as e:
+            # 同一份无效文件只报告一次，修正后再次保存即可生效
+            self._stamp = stamp
+            self.logger.error(f"配置文件修改后无效，继续使用原配置: {e}")
+            return set()
+        changed = {key for key in set(config) | set(self.config) if config.get(key) != self.config.get(key)}
+        self.raw, self.config, self.active_profile, self.warnings = raw, config, profile, warnings
+        self._stamp = stamp
+        return changed
+
+    def update(self, **values):
+        """把设置写回配置文件（选中的方案中有该项时写入方案），保留其他内容"""
+        raw = copy.deepcopy(self.raw)
+        profile = (raw.get("profiles") or {}).get(self.active_profile) if self.active_profile else None
+        for key, value in values.items():
+            target = profile if profile is not None and key in profile else raw
+            target[key] = value
+        with atomic_write(self.path) as f:
+            json.dump(raw, f, indent=4, ensure_ascii=False)
+        self.load()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="校验配置文件")
+    parser.add_argument("config_file", nargs="?", help="配置文件路径（默认为项目根目录的config.json）")
+    parser.add_argument("--profile", help="配置方案")
+    args = parser.parse_args()
+
+    manager = ConfigManager(args.config_file, args.profile)
+    if not os.path.exists(manager.path):
+        print(f"错误：配置文件不存在: {manager.path}", file=sys.stderr)
+        return 1
+    try:
+        config = manager.load()
+    except ConfigError as e:
+        for error in e.errors:
+            print(f"[错误] {error}")
+        return 1
+    for warning in manager.warnings:
+        print(f"[警告] {warning}")
+    shown = copy.deepcopy(config)
+    for item in [shown] + shown.get("accounts", []):
+        if item.get("password"):
+            item["password"] = "***"
+    print(f"配置方案: {manager.active_profile or '（无）'}")
+    print(json.dumps(shown, indent=4, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
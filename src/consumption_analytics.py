@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用电量增量统计模块
+每保存一条读数只做常数时间的更新：按天/按小时用电量、平滑耗电速率、
+充值检测以及剩余电量可用时间预测，统计结果持久化到JSON文件中
+"""
+
+import os
+import json
+import math
+from datetime import datetime, timedelta
+
+from safe_io import atomic_write
+from reading_store import DATA_DIR, DEFAULT_ROOM
+
+ANALYTICS_STATE_PATH = os.path.join(DATA_DIR, 'consumption_analytics.json')
+
+# 耗电速率指数平滑的时间常数（小时）
+DEFAULT_HALF_LIFE_HOURS = 24.0
+# 电量上升超过该值（度）视为一次充值
+DEFAULT_RECHARGE_THRESHOLD = 0.5
+# 保留的按天统计天数与最近充值记录数
+MAX_DAILY_DAYS = 90
+MAX_RECHARGES = 20
+# 单个读数间隔最多拆分到的小时数，超出部分整体计入最后一个时段
+MAX_SPLIT_HOURS = 48
+# 预测区间使用的标准差倍数
+FORECAST_BAND_SIGMA = 2.0
+
+
+def parse_timestamp(value):
+    """将ISO时间字符串或datetime统一为datetime"""
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+class ConsumptionAnalytics:
+    """增量维护的用电统计"""
+
+    def __init__(self, state_path=ANALYTICS_STATE_PATH,
+                 half_life_hours=DEFAULT_HALF_LIFE_HOURS,
+                 recharge_threshold=DEFAULT_RECHARGE_THRESHOLD):
+        self.state_path = state_path
+        self.half_life_hours = half_life_hours
+        self.recharge_threshold = recharge_threshold
+        self.state = self.empty_state()
+
+    @staticmethod
+    def empty_state():
+        """初始统计状态"""
+        return {
+            "last_time": None,
+            "last_value": None,
+            "reading_count": 0,
+            "burn_rate": None,       # 平滑耗电速率（度/小时）
+            "burn_rate_var": 0.0,    # 耗电速率的指数加权方差
+            "burn_rate_weight": 0.0,  # 指数加权的有效样本数
+            "total_consumed": 0.0,
+            "daily_usage": {},       # 日期 -> 用电量（度）
+            "hourly_usage": [0.0] * 24,   # 每个整点小时段累计用电量
+            "hourly_hours": [0.0] * 24,   # 每个整点小时段累计观测时长
+            "recharge_count": 0,
+            "recharges": [],
+        }
+
+    def load(self):
+        """从文件加载统计状态，返回是否存在历史状态"""
+        try:
+            if os.path.exists(self.state_path):
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                self.state = {**self.empty_state(), **state}
+                return True
+        except (OSError, ValueError):
+            pass
+        self.state = self.empty_state()
+        return False
+
+    def save(self):
+        """原子地保存统计状态"""
+        with atomic_write(self.state_path) as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+
+    def rebuild(self, readings):
+        """从历史读数（(时间, 电量) 序列）重建统计状态，仅在没有状态文件时使用"""
+        self.state = self.empty_state()
+        for timestamp, value in readings:
+            self.update(timestamp, value)
+        return self
+
+    def update(self, timestamp, value):
+        """加入一条新读数，时间复杂度为O(1)"""
+        timestamp = parse_timestamp(timestamp)
+        value = float(value)
+        state = self.state
+        last_time = parse_timestamp(state["last_time"]) if state["last_time"] else None
+        if last_time is not None and timestamp <= last_time:
+            # 乱序或重复读数不参与统计
+            return False
+
+        if last_time is not None:
+            hours = (timestamp - last_time).total_seconds() / 3600.0
+            delta = value - state["last_value"]
+            if delta > self.recharge_threshold:
+                self._record_recharge(timestamp, delta)
+            else:
+                consumed = max(-delta, 0.0)
+                self._record_consumption(last_time, timestamp, consumed)
+                self._update_burn_rate(consumed / hours, hours)
+
+        state["last_time"] = timestamp.isoformat()
+        state["last_value"] = value
+        state["reading_count"] += 1
+        return True
+
+    def _record_recharge(self, timestamp, amount):
+        """记录一次充值"""
+        state = self.state
+        state["recharge_count"] += 1
+        state["recharges"].append({"time": timestamp.isoformat(), "amount": round(amount, 3)})
+        del state["recharges"][:-MAX_RECHARGES]
+
+    def _record_consumption(self, start, end, consumed):
+        """把一个读数间隔内的用电量按时间比例分摊到天和小时段"""
+        state = self.state
+        state["total_consumed"] += consumed
+        total_seconds = (end - start).total_seconds()
+        cursor = start
+        slices = 0
+        while cursor < end:
+            slices += 1
+            if slices > MAX_SPLIT_HOURS:
+                # 超长间隔：剩余部分整体计入最后一个时段
+                next_cursor = end
+            else:
+                next_cursor = min(cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1), end)
+            seconds = (next_cursor - cursor).total_seconds()
+            share = consumed * seconds / total_seconds
+            day = cursor.date().isoformat()
+            state["daily_usage"][day] = state["daily_usage"].get(day, 0.0) + share
+            state["hourly_usage"][cursor.hour] += share
+            state["hourly_hours"][cursor.hour] += seconds / 3600.0
+            cursor = next_cursor
+        daily = state["daily_usage"]
+        while len(daily) > MAX_DAILY_DAYS:
+            del daily[min(daily)]
+
+    def _update_burn_rate(self, rate, hours):
+        """按时间间隔加权的指数平滑耗电速率与方差"""
+        state = self.state
+        if state["burn_rate"] is None:
+            state["burn_rate"] = rate
+            state["burn_rate_var"] = 0.0
+            state["burn_rate_weight"] = 1.0
+            return
+        alpha = 1.0 - math.pow(0.5, hours / self.half_life_hours)
+        diff = rate - state["burn_rate"]
+        state["burn_rate"] += alpha * diff
+        state["burn_rate_var"] = (1.0 - alpha) * (state["burn_rate_var"] + alpha * diff * diff)
+        state["burn_rate_weight"] = (1.0 - alpha) * state["burn_rate_weight"] + 1.0
+
+    def forecast(self):
+        """预测剩余电量可用天数及其置信区间"""
+        state = self.state
+        rate = state["burn_rate"]
+        value = state["last_value"]
+        if rate is None or value is None or rate <= 0:
+            return None
+        # 平滑速率的标准误差：单次速率的标准差除以有效样本数的平方根
+        std = math.sqrt(max(state["burn_rate_var"], 0.0) / max(state["burn_rate_weight"], 1.0))
+        high_rate = rate + FORECAST_BAND_SIGMA * std
+        low_rate = rate - FORECAST_BAND_SIGMA * std
+        days = value / rate / 24.0
+        last_time = parse_timestamp(state["last_time"])
+        return {
+            "days_to_empty": days,
+            "days_to_empty_low": value / high_rate / 24.0,
+            "days_to_empty_high": value / low_rate / 24.0 if low_rate > 0 else None,
+            "empty_at": (last_time + timedelta(days=days)).isoformat(timespec='seconds'),
+        }
+
+    def summary(self):
+        """供网页面板与告警使用的统计摘要"""
+        state = self.state
+        daily = state["daily_usage"]
+        recent_days = sorted(daily)[-7:]
+        hourly_profile = [
+            usage / hours if hours > 0 else None
+            for usage, hours in zip(state["hourly_usage"], state["hourly_hours"])
+        ]
+        return {
+            "last_time": state["last_time"],
+            "balance": state["last_value"],
+            "reading_count": state["reading_count"],
+            "burn_rate_per_hour": state["burn_rate"],
+            "burn_rate_per_day": state["burn_rate"] * 24.0 if state["burn_rate"] is not None else None,
+            "daily_usage": {day: daily[day] for day in recent_days},
+            "average_daily_usage": sum(daily[d] for d in recent_days) / len(recent_days) if recent_days else None,
+            "hourly_profile": hourly_profile,
+            "recharge_count": state["recharge_count"],
+            "last_recharge": state["recharges"][-1] if state["recharges"] else None,
+            "forecast": self.forecast(),
+        }
+
+
+def analytics_state_path(room=DEFAULT_ROOM, data_dir=DATA_DIR):
+    """房间对应的统计状态文件路径（与mirror_paths相同：默认房间沿用原文件名，其他房间加房间号后缀）"""
+    suffix = "" if str(room) == DEFAULT_ROOM else f"-{room}"
+    return os.path.join(data_dir, f'consumption_analytics{suffix}.json')
+
+
+def read_history(json_path):
+    """逐行读取JSON格式的历史读数，产出 (时间, 电量)"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+                yield item["timestamp"], item["remaining_electricity"]
+            except (ValueError, KeyError):
+                continue
+
+
+def load_analytics(json_path=None, state_path=ANALYTICS_STATE_PATH):
+    """加载统计状态；没有状态文件时从历史数据重建一次"""
+    analytics = ConsumptionAnalytics(state_path)
+    if not analytics.load() and json_path and os.path.exists(json_path):
+        analytics.rebuild(read_history(json_path))
+        analytics.save()
+    return analytics
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+调试现场的环形缓冲区
+只在某一步失败或本次运行被抽样时记录调试现场（页面源码、截图、验证码图片、各阶段耗时），
+由后台线程压缩后写入 data/debug_runs/<运行ID>/，按运行ID建立索引；
+超过保留的运行次数或总大小时删除最旧的记录。正常运行不产生任何调试文件读写
+
+用法：
+    python src/debug_capture.py list                         # 列出保留的调试记录
+    python src/debug_capture.py extract <运行ID> -o 目录      # 解压某次运行的调试文件
+"""
+
+import io
+import os
+import sys
+import gzip
+import json
+import queue
+import random
+import shutil
+import argparse
+import threading
+from datetime import datetime
+
+from safe_io import FileLock, atomic_write
+
+DEBUG_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'debug_runs')
+INDEX_NAME = "index.json"
+
+# 已经压缩过的格式不再gzip
+STORED_EXTENSIONS = (".png", ".jpg", ".gz")
+
+
+class DebugCapture:
+    """一次运行的调试现场记录器；add只把数据放入队列，压缩与写盘在后台线程中进行"""
+
+    def __init__(self, run_id, directory=DEBUG_DIR, max_runs=20, max_bytes=50 * 1024 * 1024,
+                 sample_rate=0.0, logger=None, rng=None):
+        self.run_id = run_id
+        self.directory = directory
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        self.logger = logger
+        # 抽样的运行即使成功也保存完整现场，用于对比正常页面
+        self.sampled = (rng or random).random() < sample_rate
+        self.reason = None
+        self.queue = None
+        self.thread = None
+        self.lock = FileLock(os.path.join(directory, INDEX_NAME + ".lock"))
+
+    @classmethod
+    def from_config(cls, config, run_id, logger=None, directory=DEBUG_DIR):
+        """从配置字典创建记录器"""
+        config = config or {}
+        return cls(
+            run_id,
+            directory,
+            max_runs=config.get("max_runs", 20),
+            max_bytes=int(config.get("max_mb", 50) * 1024 * 1024),
+            sample_rate=config.get("sample_rate", 0.0),
+            logger=logger,
+        )
+
+    @property
+    def captured(self):
+        """本次运行是否已记录过调试现场"""
+        return self.queue is not None
+
+    def add(self, name, data, reason=None):
+        """记录一个调试文件；data可以是bytes、str，或在后台线程中才调用的无参函数（如图片编码）"""
+        if self.queue is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.queue = queue.Queue()
+            self.thread = threading.Thread(target=self._writer, name="debug-capture", daemon=True)
+            self.thread.start()
+        if reason and not self.reason:
+            self.reason = reason
+        self.queue.put((name, data))
+
+    def add_image(self, name, image, reason=None):
+        """记录PIL图片，PNG编码在后台线程中进行"""
+        def encode():
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            return buffer.getvalue()
+        self.add(name, encode, reason)
+
+    def _writer(self):
+        """后台线程：压缩并写入调试文件，收到结束标记后更新索引"""
+        run_dir = os.path.join(self.directory, self.run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        artifacts = []
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            name, data = item
+            try:
+                if callable(data):
+                    data = data()
+                if isinstance(data, str):
+                    data = data.encode('utf-8')
+                if not name.endswith(STORED_EXTENSIONS):
+                    data = gzip.compress(data, 6)
+                    name += ".gz"
+                with open(os.path.join(run_dir, name), 'wb') as f:
+                    f.write(data)
+                artifacts.append({"name": name, "bytes": len(data)})
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"保存调试文件 {name} 失败: {e}")
+        try:
+            self._update_index(artifacts)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"更新调试记录索引失败: {e}")
+
+    def _update_index(self, artifacts):
+        """把本次运行加入索引，并按运行次数与总大小淘汰最旧的记录"""
+        with self.lock:
+            index = load_index(self.directory)
+            runs = [run for run in index["runs"] if run["run_id"] != self.run_id]
+            runs.append({
+                "run_id": self.run_id,
+                "saved_at": datetime.now().isoformat(timespec='seconds'),
+                "reason": self.reason or ("sampled" if self.sampled else "unknown"),
+                "bytes": sum(a["bytes"] for a in artifacts),
+                "artifacts": artifacts,
+            })
+            total = sum(run["bytes"] for run in runs)
+            while len(runs) > 1 and (len(runs) > self.max_runs or total > self.max_bytes):
+                oldest = runs.pop(0)
+                total -= oldest["bytes"]
+                shutil.rmtree(os.path.join(self.directory, oldest["run_id"]), ignore_errors=True)
+            with atomic_write(os.path.join(self.directory, INDEX_NAME)) as f:
+                json.dump({"runs": runs}, f, ensure_ascii=False, indent=1)
+
+    def close(self, timeout=30):
+        """等待后台线程写完；没有记录过调试现场时不做任何事"""
+        if self.queue is None:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        if self.logger:
+            self.logger.info(f"调试现场已保存到 {os.path.join(self.directory, self.run_id)}")
+
+
+def load_index(directory=DEBUG_DIR):
+    """读取调试记录索引"""
+    try:
+        with open(os.path.join(directory, INDEX_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"runs": []}
+
+
+def read_artifact(run_id, name, directory=DEBUG_DIR):
+    """读取一个调试文件（已解压）"""
+    with open(os.path.join(directory, run_id, name), 'rb') as f:
+        data = f.read()
+    return gzip.decompress(data) if name.endswith(".gz") else data
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="查看调试现场记录")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出保留的调试记录")
+    extract = sub.add_parser("extract", help="解压某次运行的调试文件")
+    extract.add_argument("run_id")
+    extract.add_argument("-o", "--output", default=".", help="输出目录")
+    args = parser.parse_args()
+
+    runs = load_index()["runs"]
+    if args.command == "list":
+        for run in runs:
+            names = ", ".join(a["name"] for a in run["artifacts"])
+            print(f"{run['run_id']}  {run['saved_at']}  {run['reason']:<20} {run['bytes'] / 1024:8.1f} KB  {names}")
+        if not runs:
+            print("没有调试记录")
+        return 0
+
+    run = next((run for run in runs if run["run_id"] == args.run_id), None)
+    if run is None:
+        print(f"错误：没有运行 {args.run_id} 的调试记录", file=sys.stderr)
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    for artifact in run["artifacts"]:
+        name = artifact["name"]
+        path = os.path.join(args.output, name[:-3] if name.endswith(".gz") else name)
+        with open(path, 'wb') as f:
+            f.write(read_artifact(args.run_id, name))
+        print(f"已解压: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+读数流式导出
+按固定条数分块遍历读数存储的内存映射，逐块转换为CSV、JSON行或Parquet并立即输出，
+内存占用与导出的数据量无关；可按房间与时间范围筛选，并可边生成边gzip压缩。
+网页面板的 /export 接口与命令行共用这里的生成器
+
+用法：
+    python src/export_readings.py --format csv --room 422 --start 2025-09-01 --end 2025-10-01 -o 422.csv.gz
+    python src/export_readings.py --format jsonl --room "*" > all.jsonl
+    python src/export_readings.py --format parquet --shape intervals -o readings.parquet
+"""
+
+import io
+import sys
+import zlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from reading_store import DEFAULT_ROOM, UNIT, open_store, to_epoch_us, to_datetime64
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# 每块处理的区间记录数
+CHUNK_RECORDS = 100_000
+# 房间参数取该值时导出全部房间
+ALL_ROOMS = "*"
+
+FORMATS = {
+    "csv": {"mimetype": "text/csv", "extension": "csv"},
+    "jsonl": {"mimetype": "application/x-ndjson", "extension": "jsonl"},
+    "parquet": {"mimetype": "application/vnd.apache.parquet", "extension": "parquet"},
+}
+# readings：逐条读数（每段区间的首次与最后一次读数，与JSON/CSV历史一致）；intervals：区间记录
+SHAPES = ("readings", "intervals")
+
+
+def record_chunks(store, room=DEFAULT_ROOM, start=None, end=None, chunk_records=CHUNK_RECORDS):
+    """分块产出与 [start, end) 有重叠的区间记录：先逐个产出有重叠的归档分区，
+    再分块遍历存储文件；每块只复制该块中符合条件的记录"""
+    room_id = None
+    if room != ALL_ROOMS:
+        room_id = store.room_id(room)
+        if room_id is None:
+            return
+    for part in store.iter_archived(None if room_id is None else room, start, end):
+        if len(part):
+            yield part
+    records = store.records()
+    stop = len(records) if end is None else int(np.searchsorted(records['first_seen'], to_epoch_us(end)))
+    start_us = None if start is None else to_epoch_us(start)
+    for offset in range(0, stop, chunk_records):
+        chunk = records[offset:min(offset + chunk_records, stop)]
+        mask = np.ones(len(chunk), dtype=bool)
+        if room_id is not None:
+            mask &= chunk['room'] == room_id
+        if start_us is not None:
+            mask &= chunk['last_seen'] >= start_us
+        if mask.any():
+            yield np.array(chunk[mask])
+
+
+def expand_readings(chunk, start=None, end=None):
+    """把区间记录展开为读数：每段产出首次读数，读数次数大于1时再产出最后一次读数；返回 (时间, 电量, 房间编号)"""
+    repeats = 1 + (chunk['count'] > 1)
+    index = np.repeat(np.arange(len(chunk)), repeats)
+    times = chunk['first_seen'][index]
+    # 每段区间展开后的第二条是最后一次读数
+    second = np.cumsum(repeats)[repeats > 1] - 1
+    times[second] = chunk['last_seen'][repeats > 1]
+    keep = np.ones(len(times), dtype=bool)
+    if start is not None:
+        keep &= times >= to_epoch_us(start)
+    if end is not None:
+        keep &= times < to_epoch_us(end)
+    return times[keep], chunk['value'][index][keep], chunk['room'][index][keep]
+
+
+def chunk_frames(store, room=DEFAULT_ROOM, start=None, end=None, shape="readings", chunk_records=CHUNK_RECORDS):
+    """分块产出待导出的DataFrame，列名与原有JSON/CSV格式一致，并附加房间列"""
+    rooms = np.array(store.rooms(), dtype=object)
+    for chunk in record_chunks(store, room, start, end, chunk_records):
+        if shape == "intervals":
+            frame = pd.DataFrame({
+                "first_seen": np.datetime_as_string(to_datetime64(chunk['first_seen']), unit='us'),
+                "last_seen": np.datetime_as_string(to_datetime64(chunk['last_seen']), unit='us'),
+                "count": chunk['count'],
+                "num": chunk['value'],
+                "unit": UNIT,
+                "room": rooms[chunk['room']],
+            })
+        else:
+            times, values, room_ids = expand_readings(chunk, start, end)
+            frame = pd.DataFrame({
+                "time": np.datetime_as_string(to_datetime64(times), unit='us'),
+                "num": values,
+                "unit": UNIT,
+                "room": rooms[room_ids],
+            })
+        if len(frame):
+            yield frame
+
+
+def csv_chunks(frames):
+    """CSV字节块（表头只在第一块输出）"""
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header, lineterminator="\n").encode('utf-8')
+        header = False
+
+
+def jsonl_chunks(frames):
+    """JSON行字节块，读数使用与JSON历史相同的字段名"""
+    for frame in frames:
+        frame = frame.rename(columns={"time": "timestamp", "num": "remaining_electricity"})
+        yield frame.to_json(orient="records", lines=True, force_ascii=False).encode('utf-8')
+
+
+def parquet_chunks(frames):
+    """Parquet字节块：每块写成一个行组，写完即取出缓冲区内容，最后输出文件尾"""
+    buffer = io.BytesIO()
+    writer = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(buffer, table.schema)
+        writer.write_table(table)
+        yield _drain(buffer)
+    if writer is not None:
+        writer.close()
+        yield _drain(buffer)
+
+
+def _drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def gzip_chunks(chunks, level=6):
+    """边生成边gzip压缩"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(store, fmt="csv", room=DEFAULT_ROOM, start=None, end=None,
+                  shape="readings", gzip=False, chunk_records=CHUNK_RECORDS):
+    """导出的字节流生成器"""
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    if shape not in SHAPES:
+        raise ValueError(f"不支持的导出内容: {shape}")
+    if fmt == "parquet" and pq is None:
+        raise RuntimeError("导出Parquet需要安装pyarrow（pip install pyarrow）")
+    # 在开始输出之前检查时间格式，避免响应输出到一半才出错
+    for stamp in (start, end):
+        if stamp is not None:
+            to_epoch_us(stamp)
+    frames = chunk_frames(store, room, start, end, shape, chunk_records)
+    writer = {"csv": csv_chunks, "jsonl": jsonl_chunks, "parquet": parquet_chunks}[fmt]
+    chunks = (chunk for chunk in writer(frames) if chunk)
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+def export_filename(fmt, room=DEFAULT_ROOM, gzip=False):
+    """下载时的默认文件名"""
+    suffix = {DEFAULT_ROOM: "", ALL_ROOMS: "-all"}.get(room, f"-{room}")
+    name = f"electricity_data{suffix}.{FORMATS[fmt]['extension']}"
+    return name + ".gz" if gzip else name
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="流式导出读数（CSV / JSON行 / Parquet）")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--room", default=DEFAULT_ROOM, help=f"房间名，{ALL_ROOMS} 表示全部房间")
+    parser.add_argument("--start", help="开始时间（含），如 2025-09-01")
+    parser.add_argument("--end", help="结束时间（不含）")
+    parser.add_argument("--shape", choices=SHAPES, default="readings", help="导出逐条读数或区间记录")
+    parser.add_argument("--gzip", action="store_true", help="gzip压缩（输出文件名以.gz结尾时自动启用）")
+    parser.add_argument("-o", "--output", help="输出文件（默认输出到标准输出）")
+    args = parser.parse_args()
+
+    compress = args.gzip or bool(args.output and args.output.endswith('.gz'))
+    try:
+        chunks = export_chunks(open_store(), args.format, args.room, args.start, args.end, args.shape, compress)
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+    except (ValueError, RuntimeError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 1
+    if args.output:
+        print(f"已导出到: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史读数批量导入工具
+分块流式读取任意多个JSON行与CSV历史文件（支持.gz压缩），用pandas/NumPy向量化解析时间，
+按文件名分配房间（electricity_data-422.csv 对应房间 422，没有后缀的对应默认房间），
+所有文件合并后一次排序去重，再在一次加锁、一次重写中写入读数存储；
+已被存储中同值区间覆盖的读数会被跳过，重复导入同一批文件不会重复计数
+
+用法：
+    python src/import_history.py                      # 导入data目录下全部 electricity_data*.json/csv
+    python src/import_history.py old/*.csv --room 422 # 指定文件，全部归入房间422
+    python src/import_history.py backup.jsonl.gz --dry-run
+"""
+
+import io
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import time
+import argparse
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from reading_store import DATA_DIR, DEFAULT_ROOM, open_store
+
+# 每次读取的行数，大文件按块流式解析
+CHUNK_ROWS = 500_000
+
+FILE_PATTERN = re.compile(r'^electricity_data(?:-(.+?))?\.(?:csv|json|jsonl)(?:\.gz)?$')
+
+
+def room_for_path(path, default=DEFAULT_ROOM):
+    """根据文件名推断房间：electricity_data-<房间>.csv/json 对应该房间，其余文件归入默认房间"""
+    match = FILE_PATTERN.match(os.path.basename(path))
+    if match and match.group(1):
+        return match.group(1)
+    return default
+
+
+def file_format(path):
+    """按扩展名判断文件格式（csv或json），忽略.gz后缀"""
+    name = path[:-3] if path.endswith('.gz') else path
+    return "csv" if name.lower().endswith('.csv') else "json"
+
+
+def default_inputs(data_dir=DATA_DIR):
+    """data目录下的全部兼容历史文件"""
+    paths = glob.glob(os.path.join(data_dir, 'electricity_data*'))
+    return sorted(p for p in paths if FILE_PATTERN.match(os.path.basename(p)))
+
+
+def parse_chunk(stamps, values):
+    """向量化解析一块数据，返回 (微秒时间戳, 电量)，无法解析的行被丢弃"""
+    times = pd.to_datetime(pd.Series(stamps, dtype=object), format='ISO8601', errors='coerce')
+    if getattr(times.dt, 'tz', None) is not None:
+        # 与存储一致，按钟面值保存，不做时区换算
+        times = times.dt.tz_localize(None)
+    nums = pd.to_numeric(pd.Series(values), errors='coerce')
+    valid = times.notna().to_numpy() & nums.notna().to_numpy()
+    epoch_us = times.to_numpy()[valid].astype('datetime64[us]').astype(np.int64)
+    return epoch_us, nums.to_numpy(dtype=np.float64)[valid]
+
+
+def read_csv_chunks(path, chunk_rows=CHUNK_ROWS):
+    """分块读取CSV历史（time,num,unit）"""
+    reader = pd.read_csv(path, usecols=['time', 'num'], dtype={'time': str},
+                         chunksize=chunk_rows, on_bad_lines='skip')
+    for chunk in reader:
+        yield parse_chunk(chunk['time'], chunk['num'])
+
+
+def read_json_chunks(path, chunk_rows=CHUNK_ROWS):
+    """分块读取JSON行历史；某块中有损坏的行时，该块逐行解析并跳过损坏的行"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                break
+            try:
+                chunk = pd.read_json(io.StringIO(''.join(lines)), lines=True, dtype=False, convert_dates=False)
+            except ValueError:
+                items = []
+                for line in lines:
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        continue
+                chunk = pd.DataFrame([item for item in items if isinstance(item, dict)])
+            if chunk.empty or not {'timestamp', 'remaining_electricity'} <= set(chunk.columns):
+                continue
+            yield parse_chunk(chunk['timestamp'], chunk['remaining_electricity'])
+
+
+def read_history(path, chunk_rows=CHUNK_ROWS):
+    """读取一个历史文件，返回 (微秒时间戳, 电量) 两个数组"""
+    reader = read_csv_chunks if file_format(path) == "csv" else read_json_chunks
+    parts = list(reader(path, chunk_rows))
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def merge_readings(files):
+    """合并多个文件的读数：files为 [(房间, 时间数组, 电量数组)]；
+    同一房间同一时间的重复读数只保留最后出现的一条（后面的文件优先），返回 {房间: (时间, 电量)}"""
+    frames = [pd.DataFrame({"room": room, "time": times, "value": values})
+              for room, times, values in files if len(times)]
+    if not frames:
+        return {}
+    merged = pd.concat(frames, ignore_index=True)
+    merged = merged.drop_duplicates(['room', 'time'], keep='last').sort_values(['room', 'time'], kind='stable')
+    return {room: (group['time'].to_numpy(), group['value'].to_numpy())
+            for room, group in merged.groupby('room', sort=False)}
+
+
+def import_history(paths, room=None, store=None, dry_run=False, chunk_rows=CHUNK_ROWS):
+    """导入历史文件，room为None时按文件名推断房间；返回导入报告"""
+    started = time.perf_counter()
+    report = {"files": [], "rooms": {}}
+    files = []
+    for path in paths:
+        file_room = room or room_for_path(path)
+        times, values = read_history(path, chunk_rows)
+        files.append((file_room, times, values))
+        report["files"].append({"path": path, "room": file_room, "readings": len(times)})
+
+    merged = merge_readings(files)
+    for file_room, (times, _) in merged.items():
+        read = sum(len(t) for r, t, _ in files if r == file_room)
+        report["rooms"][file_room] = {"read": read, "unique": len(times), "added": 0}
+
+    if not dry_run and merged:
+        store = store or open_store()
+        for file_room, added in store.bulk_load(merged).items():
+            report["rooms"][file_room]["added"] = added
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def print_report(report, dry_run=False):
+    """打印导入报告"""
+    for item in report["files"]:
+        print(f"  {item['path']} -> 房间 {item['room']}: {item['readings']} 条读数")
+    for room, stats in report["rooms"].items():
+        added = "（试运行，未写入）" if dry_run else f"，新增 {stats['added']} 条"
+        print(f"房间 {room}: 读取 {stats['read']} 条，去重后 {stats['unique']} 条{added}")
+    print(f"耗时 {report['seconds']:.2f} 秒")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="批量导入历史读数到读数存储")
+    parser.add_argument("files", nargs="*", help="JSON行或CSV历史文件（默认导入data目录下的 electricity_data*.json/csv）")
+    parser.add_argument("--room", help="把所有文件归入该房间（默认按文件名推断）")
+    parser.add_argument("--dry-run", action="store_true", help="只解析与去重，不写入存储")
+    args = parser.parse_args()
+
+    paths = args.files or default_inputs()
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing or not paths:
+        print(f"错误：找不到历史文件 {' '.join(missing)}")
+        return 1
+
+    report = import_history(paths, args.room, dry_run=args.dry_run)
+    print_report(report, args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行日志分析工具
+单遍流式读取运行日志（包括轮转和gzip压缩的旧日志），内存占用与日志大小无关；
+还原每次运行并统计运行耗时分布、每次登录的验证码尝试次数、首次识别成功率、
+成功的电量提取方法以及按时间段统计的失败原因
+
+用法：
+    python src/log_analyzer.py [日志文件 ...] [--period day|week|month] [--json]
+"""
+
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import math
+import argparse
+from datetime import datetime
+
+LOG_PATH = os.path.join(os.path.dirname(__file__), '..', 'logs', 'nju_electric_monitor.log')
+
+LINE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) - (\w+) - (.*)$')
+
+# 标志一次运行开始的日志（旧版本中初始化浏览器是每次运行最先输出的日志，
+# 现在浏览器在流程开始并通过熔断检查后才启动，同一次运行中先出现流程开始再出现浏览器初始化）
+RUN_START_MARKERS = ("使用本地ChromeDriver", "浏览器驱动初始化失败")
+RUN_FLOW_START = "开始南京大学电费监控流程"
+RUN_END_MARKERS = ("本次运行耗时",)
+
+EXTRACTION_METHODS = (
+    ("成功提取剩余电量", "css_span"),
+    ("从i标签中提取剩余电量", "css_i"),
+    ("从页面源码中提取到剩余电量", "page_source"),
+    ("从元素中提取剩余电量", "xpath"),
+)
+
+# 运行耗时直方图的分桶上界（秒），用于在常数内存下估算分位数
+DURATION_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300, 600, 1200, 3600, math.inf)
+
+
+def rotated_segments(log_path):
+    """返回日志文件及其轮转文件，按从旧到新的顺序排列"""
+    numbered = []
+    dated = []
+    for path in glob.glob(glob.escape(log_path) + ".*"):
+        suffix = path[len(log_path) + 1:]
+        if suffix.endswith(".gz"):
+            suffix = suffix[:-3]
+        if suffix.isdigit():
+            numbered.append((int(suffix), path))
+        else:
+            dated.append((suffix, path))
+    # 按大小轮转时编号越大越旧；按时间轮转时后缀为日期
+    paths = [p for _, p in sorted(dated)] + [p for _, p in sorted(numbered, reverse=True)]
+    if os.path.exists(log_path):
+        paths.append(log_path)
+    return paths
+
+
+def open_log(path):
+    """以文本方式打开日志，自动识别gzip压缩"""
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def iter_entries(paths):
+    """逐行产出 (时间, 级别, 消息, 运行ID)，支持文本格式与JSON行格式"""
+    for path in paths:
+        with open_log(path) as f:
+            for line in f:
+                if line.startswith("{"):
+                    try:
+                        item = json.loads(line)
+                        yield (datetime.fromisoformat(item["time"]), item["level"],
+                               item["message"], item.get("run_id"))
+                    except (ValueError, KeyError):
+                        pass
+                    continue
+                match = LINE_PATTERN.match(line.rstrip("\n"))
+                if match:
+                    moment = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
+                    moment = moment.replace(microsecond=int(match.group(2)) * 1000)
+                    yield moment, match.group(3), match.group(4), None
+
+
+def normalize_cause(message):
+    """把错误消息归一化为失败原因（去掉具体的异常内容）"""
+    return re.split(r'[:：]', message, 1)[0].strip()
+
+
+class RunState:
+    """单次运行中解析出的信息"""
+
+    def __init__(self, start, run_id=None):
+        self.start = start
+        self.end = start
+        self.run_id = run_id
+        self.captcha_attempts = 0
+        self.captcha_rejections = 0
+        self.captcha_passed = False
+        self.manual = False
+        self.extraction_method = None
+        self.saved = False
+        self.errors = []
+        self.flow_started = False
+        self.browser_started = False
+
+    def feed(self, level, message):
+        """根据一条日志更新运行状态"""
+        if message.startswith("验证码识别尝试"):
+            self.captcha_attempts += 1
+        elif message.startswith("检测到无效的验证码提示"):
+            self.captcha_rejections += 1
+        elif message.startswith(("未检测到无效验证码提示", "手动验证码通过")):
+            self.captcha_passed = True
+        elif message.startswith("自动验证码识别失败"):
+            self.manual = True
+        elif message.startswith("数据已保存"):
+            self.saved = True
+        elif message.startswith(RUN_FLOW_START):
+            self.flow_started = True
+        elif message.startswith(RUN_START_MARKERS):
+            self.browser_started = True
+        else:
+            for prefix, method in EXTRACTION_METHODS:
+                if message.startswith(prefix):
+                    self.extraction_method = method
+                    break
+        if level in ("ERROR", "CRITICAL"):
+            # 只保留最近的几条错误，保证单次运行的内存占用有上限
+            self.errors = (self.errors + [message])[-5:]
+        elif message.startswith(("未能提取到剩余电量信息", "未输入验证码")):
+            self.errors = (self.errors + [message])[-5:]
+
+    def failure_cause(self):
+        """失败运行的原因：最后一条错误"""
+        if self.saved:
+            return None
+        if self.errors:
+            return normalize_cause(self.errors[-1])
+        return "未完成（日志中断）"
+
+
+class LogStats:
+    """跨运行累计的统计量，内存占用只与分桶和时间段数量有关"""
+
+    def __init__(self, period="month"):
+        self.period = period
+        self.runs = 0
+        self.successes = 0
+        self.duration_buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_sum = 0.0
+        self.duration_min = None
+        self.duration_max = None
+        self.attempt_histogram = {}
+        self.logins = 0
+        self.first_try_successes = 0
+        self.manual_inputs = 0
+        self.rejections = 0
+        self.extraction_methods = {}
+        self.failure_causes = {}
+        self.failures_by_period = {}
+
+    def period_key(self, moment):
+        """时间段标识"""
+        if self.period == "day":
+            return moment.strftime("%Y-%m-%d")
+        if self.period == "week":
+            year, week, _ = moment.isocalendar()
+            return f"{year}-W{week:02d}"
+        return moment.strftime("%Y-%m")
+
+    def add(self, run):
+        """累计一次运行"""
+        self.runs += 1
+        duration = (run.end - run.start).total_seconds()
+        self.duration_sum += duration
+        self.duration_min = duration if self.duration_min is None else min(self.duration_min, duration)
+        self.duration_max = duration if self.duration_max is None else max(self.duration_max, duration)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                self.duration_buckets[i] += 1
+                break
+
+        if run.captcha_attempts:
+            self.logins += 1
+            self.attempt_histogram[run.captcha_attempts] = self.attempt_histogram.get(run.captcha_attempts, 0) + 1
+            if run.captcha_attempts == 1 and run.captcha_rejections == 0 and run.captcha_passed and not run.manual:
+                self.first_try_successes += 1
+        self.rejections += run.captcha_rejections
+        self.manual_inputs += int(run.manual)
+
+        if run.extraction_method:
+            self.extraction_methods[run.extraction_method] = self.extraction_methods.get(run.extraction_method, 0) + 1
+
+        cause = run.failure_cause()
+        if cause is None:
+            self.successes += 1
+        else:
+            self.failure_causes[cause] = self.failure_causes.get(cause, 0) + 1
+            period = self.failures_by_period.setdefault(self.period_key(run.start), {})
+            period[cause] = period.get(cause, 0) + 1
+
+    def quantile(self, q):
+        """根据分桶估算分位数（返回所在桶的上界）"""
+        if not self.runs:
+            return None
+        target = q * self.runs
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, self.duration_buckets):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.duration_max)
+        return self.duration_max
+
+    def report(self):
+        """生成统计结果"""
+        return {
+            "runs": self.runs,
+            "successes": self.successes,
+            "success_rate": self.successes / self.runs if self.runs else None,
+            "duration": {
+                "mean": self.duration_sum / self.runs if self.runs else None,
+                "min": self.duration_min,
+                "max": self.duration_max,
+                "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99),
+                "buckets": {("inf" if math.isinf(b) else str(b)): c
+                            for b, c in zip(DURATION_BUCKETS, self.duration_buckets)},
+            },
+            "captcha": {
+                "logins": self.logins,
+                "attempts_per_login": dict(sorted(self.attempt_histogram.items())),
+                "mean_attempts": (sum(k * v for k, v in self.attempt_histogram.items()) / self.logins
+                                  if self.logins else None),
+                "first_try_success_rate": self.first_try_successes / self.logins if self.logins else None,
+                "rejections": self.rejections,
+                "manual_inputs": self.manual_inputs,
+            },
+            "extraction_methods": self.extraction_methods,
+            "failure_causes": dict(sorted(self.failure_causes.items(), key=lambda kv: -kv[1])),
+            "failures_by_period": dict(sorted(self.failures_by_period.items())),
+        }
+
+
+def analyze(paths, period="month"):
+    """单遍分析日志，返回统计结果"""
+    stats = LogStats(period)
+    run = None
+    for moment, level, message, run_id in iter_entries(paths):
+        new_run = (
+            run is None
+            or (run_id is not None and run_id != run.run_id)
+            or (run_id is None and message.startswith(RUN_START_MARKERS) and run.browser_started)
+            or (run_id is None and message.startswith(RUN_FLOW_START) and run.flow_started)
+        )
+        if new_run:
+            if run is not None:
+                stats.add(run)
+            run = RunState(moment, run_id)
+        run.end = moment
+        run.feed(level, message)
+        if message.startswith(RUN_END_MARKERS):
+            stats.add(run)
+            run = None
+    if run is not None:
+        stats.add(run)
+    return stats.report()
+
+
+def format_rate(value):
+    """格式化百分比"""
+    return "--" if value is None else f"{value * 100:.1f}%"
+
+
+def print_report(report):
+    """打印文本格式的报告"""
+    print("=" * 60)
+    print("运行日志分析报告")
+    print("=" * 60)
+    print(f"运行次数: {report['runs']}，成功: {report['successes']}（{format_rate(report['success_rate'])}）")
+    duration = report["duration"]
+    if duration["mean"] is not None:
+        print("\n运行耗时（秒）:")
+        print(f"  平均 {duration['mean']:.1f}，最短 {duration['min']:.1f}，最长 {duration['max']:.1f}")
+        print(f"  P50 ≤ {duration['p50']:.0f}，P90 ≤ {duration['p90']:.0f}，P99 ≤ {duration['p99']:.0f}")
+        for bound, count in duration["buckets"].items():
+            if count:
+                label = f"> {DURATION_BUCKETS[-2]}s" if bound == "inf" else f"≤ {bound}s"
+                print(f"  {label:>8}: {count}")
+    captcha = report["captcha"]
+    print("\n验证码:")
+    print(f"  登录次数 {captcha['logins']}，首次识别成功率 {format_rate(captcha['first_try_success_rate'])}")
+    if captcha["mean_attempts"] is not None:
+        print(f"  平均尝试次数 {captcha['mean_attempts']:.2f}，被拒 {captcha['rejections']} 次，手动输入 {captcha['manual_inputs']} 次")
+    for attempts, count in captcha["attempts_per_login"].items():
+        print(f"  尝试 {attempts} 次: {count}")
+    print("\n电量提取方法:")
+    for method, count in report["extraction_methods"].items():
+        print(f"  {method}: {count}")
+    print("\n失败原因:")
+    for cause, count in report["failure_causes"].items():
+        print(f"  {cause}: {count}")
+    print("\n按时间段统计的失败:")
+    for period, causes in report["failures_by_period"].items():
+        print(f"  {period}: " + "，".join(f"{cause} × {count}" for cause, count in causes.items()))
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="分析监控运行日志")
+    parser.add_argument("logs", nargs="*", help="日志文件（默认分析logs目录下的日志及其轮转文件）")
+    parser.add_argument("--period", choices=["day", "week", "month"], default="month", help="失败原因的统计时间段")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args()
+
+    paths = []
+    for log in args.logs or [LOG_PATH]:
+        paths.extend(rotated_segments(log))
+    if not paths:
+        print("错误：找不到日志文件")
+        sys.exit(1)
+
+    report = analyze(paths, args.period)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
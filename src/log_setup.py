@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步日志配置
+调用线程只把日志记录放入队列，由后台线程写入文件和控制台；
+日志文件按大小或时间轮转，旧文件gzip压缩并限制保留数量，可选JSON行格式
+"""
+
+import os
+import gzip
+import json
+import shutil
+import atexit
+import logging
+import contextvars
+import logging.handlers
+from datetime import datetime
+from queue import SimpleQueue
+
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILENAME = 'nju_electric_monitor.log'
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+DEFAULT_LOGGING_CONFIG = {
+    "format": "text",          # text 或 json（JSON行格式）
+    "rotation": "size",        # size 按大小轮转，time 按时间轮转
+    "max_bytes": 5 * 1024 * 1024,
+    "when": "midnight",
+    "backup_count": 10,
+    "compress": True,
+    "levels": {},              # 按模块设置日志级别，如 {"selenium": "WARNING"}
+}
+
+# 当前运行的ID与阶段，由运行记录器设置，写入JSON日志
+run_id_var = contextvars.ContextVar('run_id', default=None)
+stage_var = contextvars.ContextVar('stage', default=None)
+
+_listener = None
+
+
+class ContextFilter(logging.Filter):
+    """在调用线程中为日志记录附加运行ID和阶段"""
+
+    def filter(self, record):
+        record.run_id = run_id_var.get()
+        record.stage = stage_var.get()
+        return True
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """JSON行格式"""
+
+    def format(self, record):
+        item = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "run_id": getattr(record, "run_id", None),
+            "stage": getattr(record, "stage", None),
+        }
+        if record.exc_info:
+            item["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            item["exc_info"] = record.exc_text
+        return json.dumps(item, ensure_ascii=False)
+
+
+def gzip_namer(name):
+    """轮转后的文件名追加.gz后缀"""
+    return name + ".gz"
+
+
+def gzip_rotator(source, dest):
+    """压缩轮转出的日志文件"""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def create_file_handler(log_path, options):
+    """根据配置创建按大小或按时间轮转的文件处理器"""
+    if options["rotation"] == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_path, when=options["when"], backupCount=options["backup_count"], encoding='utf-8'
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=options["max_bytes"], backupCount=options["backup_count"], encoding='utf-8'
+        )
+    if options["compress"]:
+        handler.namer = gzip_namer
+        handler.rotator = gzip_rotator
+    return handler
+
+
+def setup_logging(config=None, log_level=logging.INFO, log_dir=LOG_DIR):
+    """配置基于队列的异步日志，返回后台监听器"""
+    global _listener
+    options = {**DEFAULT_LOGGING_CONFIG, **((config or {}).get("logging") or {})}
+    os.makedirs(log_dir, exist_ok=True)
+
+    if options["format"] == "json":
+        formatter = JSONLinesFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    file_handler = create_file_handler(os.path.join(log_dir, LOG_FILENAME), options)
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    # 重复调用时先停止旧的监听器
+    if _listener is not None:
+        _listener.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+    log_queue = SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(log_level)
+    for name, level in options["levels"].items():
+        logging.getLogger(name).setLevel(level.upper() if isinstance(level, str) else level)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
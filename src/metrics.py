@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prometheus格式的指标
+计数器、仪表和直方图的更新只写当前线程自己的分片，热点路径上无需加锁；
+抓取时再把各线程的分片汇总为Prometheus文本格式。线程结束时它的分片并入公共的基础分片，
+每个请求一个线程的服务器上分片数不会随请求数增长
+"""
+
+import bisect
+import weakref
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_labels(names, values, extra=None):
+    """格式化标签，如 {stage="login",le="0.5"}"""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def format_value(value):
+    """格式化数值"""
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ShardOwner:
+    """保存在线程本地存储中的分片持有者；线程结束时被回收，触发分片合并"""
+
+    __slots__ = ("shard", "__weakref__")
+
+    def __init__(self):
+        self.shard = {}
+
+
+class Metric:
+    """指标基类：每个线程写自己的分片字典"""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        # 存活线程的分片（按id登记）与已结束线程合并后的基础分片
+        self._shards = {}
+        self._base = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        """返回当前线程的分片，只有线程第一次写入时需要加锁登记"""
+        owner = getattr(self._local, "owner", None)
+        if owner is None:
+            owner = self._local.owner = _ShardOwner()
+            with self._shards_lock:
+                self._shards[id(owner.shard)] = owner.shard
+            weakref.finalize(owner, self._retire, owner.shard)
+        return owner.shard
+
+    def _retire(self, shard):
+        """线程已结束：把它的分片并入基础分片并注销"""
+        with self._shards_lock:
+            self._shards.pop(id(shard), None)
+            for key, value in shard.items():
+                self._base[key] = self._merge(self._base.get(key), value)
+
+    def _merge(self, total, value):
+        """合并同一组标签的两个值（total可能为None）；返回新对象，不修改正在被抓取读取的值"""
+        return value if total is None else total + value
+
+    def _snapshots(self):
+        """复制所有分片（dict.copy在CPython中是原子操作）"""
+        with self._shards_lock:
+            shards = [self._base] + list(self._shards.values())
+            return [shard.copy() for shard in shards]
+
+    def samples(self):
+        """产出 (后缀, 标签字符串, 数值)"""
+        raise NotImplementedError
+
+    def render(self):
+        """渲染为Prometheus文本格式"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        """增加计数"""
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def samples(self):
+        totals = {}
+        for shard in self._snapshots():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        for key in sorted(totals):
+            yield "", format_labels(self.labelnames, key), totals[key]
+
+
+class Gauge(Metric):
+    """可任意设置的仪表，最后一次写入生效"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        # 仪表取最新值，所有线程共享一个字典；单个键的赋值在CPython中是原子操作
+        self._values = {}
+
+    def set(self, value, *labelvalues):
+        """设置当前值"""
+        self._values[labelvalues] = value
+
+    def remove(self, *labelvalues):
+        """删除一组标签对应的值"""
+        self._values.pop(labelvalues, None)
+
+    def samples(self):
+        values = self._values.copy()
+        for key in sorted(values):
+            yield "", format_labels(self.labelnames, key), values[key]
+
+
+class Histogram(Metric):
+    """累计分桶直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _merge(self, total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+    def observe(self, value, *labelvalues):
+        """记录一个观测值"""
+        shard = self._shard()
+        state = shard.get(labelvalues)
+        if state is None:
+            # [各桶计数..., +Inf桶计数, 总和]
+            state = shard[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def samples(self):
+        merged = {}
+        for shard in self._snapshots():
+            for key, state in shard.items():
+                total = merged.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, value in enumerate(list(state)):
+                    total[i] += value
+        for key in sorted(merged):
+            state = merged[key]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += count
+                yield "_bucket", format_labels(self.labelnames, key, ("le", format_value(float(bound)))), cumulative
+            yield "_sum", format_labels(self.labelnames, key), state[-1]
+            yield "_count", format_labels(self.labelnames, key), cumulative
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """注册指标并返回它"""
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """渲染所有指标"""
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
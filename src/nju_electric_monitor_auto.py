@@ -17,8 +17,10 @@ warnings.filterwarnings("ignore")
 import time
 import re
 import json
+import csv
 import os
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -29,16 +31,26 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import logging
 from PIL import Image
 import io
-import easyocr
 import getpass
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.ticker import MaxNLocator
-import matplotlib.font_manager as fm
 import numpy as np
 
+from consumption_analytics import load_analytics, analytics_state_path
+from alerting import AlertManager
+from run_recorder import RunRecorder
+from log_setup import setup_logging
+from captcha_preprocess import preprocess_captcha_image
+from trend_chart import render_trend_chart
+from reading_store import open_store, mirror_paths, trend_points, DEFAULT_ROOM
+from safe_io import append_line, flush_and_sync
+from resilience import (RetryBudget, CircuitBreaker, SiteTimeout, SiteUnavailable, AuthFailed,
+                        ParseFailed, OUTAGE_KINDS, classify, probe)
+from preflight import run_preflight, DEFAULT_CHROMEDRIVER_PATH
+from debug_capture import DebugCapture
+from config_manager import ConfigManager, ConfigError, RESTART_FIELDS
+from captcha_ocr import create_reader
+from ocr_worker import OCRWorker
+
 # PIL兼容性补丁 - 解决ANTIALIAS被弃用的问题
 try:
     from PIL import Image
@@ -47,12 +59,34 @@ try:
 except ImportError:
     pass
 
+DEFAULT_URL = "https://epay.nju.edu.cn/epay/h5/nju/electric/index"
+# 常驻运行时检查配置文件变化的间隔（秒）
+CONFIG_POLL_SECONDS = 5
+
 class NJUElectricMonitor:
-    def __init__(self, config_file="config.json"):
-        """初始化监控器"""
-        self.url = "https://epay.nju.edu.cn/epay/h5/nju/electric/index"
-        self.config_file = config_file
+    def __init__(self, config_file=None, profile=None):
+        """初始化监控器；config_file为配置文件路径（默认为项目根目录的config.json），profile为配置方案"""
+        self.recorder = RunRecorder()
+        self.config_manager = ConfigManager(config_file, profile)
+        self.config_file = self.config_manager.path
         self.config = self.load_config()
+        self.driver = None
+        self.wait = None
+        self.ocr_reader = None
+        self.analytics_summary = None
+        
+        # 设置日志级别
+        self.setup_logging(getattr(logging, self.config.get("log_level", "INFO")))
+        for warning in self.config_manager.warnings:
+            self.logger.warning(f"配置: {warning}")
+        self.apply_config()
+        
+    def apply_config(self, changed=None):
+        """读取配置中的各项设置；常驻运行时配置文件变化后再次调用，不重启浏览器和OCR"""
+        # 监控地址可配置，便于指向本地回放替身服务器进行离线测试
+        self.url = self.config.get("url", DEFAULT_URL)
+        # 房间名用于在读数存储中区分不同宿舍，未配置时沿用原有的数据文件
+        self.room = str(self.config.get("room", DEFAULT_ROOM))
         self.username = self.config.get("username", "")
         self.password = self.config.get("password", "")
         self.auto_login = self.config.get("auto_login", True)
@@ -60,64 +94,130 @@ class NJUElectricMonitor:
         self.captcha_retry_count = self.config.get("captcha_retry_count", 5)
         self.captcha_confidence_threshold = self.config.get("captcha_confidence_threshold", 0.3)
         self.save_captcha_images = self.config.get("save_captcha_images", True)
+        # 曲线图只画最近N天（0为全部历史），历史归档后生成图片的开销不随数据年限增长
+        self.chart_days = self.config.get("chart_days", 0)
+        self.chromedriver_path = self.config.get("chromedriver_path") or DEFAULT_CHROMEDRIVER_PATH
+        # 常驻运行时两次监控之间的间隔
+        self.interval_minutes = self.config.get("interval_minutes", 30)
+        # 容错设置：页面等待超时、探测超时、各类错误的重试预算与熔断器参数
+        resilience = self.config.get("resilience", {})
+        self.page_timeout = resilience.get("page_timeout", 20)
+        # 网站挂起时driver.get默认会等待300秒
+        self.page_load_timeout = resilience.get("page_load_timeout", 60)
+        self.probe_timeout = resilience.get("probe_timeout", 5)
+        if self.driver:
+            self.driver.set_page_load_timeout(self.page_load_timeout)
+            self.wait = WebDriverWait(self.driver, self.page_timeout)
+        
+        changed = changed or set()
+        if changed & {"log_level", "logging"}:
+            self.setup_logging(getattr(logging, self.config.get("log_level", "INFO")))
+        if "ocr" in changed and self.ocr_reader is not None:
+            # 下一次运行时按新配置重新加载OCR
+            self.close_ocr()
+        if self.driver and changed & set(RESTART_FIELDS):
+            self.logger.warning(f"{', '.join(sorted(changed & set(RESTART_FIELDS)))} 将在浏览器下次启动时生效")
+        
+    def prepare_run(self):
+        """为一次运行准备运行记录、调试现场、重试预算、告警与熔断器（每次运行都按当前配置重新创建）"""
+        if self.recorder.finished:
+            self.recorder = RunRecorder()
+        # 低电量告警（未配置规则时为None）
+        try:
+            self.alert_manager = AlertManager.from_config(self.config.get("alerts"), self.logger)
+        except Exception as e:
+            self.logger.error(f"告警配置无效: {e}")
+            self.alert_manager = None
+        
+        # 调试现场只在失败或抽样时记录，正常运行不写调试文件
+        self.debug = DebugCapture.from_config(self.config.get("debug_capture"), self.recorder.run_id, self.logger)
+        
+        resilience = self.config.get("resilience", {})
+        policies = {"captcha_rejected": {"attempts": self.captcha_retry_count}}
+        for kind, policy in resilience.get("retry", {}).items():
+            policies.setdefault(kind, {}).update(policy)
+        self.retry = RetryBudget(policies, self.logger)
+        self.breaker = CircuitBreaker.from_config(resilience.get("breaker"))
+        
+    def reload_config(self):
+        """配置文件有变化时重新加载并应用，返回有变化的配置项"""
+        changed = self.config_manager.reload()
+        if changed:
+            self.config = self.config_manager.config
+            self.apply_config(changed)
+            self.logger.info(f"配置已重新加载: {', '.join(sorted(changed))}")
+        return changed
+        
+    def accounts(self):
+        """要监控的房间与账号：配置了accounts时逐个监控（未填写的账号密码沿用顶层设置），否则只监控顶层的房间"""
+        accounts = self.config.get("accounts") or [{"room": self.config.get("room", DEFAULT_ROOM)}]
+        return [{
+            "room": str(account["room"]),
+            "username": account.get("username", self.config.get("username", "")),
+            "password": account.get("password", self.config.get("password", "")),
+        } for account in accounts]
+        
+    def start_session(self):
+        """启动浏览器和OCR（熔断器允许运行后才启动，网站故障期间不浪费启动开销）；
+        常驻运行时沿用已启动的浏览器和已加载的OCR模型，只清除上一次登录的Cookie"""
+        if self.driver is not None:
+            try:
+                self.reset_session()
+                self.recorder.set(warm_session=True)
+            except Exception as e:
+                self.logger.warning(f"已启动的浏览器不可用，重新启动: {e}")
+                self.close_driver()
+        if self.driver is None:
+            with self.recorder.span("setup_driver"):
+                self.setup_driver()
+        if self.ocr_reader is None:
+            with self.recorder.span("setup_ocr"):
+                self.setup_ocr()
+        if isinstance(self.ocr_reader, OCRWorker):
+            # 子进程在后台加载模型，与打开登录页同时进行
+            self.ocr_reader.start()
+        
+    def reset_session(self):
+        """清除浏览器中所有域名的Cookie，下一次打开页面时重新登录"""
+        try:
+            self.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        except AttributeError:
+            self.driver.delete_all_cookies()
+        
+    def close_driver(self):
+        """关闭浏览器"""
+        try:
+            self.driver.quit()
+        except Exception as e:
+            self.logger.warning(f"关闭浏览器时出错: {e}")
         self.driver = None
         self.wait = None
-        self.ocr_reader = None
         
-        # 设置日志级别
-        log_level = getattr(logging, self.config.get("log_level", "INFO"))
-        self.setup_logging(log_level)
+    def release_ocr(self):
+        """登录后不再需要识别验证码：OCR在子进程中运行时按idle_ttl结束子进程，释放模型内存"""
+        if isinstance(self.ocr_reader, OCRWorker):
+            self.ocr_reader.release()
         
-        self.setup_driver()
-        self.setup_ocr()
+    def close_ocr(self):
+        """卸载OCR识别器（子进程模式下结束子进程）"""
+        if isinstance(self.ocr_reader, OCRWorker):
+            self.ocr_reader.close()
+        self.ocr_reader = None
         
     def setup_logging(self, log_level):
-        """设置日志"""
-        log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-        os.makedirs(log_dir, exist_ok=True)
-        log_path = os.path.join(log_dir, 'nju_electric_monitor.log')
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_path, encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        """设置日志（队列异步写入，按大小或时间轮转并压缩）"""
+        setup_logging(self.config, log_level)
         self.logger = logging.getLogger(__name__)
         
     def load_config(self):
-        """加载配置文件"""
-        try:
-            config_path = os.path.join(os.path.dirname(__file__), '..', 'config.json')
-            if os.path.exists(config_path):
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                # 创建默认配置文件
-                default_config = {
-                    "username": "",
-                    "password": "",
-                    "auto_login": True,
-                    "headless_mode": True,
-                    "captcha_retry_count": 3,
-                    "log_level": "INFO"
-                }
-                with open(config_path, 'w', encoding='utf-8') as f:
-                    json.dump(default_config, f, indent=4, ensure_ascii=False)
-                return default_config
-        except Exception as e:
-            print(f"加载配置文件失败: {e}")
-            return {}
+        """加载配置文件（不存在时创建默认配置），配置无效时抛出ConfigError"""
+        return self.config_manager.load()
         
     def save_config(self):
-        """保存配置文件"""
+        """把登录凭据保存到配置文件"""
         try:
-            self.config["username"] = self.username
-            self.config["password"] = self.password
-            config_path = os.path.join(os.path.dirname(__file__), '..', 'config.json')
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
+            self.config_manager.update(username=self.username, password=self.password)
+            self.config = self.config_manager.config
         except Exception as e:
             self.logger.error(f"保存配置文件失败: {e}")
         
@@ -134,12 +234,13 @@ class NJUElectricMonitor:
         chrome_options.add_argument("--disable-extensions")
         chrome_options.add_argument("--disable-plugins")
         try:
-            chromedriver_path = os.path.join(os.path.dirname(__file__), '..', 'chromedriver-win64', 'chromedriver.exe')
+            chromedriver_path = self.chromedriver_path
             if not os.path.exists(chromedriver_path):
                 raise FileNotFoundError(f"本地ChromeDriver不存在: {chromedriver_path}，请确保chromedriver-win64目录存在并包含chromedriver.exe")
             service = Service(chromedriver_path)
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            self.wait = WebDriverWait(self.driver, 20)
+            self.driver.set_page_load_timeout(self.page_load_timeout)
+            self.wait = WebDriverWait(self.driver, self.page_timeout)
             self.logger.info(f"使用本地ChromeDriver: {chromedriver_path}")
         except Exception as e:
             self.logger.error(f"浏览器驱动初始化失败: {e}")
@@ -148,14 +249,14 @@ class NJUElectricMonitor:
     def setup_ocr(self):
         """设置OCR识别器"""
         try:
-            model_dir = os.path.join(os.path.dirname(__file__), '..', 'models', 'ocr_models')
-            self.ocr_reader = easyocr.Reader(
-                ['ch_sim', 'en'],
-                gpu=False,
-                model_storage_directory=model_dir,
-                download_enabled=True
-            )
-            self.logger.info("OCR识别器初始化成功")
+            # 后端由配置中的 "ocr" 决定，easyocr只在选用EasyOCR时才导入；
+            # "worker": true 时识别器在子进程中按需加载，主进程不加载模型
+            ocr_config = self.config.get("ocr") or {}
+            if ocr_config.get("worker"):
+                self.ocr_reader = OCRWorker.from_config(ocr_config, self.logger)
+            else:
+                self.ocr_reader = create_reader(ocr_config, self.logger)
+            self.logger.info(f"OCR识别器初始化成功（{self.ocr_reader.name}）")
         except Exception as e:
             self.logger.error(f"OCR识别器初始化失败: {e}")
             if "ANTIALIAS" in str(e):
@@ -166,13 +267,16 @@ class NJUElectricMonitor:
     
     def get_user_credentials(self):
         """获取用户登录凭据"""
+        entered = False
         if not self.username:
             self.username = input("请输入用户名: ").strip()
+            entered = True
         if not self.password:
             self.password = getpass.getpass("请输入密码: ")
+            entered = True
         
         # 询问是否保存凭据
-        if not self.config.get("username") or not self.config.get("password"):
+        if entered:
             save_credentials = input("是否保存登录凭据到配置文件？(y/n): ").strip().lower()
             if save_credentials == 'y':
                 self.save_config()
@@ -180,6 +284,16 @@ class NJUElectricMonitor:
         
         self.logger.info("已获取登录凭据")
     
+    def open_login_page(self):
+        """打开页面并等待登录表单；浏览器显示网络错误页时立即失败，不再等待表单超时"""
+        self.logger.info(f"正在打开页面: {self.url}")
+        self.driver.get(self.url)
+        if self.driver.current_url.startswith("chrome-error://"):
+            raise SiteUnavailable("页面无法访问（浏览器网络错误页）", "open_page")
+        time.sleep(3)
+        if not self.wait_for_login_form():
+            raise SiteTimeout(f"登录表单在 {self.page_timeout} 秒内未加载", "login_form")
+
     def wait_for_login_form(self):
         """等待登录表单加载"""
         try:
@@ -316,35 +430,7 @@ class NJUElectricMonitor:
     def preprocess_captcha_image(self, img):
         """预处理验证码图像"""
         try:
-            # 转换为RGB模式
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # 调整图像大小 - 使用兼容的重采样方法
-            try:
-                img = img.resize((img.width * 2, img.height * 2), Image.Resampling.LANCZOS)
-            except AttributeError:
-                # 如果Resampling不可用，使用ANTIALIAS
-                img = img.resize((img.width * 2, img.height * 2), Image.ANTIALIAS)
-            
-            # 转换为灰度图
-            gray_img = img.convert('L')
-            
-            # 二值化处理
-            threshold = 128
-            binary_img = gray_img.point(lambda x: 0 if x < threshold else 255, '1')
-            
-            # 确保二值化后的图像为 uint8 类型
-            binary_img = binary_img.convert('L')
-            binary_img = binary_img.point(lambda x: 255 if x > 0 else 0, '1')
-            binary_img = binary_img.convert('L')
-            
-            # 降噪处理
-            from PIL import ImageFilter
-            denoised_img = binary_img.filter(ImageFilter.MedianFilter(size=3))
-            
-            return denoised_img
-            
+            return preprocess_captcha_image(img)
         except Exception as e:
             self.logger.warning(f"图像预处理失败: {e}")
             return img
@@ -418,16 +504,10 @@ class NJUElectricMonitor:
             for attempt in range(max_attempts):
                 self.fill_login_form()
                 if captcha_img:
-                    # 保存验证码图片用于调试
-                    if self.save_captcha_images:
-                        try:
-                            captcha_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'captcha_debug.png')
-                            captcha_img.save(captcha_path)
-                            self.logger.info(f"验证码图片已保存到 {captcha_path}")
-                        except Exception as e:
-                            self.logger.warning(f"保存验证码图片失败: {e}")
                     self.logger.info(f"验证码识别尝试 {attempt + 1}/{max_attempts}")
-                    captcha_text = self.recognize_captcha(captcha_img)
+                    self.recorder.count("captcha_attempts")
+                    with self.recorder.span("ocr", sample=True):
+                        captcha_text = self.recognize_captcha(captcha_img)
                     if captcha_text:
                         if self.fill_captcha(captcha_text):
                             self.logger.info(f"验证码填写完成，点击登录按钮...")
@@ -438,9 +518,20 @@ class NJUElectricMonitor:
                                     error_elem = self.driver.find_element(By.ID, "msg1")
                                     if error_elem.is_displayed() and "无效的验证码" in error_elem.text:
                                         self.logger.warning("检测到无效的验证码提示，准备重试...")
+                                        self.recorder.count("captcha_rejections")
+                                        if self.save_captcha_images:
+                                            label = re.sub(r'\W', '', captcha_text)
+                                            self.debug.add_image(f"captcha_{attempt + 1}_{label}.png",
+                                                                 captcha_img, "captcha_rejected")
+                                        # 带抖动的退避，避免连续快速提交
+                                        self.retry.backoff("captcha_rejected")
                                         # 重新获取验证码图片
                                         captcha_img = self.capture_captcha_image()
                                         continue
+                                    if error_elem.is_displayed() and "密码" in error_elem.text:
+                                        raise AuthFailed(error_elem.text.strip(), "login")
+                                except AuthFailed:
+                                    raise
                                 except NoSuchElementException:
                                     self.logger.info("未检测到无效验证码提示，验证码通过")
                                     return True
@@ -453,6 +544,9 @@ class NJUElectricMonitor:
                             self.logger.warning("验证码填写失败")
                     else:
                         self.logger.warning(f"验证码识别失败，尝试 {attempt + 1}")
+                        if self.save_captcha_images:
+                            self.debug.add_image(f"captcha_{attempt + 1}_unrecognized.png",
+                                                 captcha_img, "captcha_unrecognized")
                 else:
                     self.logger.info("未检测到验证码图片")
                     return True
@@ -465,6 +559,7 @@ class NJUElectricMonitor:
             except Exception as e:
                 self.logger.warning(f"无法显示验证码图片: {e}")
             manual_captcha = input("请手动输入验证码: ").strip()
+            self.recorder.count("captcha_manual")
             if manual_captcha:
                 self.fill_login_form()
                 if self.fill_captcha(manual_captcha):
@@ -490,6 +585,8 @@ class NJUElectricMonitor:
             else:
                 self.logger.warning("未输入验证码")
                 return False
+        except AuthFailed:
+            raise
         except Exception as e:
             self.logger.error(f"处理验证码时出错: {e}")
             return False
@@ -524,6 +621,14 @@ class NJUElectricMonitor:
             self.logger.info("等待登录成功...")
             time.sleep(5)  # 等待页面跳转
             
+            # 仍停留在登录页并提示用户名或密码错误：重试无益
+            try:
+                error_elem = self.driver.find_element(By.ID, "msg1")
+                if error_elem.is_displayed() and "密码" in error_elem.text:
+                    raise AuthFailed(error_elem.text.strip(), "login")
+            except NoSuchElementException:
+                pass
+            
             # 检查是否还在登录页面
             current_url = self.driver.current_url
             if "login" in current_url.lower() or "index" in current_url.lower():
@@ -533,6 +638,8 @@ class NJUElectricMonitor:
                 self.logger.info(f"页面已跳转到: {current_url}")
                 return True
                 
+        except AuthFailed:
+            raise
         except Exception as e:
             self.logger.error(f"等待登录成功时出错: {e}")
             return False
@@ -565,14 +672,6 @@ class NJUElectricMonitor:
         """提取剩余电量信息"""
         try:
             self.logger.info("开始提取剩余电量信息...")
-            try:
-                page_source = self.driver.page_source
-                debug_html_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'debug_page_source.html')
-                with open(debug_html_path, "w", encoding="utf-8") as f:
-                    f.write(page_source)
-                self.logger.info(f"页面源码已保存到 {debug_html_path}")
-            except Exception as e:
-                self.logger.warning(f"保存页面源码失败: {e}")
             
             # 方法1：使用精确的CSS选择器查找电量信息
             try:
@@ -587,6 +686,7 @@ class NJUElectricMonitor:
                     if match:
                         remaining_electricity = float(match.group(1))
                         self.logger.info(f"成功提取剩余电量: {remaining_electricity} 度")
+                        self.recorder.set(extraction_method="css_span")
                         return remaining_electricity
                     else:
                         self.logger.warning("未在元素中找到标准格式的电量信息")
@@ -609,6 +709,7 @@ class NJUElectricMonitor:
                     if match:
                         remaining_electricity = float(match.group(1))
                         self.logger.info(f"从i标签中提取剩余电量: {remaining_electricity} 度")
+                        self.recorder.set(extraction_method="css_i")
                         return remaining_electricity
                     else:
                         self.logger.warning("i标签中未找到标准格式的电量信息")
@@ -633,6 +734,7 @@ class NJUElectricMonitor:
                 if match:
                     remaining_electricity = float(match.group(1))
                     self.logger.info(f"从页面源码中提取到剩余电量: {remaining_electricity} 度")
+                    self.recorder.set(extraction_method="page_source")
                     return remaining_electricity
             
             # 方法4：查找所有包含"度"的元素
@@ -648,6 +750,7 @@ class NJUElectricMonitor:
                     if match:
                         remaining_electricity = float(match.group(1))
                         self.logger.info(f"从元素中提取剩余电量: {remaining_electricity} 度")
+                        self.recorder.set(extraction_method="xpath")
                         return remaining_electricity
                         
             except Exception as e:
@@ -660,6 +763,13 @@ class NJUElectricMonitor:
             self.logger.error(f"提取剩余电量时出错: {e}")
             return None
     
+    def extract_or_raise(self):
+        """提取剩余电量，找不到时抛出ParseFailed以便刷新页面后重试"""
+        remaining_electricity = self.extract_remaining_electricity()
+        if remaining_electricity is None:
+            raise ParseFailed("页面中未找到剩余电量", "extract")
+        return remaining_electricity
+    
     def save_data(self, remaining_electricity):
         """保存数据到文件"""
         try:
@@ -674,173 +784,262 @@ class NJUElectricMonitor:
                 "unit": "度"
             }
 
-            # 保存为json
-            json_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'electricity_data.json')
-            with open(json_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(data, ensure_ascii=False) + "\n")
-
-            # 重新从json文件读取所有数据，生成csv（字段顺序为time,num,unit）
-            import csv
-            csv_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'electricity_data.csv')
-            with open(json_path, "r", encoding="utf-8") as jf, \
-                 open(csv_path, "w", newline='', encoding="utf-8") as cf:
-                writer = csv.DictWriter(cf, fieldnames=["time", "num", "unit"])
-                writer.writeheader()
-                for line in jf:
-                    try:
-                        item = json.loads(line)
-                        writer.writerow({
-                            "time": item.get("timestamp"),
-                            "num": item.get("remaining_electricity"),
-                            "unit": item.get("unit")
-                        })
-                    except Exception:
-                        continue
-
-            self.logger.info(f"数据已保存: {remaining_electricity} 度")
-
-            # 生成网页版类似的曲线图并保存为PNG
-            try:
-                
-                csv_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'electricity_data.csv')
-                png_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'electricity_trend.png')
-                df = pd.read_csv(csv_path)
-                df['time'] = pd.to_datetime(df['time'])
-                df_sorted = df.sort_values('time')
-
-                # 设置深色科技感风格
-                plt.style.use('dark_background')
-                fig, ax = plt.subplots(figsize=(9, 4), dpi=200)
-                fig.patch.set_facecolor('#141e30')
-                ax.set_facecolor('#0a1428')
-
-                # 线条和点的颜色
-                line_color = '#1de9b6'
-                marker_color = '#00eaff'
-                grid_color = 'rgba(29,233,182,0.15)'
-                grid_color = (29/255, 233/255, 182/255, 0.15)
-                font_color = '#b2e6ff'
-                title_color = '#00eaff'
-
-                # 绘制曲线和点
-                ax.plot(df_sorted['time'], df_sorted['num'],
-                        color=line_color, linewidth=2.5, marker='o', markersize=6,
-                        markerfacecolor=marker_color, markeredgewidth=2, markeredgecolor=marker_color, zorder=3)
-
-                # 设置标题和标签
-                ax.set_title('电费变化曲线', fontsize=18, color=title_color, pad=18, fontweight='bold', fontname='Microsoft YaHei')
-                ax.set_xlabel('时间', fontsize=13, color=font_color, labelpad=10, fontname='Microsoft YaHei')
-                ax.set_ylabel('剩余电量 (度)', fontsize=13, color=font_color, labelpad=10, fontname='Microsoft YaHei')
-
-                # 坐标轴刻度
-                ax.tick_params(axis='x', colors=font_color, labelsize=10, rotation=30)
-                ax.tick_params(axis='y', colors=font_color, labelsize=10)
-                ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M'))
-                ax.xaxis.set_major_locator(mdates.AutoDateLocator(maxticks=8))
-                ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+            # 追加到二进制读数存储（首次运行时自动从JSON历史迁移）；
+            # 存储、兼容文件与用电统计在同一把文件锁下更新，多个监控实例同时运行时不会互相覆盖
+            store = open_store()
+            json_path, csv_path = mirror_paths(self.room)
+            with store.lock:
+                store.append(data["timestamp"], remaining_electricity, self.room)
+                # 进入新的月份后，把已经结束的月份移入分区归档
+                try:
+                    moved = store.roll_months()
+                    if moved:
+                        self.logger.info(f"已将 {moved} 段历史区间移入归档")
+                except Exception as e:
+                    self.logger.warning(f"归档历史读数失败: {e}")
 
-                # 虚线网格
-                ax.grid(True, which='major', axis='both', linestyle='--', linewidth=1, color=grid_color, alpha=1)
+                # 同步追加到兼容的JSON/CSV文件（字段顺序为time,num,unit），不再每次重写整个CSV
+                append_line(json_path, json.dumps(data, ensure_ascii=False) + "\n")
+                if os.path.exists(csv_path):
+                    with open(csv_path, "a", newline='', encoding="utf-8") as f:
+                        csv.writer(f).writerow([data["timestamp"], remaining_electricity, data["unit"]])
+                        flush_and_sync(f)
+                else:
+                    store.export_csv(csv_path, self.room)
 
-                # 去除顶部和右侧边框
-                ax.spines['top'].set_visible(False)
-                ax.spines['right'].set_visible(False)
-                for spine in ['bottom', 'left']:
-                    ax.spines[spine].set_color(font_color)
-                    ax.spines[spine].set_linewidth(1.2)
+                self.logger.info(f"数据已保存: {remaining_electricity} 度")
 
-                # 设置字体（优先微软雅黑）
+                # 增量更新该房间的用电统计（耗电速率、日用电量、可用天数预测），每个房间一个状态文件
+                self.analytics_summary = None
                 try:
-                    plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'Segoe UI', 'Arial Unicode MS']
-                except Exception:
-                    pass
+                    analytics = load_analytics(json_path, analytics_state_path(self.room))
+                    analytics.update(data["timestamp"], remaining_electricity)
+                    analytics.save()
+                    self.analytics_summary = analytics.summary()
+                    forecast = self.analytics_summary["forecast"]
+                    if forecast:
+                        self.logger.info(f"预计剩余电量可用 {forecast['days_to_empty']:.1f} 天")
+                except Exception as e:
+                    self.logger.warning(f"更新用电统计失败: {e}")
 
-                # 图例（可选）
-                # ax.legend(['剩余电量'], loc='upper right', fontsize=11, facecolor='#141e30', edgecolor='none', labelcolor=font_color)
+            # 提交告警评估，规则评估和通知发送都在后台线程中进行
+            if self.alert_manager:
+                self.alert_manager.submit(self.analytics_summary or {"balance": remaining_electricity}, self.room)
 
-                # 调整边距
-                plt.tight_layout(rect=[0, 0, 1, 0.97])
-                plt.savefig(png_path, facecolor=fig.get_facecolor(), bbox_inches='tight')
-                plt.close(fig)
+            # 生成网页版类似的曲线图并保存为PNG
+            try:
+                start = datetime.now() - timedelta(days=self.chart_days) if self.chart_days else None
+                png_path = render_trend_chart(trend_points(store.frame(self.room, start)))
                 self.logger.info(f"电费变化曲线图已保存到: {png_path}")
             except Exception as e:
                 self.logger.warning(f"生成电费曲线图PNG失败: {e}")
         except Exception as e:
             self.logger.error(f"保存数据时出错: {e}")
     
-    def run(self):
-        """运行监控流程"""
+    def capture_debug(self, outcome):
+        """记录失败（或被抽样）时的现场：页面源码、截图、当前地址与各阶段耗时"""
+        reason = outcome if outcome != "success" else "sampled"
+        for name, grab in (("page_source.html", lambda: self.driver.page_source),
+                           ("screenshot.png", lambda: self.driver.get_screenshot_as_png()),
+                           ("url.txt", lambda: self.driver.current_url)):
+            try:
+                self.debug.add(name, grab(), reason)
+            except Exception as e:
+                self.logger.warning(f"获取调试现场 {name} 失败: {e}")
+        self.debug.add("run.json", json.dumps(self.recorder.record(outcome), ensure_ascii=False, indent=2), reason)
+    
+    def run(self, keep_session=False):
+        """运行监控流程；keep_session为True时结束后不关闭浏览器，供下一次运行复用"""
+        self.prepare_run()
+        outcome = "error"
+        restart = False
+        span = self.recorder.span
         try:
             self.logger.info("开始南京大学电费监控流程（自动无头模式）")
             
+            # 0. 熔断器：网站故障期间跳过本次运行，冷却结束后先轻量探测
+            with span("breaker"):
+                state = self.breaker.check()
+                if state == "open":
+                    self.logger.warning(f"网站故障熔断中，跳过本次运行（{self.breaker.retry_after() / 60:.0f} 分钟后恢复尝试）")
+                    outcome = "circuit_open"
+                    return False
+                if state == "half_open":
+                    self.logger.info("熔断冷却结束，探测网站是否恢复...")
+                    try:
+                        probe(self.url, self.probe_timeout)
+                    except (SiteTimeout, SiteUnavailable) as e:
+                        self.breaker.record_failure(e.kind, str(e))
+                        self.logger.warning(f"网站仍不可用: {e}，熔断 {self.breaker.state['cooldown'] / 60:.0f} 分钟")
+                        outcome = "circuit_open"
+                        return False
+                    self.logger.info("网站已恢复响应")
+            
+            # 环境预检：依赖、ChromeDriver与OCR模型未变化时直接使用上次的检查结果
+            with span("preflight"):
+                if self.config.get("preflight", True):
+                    result = run_preflight(self.chromedriver_path, logger=self.logger, ocr=self.config.get("ocr"))
+                    if not result["ok"]:
+                        self.logger.error("运行环境检测未通过，请根据上方错误修复后再运行（python src/preflight.py --force）")
+                        outcome = "preflight_failed"
+                        return False
+            
             # 1. 获取登录凭据
-            self.get_user_credentials()
+            with span("credentials"):
+                self.get_user_credentials()
             
-            # 2. 打开页面
-            self.logger.info(f"正在打开页面: {self.url}")
-            self.driver.get(self.url)
-            time.sleep(3)
+            self.start_session()
             
-            # 3. 等待登录表单加载
-            if not self.wait_for_login_form():
-                self.logger.error("登录表单加载失败")
-                return False
+            # 2. 打开页面并等待登录表单加载（超时与网络错误按预算退避重试）
+            with span("open_page"):
+                try:
+                    self.retry.call("open_page", self.open_login_page)
+                except (SiteTimeout, SiteUnavailable):
+                    self.logger.error("登录表单加载失败")
+                    outcome = "login_form_failed"
+                    raise
+            self.breaker.record_success()
             
             # 4. 填写登录表单
-            if not self.fill_login_form():
-                self.logger.error("填写登录表单失败")
-                return False
+            with span("fill_form"):
+                if not self.fill_login_form():
+                    self.logger.error("填写登录表单失败")
+                    outcome = "fill_form_failed"
+                    return False
             
             # 5. 处理验证码
-            if not self.handle_captcha():
-                self.logger.warning("验证码处理失败，但继续尝试登录")
+            with span("captcha"):
+                if not self.handle_captcha():
+                    self.logger.warning("验证码处理失败，但继续尝试登录")
+                    self.recorder.set(captcha_failed=True)
+            self.release_ocr()
             
             # 6. 点击登录按钮
-            if not self.click_login_button():
-                self.logger.error("点击登录按钮失败")
-                # return False
+            with span("login"):
+                if not self.click_login_button():
+                    self.logger.error("点击登录按钮失败")
+                    # return False
             
-            # 7. 等待登录成功
-            if not self.wait_for_login_success():
-                self.logger.error("登录失败")
-                return False
+                # 7. 等待登录成功（用户名或密码错误时抛出AuthFailed，不重试）
+                if not self.wait_for_login_success():
+                    self.logger.error("登录失败")
+                    outcome = "login_failed"
+                    return False
             
             # 8. 点击充值按钮
-            if not self.click_recharge_button():
-                self.logger.warning("点击充值按钮失败，尝试直接提取数据")
+            with span("recharge"):
+                if not self.click_recharge_button():
+                    self.logger.warning("点击充值按钮失败，尝试直接提取数据")
             
-            # 9. 提取剩余电量
-            remaining_electricity = self.extract_remaining_electricity()
+            # 9. 提取剩余电量（页面中找不到电量时刷新页面后重试）
+            with span("extract"):
+                try:
+                    remaining_electricity = self.retry.call(
+                        "extract", self.extract_or_raise, on_retry=self.driver.refresh)
+                except ParseFailed:
+                    remaining_electricity = None
             
             # 10. 保存数据
-            self.save_data(remaining_electricity)
+            with span("save"):
+                self.save_data(remaining_electricity)
             
+            outcome = "success" if remaining_electricity is not None else "no_data"
             self.logger.info("监控流程完成")
             return True
             
         except Exception as e:
+            kind = classify(e)
             self.logger.error(f"监控流程出错: {e}")
+            self.recorder.set(error=str(e))
+            if kind:
+                self.recorder.set(error_kind=kind)
+                if outcome == "error":
+                    outcome = kind
+            if kind in OUTAGE_KINDS and self.breaker.record_failure(kind, str(e)):
+                self.logger.warning(f"网站连续故障，熔断 {self.breaker.state['cooldown'] / 60:.0f} 分钟")
+            # 原因不明的错误可能来自浏览器本身，下次运行重新启动浏览器
+            restart = kind is None
             return False
         
         finally:
+            # 提前结束（如登录失败）时同样释放OCR子进程；不保留会话时直接结束
+            if keep_session:
+                self.release_ocr()
+            else:
+                self.close_ocr()
+            if self.driver:
+                if outcome != "success" or self.debug.sampled:
+                    with span("debug_capture"):
+                        self.capture_debug(outcome)
+                if not keep_session or restart:
+                    with span("shutdown"):
+                        self.close_driver()
+            self.debug.close()
+            if self.alert_manager:
+                self.alert_manager.close()
+            try:
+                record = self.recorder.finish(outcome)
+                if record:
+                    stages = "，".join(f"{name} {seconds:.2f}s" for name, seconds in record["stages"].items())
+                    self.logger.info(f"本次运行耗时 {record['duration']:.2f}s（{stages}）")
+            except Exception as e:
+                self.logger.warning(f"写入运行历史失败: {e}")
+
+    def run_all(self, keep_session=False):
+        """依次监控配置中的每个房间，多个房间之间复用同一个浏览器和OCR模型"""
+        accounts = self.accounts()
+        results = []
+        for i, account in enumerate(accounts):
+            self.room, self.username, self.password = account["room"], account["username"], account["password"]
+            if len(accounts) > 1:
+                self.logger.info(f"监控房间 {self.room}（{i + 1}/{len(accounts)}）")
+            results.append(self.run(keep_session=keep_session or i < len(accounts) - 1))
+        return all(results)
+    
+    def serve(self):
+        """常驻运行：浏览器与OCR模型保持预热，按interval_minutes间隔监控；
+        配置文件修改后在等待期间即时重新加载（间隔、阈值、新增房间等），无需重启"""
+        self.logger.info(f"常驻运行，配置文件: {os.path.abspath(self.config_file)}")
+        try:
+            while True:
+                started = time.monotonic()
+                self.run_all(keep_session=True)
+                # 每隔几秒检查一次配置文件，间隔修改后按新的间隔计算下一次运行时间
+                while time.monotonic() < started + self.interval_minutes * 60:
+                    time.sleep(min(CONFIG_POLL_SECONDS, max(started + self.interval_minutes * 60 - time.monotonic(), 0)))
+                    self.reload_config()
+        finally:
+            self.close_ocr()
             if self.driver:
-                self.driver.quit()
+                self.close_driver()
 
 def main():
     """主函数"""
-    import sys
+    import argparse
     
-    config_file = "config.json"
-    if len(sys.argv) > 1:
-        config_file = sys.argv[1]
+    parser = argparse.ArgumentParser(description="南京大学电费监控（自动模式）")
+    parser.add_argument("config_file", nargs="?", help="配置文件路径（默认为项目根目录的config.json）")
+    parser.add_argument("--profile", help="配置方案（也可用环境变量 NJU_MONITOR_PROFILE 或配置中的 profile 指定）")
+    parser.add_argument("--loop", action="store_true", help="常驻运行，按 interval_minutes 间隔重复监控")
+    args = parser.parse_args()
     
-    monitor = NJUElectricMonitor(config_file)
     try:
-        monitor.run()
+        monitor = NJUElectricMonitor(args.config_file, args.profile)
+    except ConfigError as e:
+        print("配置文件无效:")
+        for error in e.errors:
+            print(f"  - {error}")
+        return 1
+    try:
+        if args.loop:
+            monitor.serve()
+        else:
+            return 0 if monitor.run_all() else 1
     except KeyboardInterrupt:
         print("\n用户中断程序")
     except Exception as e:
         print(f"程序运行出错: {e}")
+    return 1
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
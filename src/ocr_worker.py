@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+子进程中的验证码OCR
+OCR模型（尤其是EasyOCR的PyTorch模型）加载后会占用数百MB内存，而验证码只在登录时识别。
+OCRWorker把识别器放在单个工作进程中：需要时才启动并加载模型，图片以PNG字节传给子进程，
+识别结果传回主进程；登录完成后立即结束子进程，或保持空闲 idle_ttl 秒后再结束，
+常驻运行的监控进程在两次登录之间只保留浏览器与Python本身的内存
+"""
+
+import io
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from PIL import Image
+
+# 正常结束子进程时等待它退出的秒数，超时后强制结束
+EXIT_TIMEOUT = 5
+
+# 子进程中的识别器
+_reader = None
+
+
+def _load_reader(config):
+    """子进程初始化：按配置加载识别器"""
+    global _reader
+    from captcha_ocr import create_reader
+    _reader = create_reader(config)
+
+
+def _reader_name():
+    return _reader.name
+
+
+def _readtext(png):
+    """子进程中识别PNG图片，结果转为普通Python对象传回"""
+    image = np.array(Image.open(io.BytesIO(png)))
+    return [([[int(x), int(y)] for x, y in bbox], str(text), float(prob))
+            for bbox, text, prob in _reader.readtext(image)]
+
+
+class OCRWorker:
+    """在工作进程中运行的识别器，接口与 captcha_ocr 的后端相同（readtext）"""
+
+    def __init__(self, config=None, idle_ttl=0, timeout=120, logger=None):
+        self.config = dict(config or {})
+        self.idle_ttl = idle_ttl
+        # 首次识别包含子进程启动与模型加载的时间
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.executor = None
+        self.timer = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, logger=None):
+        """从配置中的 "ocr" 设置创建"""
+        config = config or {}
+        return cls(config, config.get("idle_ttl", 0), config.get("timeout", 120), logger)
+
+    @property
+    def name(self):
+        return f"{self.config.get('backend', 'easyocr')}，子进程"
+
+    @property
+    def running(self):
+        """工作进程是否已启动"""
+        return self.executor is not None
+
+    def _executor(self):
+        """取得工作进程，未启动时启动；并取消空闲计时"""
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            if self.executor is None:
+                # spawn：子进程不继承主进程的浏览器连接与线程，Windows与Linux行为一致
+                self.executor = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_reader,
+                    initargs=(self.config,),
+                )
+                self.logger.info("启动OCR子进程")
+            return self.executor
+
+    def start(self):
+        """提前启动工作进程并加载模型，与浏览器打开登录页同时进行；已启动时只取消空闲计时"""
+        if self.running:
+            self._executor()
+            return
+        started = time.perf_counter()
+        future = self._executor().submit(_reader_name)
+
+        def loaded(future):
+            try:
+                self.logger.info(f"OCR子进程就绪（{future.result()}），耗时 {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                self.logger.warning(f"OCR子进程启动失败: {e}")
+        future.add_done_callback(loaded)
+
+    def readtext(self, image):
+        """把图片编码为PNG传给工作进程识别；工作进程崩溃或识别超时时结束它，下次调用重新启动"""
+        if not isinstance(image, Image.Image):
+            image = Image.fromarray(np.asarray(image))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        try:
+            return self._executor().submit(_readtext, buffer.getvalue()).result(self.timeout)
+        except FutureTimeout:
+            # 卡住的子进程不能复用，也不能等它执行完
+            self.logger.warning(f"OCR子进程 {self.timeout} 秒内未返回结果，强制结束")
+            self.close(kill=True)
+            raise
+        except BrokenProcessPool:
+            self.close(kill=True)
+            raise
+
+    def release(self):
+        """本次登录不再需要识别：idle_ttl为0时立即结束工作进程，否则空闲idle_ttl秒后结束"""
+        with self.lock:
+            if self.executor is None:
+                return
+            if self.idle_ttl > 0:
+                if self.timer is None:
+                    self.timer = threading.Timer(self.idle_ttl, self.close)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+        self.close()
+
+    def close(self, kill=False):
+        """结束工作进程，释放模型占用的内存；kill为True或子进程未在EXIT_TIMEOUT秒内退出时强制结束"""
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            executor, self.executor = self.executor, None
+        if executor is None:
+            return
+        # shutdown之后_processes会被清空，先取出子进程
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        if kill:
+            for process in processes:
+                process.terminate()
+        # 不等待执行中的任务：卡住的识别会让shutdown(wait=True)一直阻塞
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.join(EXIT_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+                process.join(1)
+        self.logger.info("OCR子进程已结束，模型内存已释放")
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行环境预检
+根据解释器、requirements.txt、已安装依赖的版本（只读包元数据，不导入）、ChromeDriver文件、
+OCR后端设置和模型文件计算环境指纹；指纹与上次检查通过时相同则直接跳过，
+否则执行完整检查（核对版本、在子进程中试导入依赖、运行 chromedriver --version、检查模型文件）并缓存结果。
+监控脚本在启动浏览器前调用，不再每次单独启动解释器运行 tests/test_environment.py；
+依赖只在子进程中导入，监控进程不会因为预检而加载PyTorch等OCR依赖
+
+OCR依赖按配置的后端检查：easyocr后端需要easyocr与 models/ocr_models，
+onnx后端需要onnxruntime与导出的ONNX模型，不需要easyocr和PyTorch
+
+用法：
+    python src/preflight.py            # 指纹未变化时使用缓存结果
+    python src/preflight.py --force    # 强制完整检查
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime
+from importlib import metadata
+
+from safe_io import atomic_write
+from captcha_ocr import onnx_model_path, metadata_path
+
+try:
+    from packaging.version import parse as parse_version
+except ImportError:
+    parse_version = None
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), '..')
+REQUIREMENTS_PATH = os.path.join(ROOT_DIR, 'requirements.txt')
+CACHE_PATH = os.path.join(ROOT_DIR, 'data', 'preflight.json')
+MODEL_DIR = os.path.join(ROOT_DIR, 'models', 'ocr_models')
+DEFAULT_CHROMEDRIVER_PATH = os.path.join(ROOT_DIR, 'chromedriver-win64', 'chromedriver.exe')
+
+# 检查内容变化时递增，使旧的缓存结果失效
+CHECKS_VERSION = 2
+
+# 发行包名与导入名不同的依赖
+IMPORT_NAMES = {"beautifulsoup4": "bs4", "pillow": "PIL"}
+
+# 各OCR后端需要的发行包；未选用的后端的包不检查
+OCR_PACKAGES = {"easyocr": "easyocr", "onnx": "onnxruntime"}
+
+# 在子进程中逐个试导入模块，输出无法导入的模块及原因
+IMPORT_CHECK = """
+import sys, json, importlib
+failed = {}
+for name in sys.argv[1:]:
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        failed[name] = str(e)
+print(json.dumps(failed))
+"""
+
+REQUIREMENT_PATTERN = re.compile(r"([a-zA-Z0-9_\-]+)\s*([=<>!~]+)\s*([\d\.]+)")
+
+
+def parse_requirements(path=REQUIREMENTS_PATH):
+    """解析requirements.txt，返回 [(包名, 比较符, 版本)]"""
+    requirements = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith(("#", "//")):
+                    continue
+                match = REQUIREMENT_PATTERN.match(line)
+                if match:
+                    requirements.append(match.groups())
+    except OSError:
+        pass
+    return requirements
+
+
+def installed_version(name):
+    """已安装的发行包版本（只读元数据），未安装时返回None"""
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def version_satisfies(installed, op, required):
+    """判断版本是否满足要求；没有packaging时按数字逐段比较"""
+    if parse_version is not None:
+        v_inst, v_req = parse_version(installed), parse_version(required)
+    else:
+        def numeric(version):
+            return tuple(int(part) for part in re.findall(r"\d+", version)[:4])
+        v_inst, v_req = numeric(installed), numeric(required)
+    compare = {
+        "==": lambda: v_inst == v_req,
+        ">=": lambda: v_inst >= v_req,
+        "<=": lambda: v_inst <= v_req,
+        ">": lambda: v_inst > v_req,
+        "<": lambda: v_inst < v_req,
+        "!=": lambda: v_inst != v_req,
+    }.get(op)
+    return True if compare is None else compare()
+
+
+def file_stamp(path):
+    """文件的大小与修改时间，不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def model_files(model_dir=MODEL_DIR):
+    """OCR模型目录中的文件及其大小与修改时间"""
+    if not os.path.isdir(model_dir):
+        return {}
+    return {name: file_stamp(os.path.join(model_dir, name)) for name in sorted(os.listdir(model_dir))}
+
+
+def ocr_backend(ocr=None):
+    """配置的OCR后端名"""
+    return (ocr or {}).get("backend", "easyocr")
+
+
+def required_packages(requirements_path=REQUIREMENTS_PATH, ocr=None):
+    """需要检查的依赖 [(包名, 比较符, 版本)]：去掉未选用的OCR后端的包，加上选用的后端的包"""
+    backend = ocr_backend(ocr)
+    unused = {package for name, package in OCR_PACKAGES.items() if name != backend}
+    requirements = [item for item in parse_requirements(requirements_path) if item[0].lower() not in unused]
+    needed = OCR_PACKAGES.get(backend)
+    if needed and all(name.lower() != needed for name, _, _ in requirements):
+        requirements.append((needed, None, None))
+    return requirements
+
+
+def ocr_model_stamps(model_dir=MODEL_DIR, ocr=None):
+    """选用的OCR后端的模型文件及其大小与修改时间"""
+    if ocr_backend(ocr) == "onnx":
+        model_path = onnx_model_path(ocr)
+        return {path: file_stamp(path) for path in (model_path, metadata_path(model_path))}
+    return model_files(model_dir)
+
+
+def fingerprint(chromedriver_path=DEFAULT_CHROMEDRIVER_PATH, model_dir=MODEL_DIR,
+                requirements_path=REQUIREMENTS_PATH, ocr=None):
+    """环境指纹：只读文件元数据与包元数据，不导入任何依赖"""
+    requirements = required_packages(requirements_path, ocr)
+    parts = {
+        "checks_version": CHECKS_VERSION,
+        "executable": sys.executable,
+        "python": sys.version,
+        "requirements": requirements,
+        "packages": {name: installed_version(name) for name, _, _ in requirements},
+        "chromedriver": [os.path.abspath(chromedriver_path), file_stamp(chromedriver_path)],
+        "ocr_backend": ocr_backend(ocr),
+        "models": ocr_model_stamps(model_dir, ocr),
+    }
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def import_failures(modules):
+    """在子进程中试导入模块，返回 {模块名: 错误}；不把依赖（如PyTorch）加载进当前进程"""
+    if not modules:
+        return {}
+    try:
+        completed = subprocess.run([sys.executable, "-c", IMPORT_CHECK, *modules], capture_output=True,
+                                   text=True, timeout=300)
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError) as e:
+        return {name: f"无法检查: {e}" for name in modules}
+
+
+def full_check(chromedriver_path=DEFAULT_CHROMEDRIVER_PATH, model_dir=MODEL_DIR,
+               requirements_path=REQUIREMENTS_PATH, ocr=None):
+    """完整检查，返回 (是否通过, 问题列表, 警告列表)"""
+    problems, warnings = [], []
+    modules = {}
+    for name, op, required in required_packages(requirements_path, ocr):
+        version = installed_version(name)
+        if version is None:
+            problems.append(f"未安装 {name}")
+            continue
+        if op and not version_satisfies(version, op, required):
+            problems.append(f"{name} 版本不符，已安装：{version}，需要：{op}{required}")
+            continue
+        modules[IMPORT_NAMES.get(name.lower(), name)] = name
+    for module, error in import_failures(list(modules)).items():
+        problems.append(f"{modules.get(module, module)} 无法导入: {error}")
+
+    if not os.path.exists(chromedriver_path):
+        problems.append(f"本地ChromeDriver不存在: {chromedriver_path}")
+    else:
+        try:
+            output = subprocess.run([chromedriver_path, "--version"], capture_output=True,
+                                    text=True, timeout=30).stdout.strip()
+            if not output.startswith("ChromeDriver"):
+                problems.append(f"ChromeDriver无法运行: {chromedriver_path}")
+        except (OSError, subprocess.SubprocessError) as e:
+            problems.append(f"ChromeDriver无法运行: {e}")
+
+    if ocr_backend(ocr) == "onnx":
+        model_path = onnx_model_path(ocr)
+        for path in (model_path, metadata_path(model_path)):
+            if not os.path.exists(path):
+                problems.append(f"ONNX验证码模型不存在: {path}（运行 python src/captcha_ocr.py export 导出）")
+    elif not model_files(model_dir):
+        # EasyOCR会在首次运行时下载模型，只提示
+        warnings.append(f"OCR模型目录为空，首次运行时将下载模型: {model_dir}")
+    return not problems, problems, warnings
+
+
+def load_cache(cache_path=CACHE_PATH):
+    """读取上次的检查结果"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def run_preflight(chromedriver_path=DEFAULT_CHROMEDRIVER_PATH, model_dir=MODEL_DIR, force=False,
+                  cache_path=CACHE_PATH, requirements_path=REQUIREMENTS_PATH, logger=None, ocr=None):
+    """环境预检：指纹与上次通过时相同则跳过完整检查；ocr为配置中的 "ocr" 设置，决定检查哪个OCR后端；
+    返回检查结果字典（ok、cached、problems、warnings）"""
+    current = fingerprint(chromedriver_path, model_dir, requirements_path, ocr)
+    cache = load_cache(cache_path)
+    if not force and cache.get("ok") and cache.get("fingerprint") == current:
+        if logger:
+            logger.info("运行环境未变化，跳过环境检测")
+        return dict(cache, cached=True)
+
+    if logger:
+        logger.info("运行环境有变化，执行完整环境检测...")
+    ok, problems, warnings = full_check(chromedriver_path, model_dir, requirements_path, ocr)
+    result = {
+        "ok": ok,
+        "fingerprint": current,
+        "checked_at": datetime.now().isoformat(timespec='seconds'),
+        "problems": problems,
+        "warnings": warnings,
+    }
+    # 失败的结果也写入缓存便于查看，但下次运行仍会重新检查
+    try:
+        with atomic_write(cache_path) as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        if logger:
+            logger.warning(f"保存环境检测结果失败: {e}")
+    if logger:
+        for warning in warnings:
+            logger.warning(warning)
+        for problem in problems:
+            logger.error(f"环境检测: {problem}")
+    return dict(result, cached=False)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="运行环境预检")
+    parser.add_argument("--force", action="store_true", help="忽略缓存，执行完整检查")
+    parser.add_argument("--chromedriver", default=DEFAULT_CHROMEDRIVER_PATH, help="ChromeDriver路径")
+    parser.add_argument("--ocr-backend", choices=tuple(OCR_PACKAGES), default="easyocr", help="要检查的OCR后端")
+    parser.add_argument("--onnx-model", help="ONNX模型路径（onnx后端）")
+    args = parser.parse_args()
+
+    ocr = {"backend": args.ocr_backend, "model_path": args.onnx_model}
+    result = run_preflight(args.chromedriver, force=args.force, ocr=ocr)
+    if result["cached"]:
+        print(f"[环境未变化] 上次检测通过于 {result['checked_at']}")
+    for warning in result.get("warnings", []):
+        print(f"[警告] {warning}")
+    for problem in result.get("problems", []):
+        print(f"[错误] {problem}")
+    print("\n[环境检测通过]" if result["ok"] else "\n[环境检测未通过，请检查上方错误]")
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
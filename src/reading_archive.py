@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按房间与月份分区的读数归档
+已经结束的月份从读数存储中移出，每个房间每个月写成一个列式分区文件：
+安装了pyarrow时为Parquet（带列统计信息，可直接被pandas、DuckDB等读取），否则为NumPy .npy（内存映射读取）。
+manifest.json 记录每个分区的房间、月份、记录数、读数次数以及时间与电量的最小/最大值，
+范围查询只根据清单挑出时间上有重叠的分区，不打开其他文件；
+查询最近7天的开销与归档了多少年的数据无关
+"""
+
+import os
+import json
+from urllib.parse import quote
+
+import numpy as np
+
+from safe_io import atomic_write
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# 分区中的区间记录（房间由分区决定，不再单独保存）
+PARTITION_DTYPE = np.dtype([
+    ('first_seen', '<i8'),
+    ('last_seen', '<i8'),
+    ('value', '<f8'),
+    ('count', '<u4'),
+])
+
+
+def month_of(epoch_us):
+    """微秒时间戳（数组）所在的月份，如 '2025-09'"""
+    return np.datetime_as_string(np.asarray(epoch_us, dtype=np.int64).astype('datetime64[us]').astype('datetime64[M]'))
+
+
+class ReadingArchive:
+    """分区文件与清单的读写；写入由调用方在读数存储的写入锁下进行"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self._manifest = None
+        self._manifest_stamp = None
+
+    # ---------- 清单 ----------
+
+    def manifest(self):
+        """分区清单，文件被其他进程更新后自动重新读取"""
+        try:
+            st = os.stat(self.manifest_path)
+        except OSError:
+            return {"version": MANIFEST_VERSION, "partitions": []}
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp != self._manifest_stamp:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+            self._manifest_stamp = stamp
+        return self._manifest
+
+    def partitions(self, room=None, start_us=None, end_us=None):
+        """与时间范围 [start_us, end_us) 有重叠的分区（按房间、月份排序）"""
+        selected = []
+        for part in self.manifest()["partitions"]:
+            if room is not None and part["room"] != room:
+                continue
+            if end_us is not None and part["first_seen_min"] >= end_us:
+                continue
+            if start_us is not None and part["last_seen_max"] < start_us:
+                continue
+            selected.append(part)
+        return selected
+
+    def sample_count(self, room=None):
+        """已归档的读数次数（只读清单）"""
+        return sum(part["samples"] for part in self.partitions(room))
+
+    # ---------- 分区文件 ----------
+
+    def load(self, part):
+        """读取一个分区的全部区间记录"""
+        path = os.path.join(self.directory, part["file"])
+        if part["format"] == "npy":
+            return np.load(path, mmap_mode='r')
+        if pq is None:
+            raise RuntimeError(f"读取Parquet分区需要安装pyarrow: {path}")
+        table = pq.read_table(path)
+        records = np.empty(table.num_rows, dtype=PARTITION_DTYPE)
+        for name in ('first_seen', 'last_seen'):
+            records[name] = table.column(name).cast(pa.int64()).to_numpy()
+        records['value'] = table.column('value').to_numpy()
+        records['count'] = table.column('count').to_numpy()
+        return records
+
+    def find(self, room, month):
+        """查找指定房间与月份的分区，不存在时返回None"""
+        for part in self.manifest()["partitions"]:
+            if part["room"] == room and part["month"] == month:
+                return part
+        return None
+
+    def write(self, room, month, records):
+        """写入（替换）一个分区并更新清单；records需按开始时间排序"""
+        columns = records
+        records = np.empty(len(columns), dtype=PARTITION_DTYPE)
+        for name in PARTITION_DTYPE.names:
+            records[name] = columns[name]
+        fmt = "parquet" if pq is not None else "npy"
+        relative = os.path.join(f"room={quote(str(room), safe='')}", f"{month}.{fmt}")
+        path = os.path.join(self.directory, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path, 'wb') as f:
+            if fmt == "npy":
+                np.save(f, records)
+            else:
+                table = pa.table({
+                    "first_seen": pa.array(records['first_seen']).cast(pa.timestamp('us')),
+                    "last_seen": pa.array(records['last_seen']).cast(pa.timestamp('us')),
+                    "value": records['value'],
+                    "count": records['count'],
+                })
+                pq.write_table(table, f, compression='zstd', write_statistics=True)
+
+        part = {
+            "room": str(room),
+            "month": month,
+            "file": relative.replace(os.sep, '/'),
+            "format": fmt,
+            "records": int(len(records)),
+            "samples": int(records['count'].sum()),
+            "first_seen_min": int(records['first_seen'].min()),
+            "last_seen_max": int(records['last_seen'].max()),
+            "value_min": float(records['value'].min()),
+            "value_max": float(records['value'].max()),
+        }
+        manifest = self.manifest()
+        partitions = [p for p in manifest["partitions"] if not (p["room"] == part["room"] and p["month"] == month)]
+        partitions.append(part)
+        partitions.sort(key=lambda p: (p["room"], p["month"]))
+        old = self.find(room, month)
+        with atomic_write(self.manifest_path) as f:
+            json.dump({"version": MANIFEST_VERSION, "partitions": partitions}, f, ensure_ascii=False, indent=1)
+        # 格式变化（如后来安装了pyarrow）时删除旧格式的分区文件
+        if old is not None and old["file"] != part["file"]:
+            try:
+                os.remove(os.path.join(self.directory, old["file"]))
+            except OSError:
+                pass
+        return part
@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制读数存储
+电表的更新频率低于轮询频率，连续多次读到的往往是同一个值，因此存储中每条定长记录
+表示一段电量不变的区间：首次读到的时间、最后一次读到的时间（int64 微秒）、
+剩余电量（float64）、这段时间内的读数次数和房间编号；
+新读数与该房间最后一段的电量相同时只原地更新这段区间，否则追加一段新区间。
+记录按区间开始时间顺序保存在 data/readings.bin，读取时通过 np.memmap 零拷贝切片；
+房间名称与编号的对应关系保存在 data/readings_rooms.json。
+多个进程写入时通过 data/readings.bin.lock 文件锁互斥，每次提交后fsync，
+整体重写与导出都先写临时文件再原子替换；批量写入可用 batch() 合并为一次提交。
+已经结束的月份由 roll_months() 移入 data/readings_archive/ 下按房间与月份分区的归档，
+存储文件只保留当前月份（以及每个房间仍可能被延长的最后一段），查询时按时间范围合并两者。
+JSON/CSV 文件仍作为兼容格式保留，可随时从存储导出
+
+用法：
+    python src/reading_store.py info
+    python src/reading_store.py compact
+    python src/reading_store.py roll
+    python src/reading_store.py migrate [--json data/electricity_data.json] [--room default]
+    python src/reading_store.py export --format csv --room default --output data/electricity_data.csv
+"""
+
+import os
+import sys
+import csv
+import json
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from safe_io import FileLock, atomic_write, flush_and_sync
+from reading_archive import ReadingArchive, month_of
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+STORE_PATH = os.path.join(DATA_DIR, 'readings.bin')
+JSON_PATH = os.path.join(DATA_DIR, 'electricity_data.json')
+
+# 监控脚本未配置房间时使用的房间名，对应原有的 electricity_data.json/csv
+DEFAULT_ROOM = "default"
+UNIT = "度"
+
+# 文件头：8字节魔数 + uint32版本号 + uint32记录长度
+MAGIC = b"NJUREADS"
+VERSION = 2
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('record_size', '<u4')])
+RECORD_DTYPE = np.dtype([
+    ('first_seen', '<i8'),
+    ('last_seen', '<i8'),
+    ('value', '<f8'),
+    ('count', '<u4'),
+    ('room', '<u4'),
+])
+# 版本1：每条读数一条记录，打开时自动压缩为区间记录
+V1_RECORD_DTYPE = np.dtype([('time', '<i8'), ('value', '<f8'), ('room', '<u4')])
+
+
+def to_epoch_us(timestamp):
+    """把ISO时间字符串或datetime转换为微秒时间戳（按本地时间的钟面值，不做时区换算）"""
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.replace(tzinfo=None)
+    return int(np.datetime64(timestamp, 'us').astype(np.int64))
+
+
+def to_datetime64(epoch_us):
+    """把微秒时间戳（标量或数组）转换为datetime64"""
+    return np.asarray(epoch_us, dtype=np.int64).astype('datetime64[us]')
+
+
+def mirror_paths(room=DEFAULT_ROOM, data_dir=DATA_DIR):
+    """房间对应的兼容JSON/CSV文件路径（默认房间沿用原文件名，其他房间加房间号后缀）"""
+    suffix = "" if room == DEFAULT_ROOM else f"-{room}"
+    return (os.path.join(data_dir, f'electricity_data{suffix}.json'),
+            os.path.join(data_dir, f'electricity_data{suffix}.csv'))
+
+
+def samples_to_intervals(times, values, room_id):
+    """把单个房间的读数转换为单条读数的区间记录（按时间排序）"""
+    intervals = np.empty(len(times), dtype=RECORD_DTYPE)
+    intervals['first_seen'] = times
+    intervals['last_seen'] = times
+    intervals['value'] = values
+    intervals['count'] = 1
+    intervals['room'] = room_id
+    return intervals[np.argsort(intervals['first_seen'], kind='stable')]
+
+
+def coalesce(intervals):
+    """合并单个房间中相邻且电量相同的区间（输入需按开始时间排序）"""
+    if len(intervals) < 2:
+        return np.array(intervals, dtype=RECORD_DTYPE)
+    values = intervals['value']
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    merged = np.array(intervals[starts], dtype=RECORD_DTYPE)
+    merged['first_seen'] = np.minimum.reduceat(intervals['first_seen'], starts)
+    merged['last_seen'] = np.maximum.reduceat(intervals['last_seen'], starts)
+    merged['count'] = np.add.reduceat(intervals['count'], starts)
+    return merged
+
+
+def trend_points(df):
+    """曲线图使用的点：每段区间的开始时间，再加上最后一次读数的时间，使曲线延伸到最近一次检查"""
+    if df.empty:
+        return df[['time', 'num']]
+    last = pd.DataFrame({"time": [df['last_seen'].iloc[-1]], "num": [df['num'].iloc[-1]]})
+    if df['count'].iloc[-1] == 1:
+        return df[['time', 'num']]
+    return pd.concat([df[['time', 'num']], last], ignore_index=True)
+
+
+class ReadingStore:
+    """基于定长区间记录与内存映射的读数存储"""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.rooms_path = os.path.splitext(path)[0] + "_rooms.json"
+        self.archive = ReadingArchive(os.path.splitext(path)[0] + "_archive")
+        # 写入锁：存储文件、房间表以及由调用方在同一把锁下维护的兼容文件
+        self.lock = FileLock(path + ".lock")
+        self._rooms = None
+        self._pending = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    # ---------- 房间 ----------
+
+    def rooms(self):
+        """房间名列表，下标即房间编号"""
+        if self._rooms is None:
+            if os.path.exists(self.rooms_path):
+                with open(self.rooms_path, 'r', encoding='utf-8') as f:
+                    self._rooms = json.load(f)
+            else:
+                self._rooms = [DEFAULT_ROOM]
+        return self._rooms
+
+    def room_id(self, room, create=False):
+        """房间名对应的编号，create=True时为新房间分配编号"""
+        room = str(room)
+        rooms = self.rooms()
+        if room in rooms:
+            return rooms.index(room)
+        if not create:
+            return None
+        with self.lock:
+            # 其他进程可能已经添加了房间，加锁后重新读取房间表
+            self._rooms = None
+            rooms = self.rooms()
+            if room not in rooms:
+                rooms.append(room)
+                with atomic_write(self.rooms_path) as f:
+                    json.dump(rooms, f, ensure_ascii=False)
+            return rooms.index(room)
+
+    # ---------- 读取 ----------
+
+    def _check_header(self):
+        header = np.fromfile(self.path, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header[0]['magic'] != MAGIC:
+            raise ValueError(f"不是有效的读数存储文件: {self.path}")
+        version = int(header[0]['version'])
+        if version == 1:
+            with self.lock:
+                if int(np.fromfile(self.path, dtype=HEADER_DTYPE, count=1)[0]['version']) == 1:
+                    self._upgrade_v1()
+        elif version != VERSION or header[0]['record_size'] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"不支持的存储版本: {version}")
+
+    def _upgrade_v1(self):
+        """把版本1的逐条读数记录压缩为区间记录"""
+        count = (os.path.getsize(self.path) - HEADER_DTYPE.itemsize) // V1_RECORD_DTYPE.itemsize
+        old = np.fromfile(self.path, dtype=V1_RECORD_DTYPE, count=max(count, 0),
+                          offset=HEADER_DTYPE.itemsize)
+        parts = [coalesce(samples_to_intervals(old['time'][old['room'] == room_id],
+                                               old['value'][old['room'] == room_id], room_id))
+                 for room_id in np.unique(old['room'])]
+        self._rewrite_sorted(np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE))
+
+    def records(self):
+        """全部区间记录的只读内存映射（按开始时间升序）"""
+        if not self.exists():
+            return np.empty(0, dtype=RECORD_DTYPE)
+        self._check_header()
+        # 只映射完整的记录，忽略写入中断留下的残缺尾部
+        count = (os.path.getsize(self.path) - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+        if count <= 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode='r',
+                         offset=HEADER_DTYPE.itemsize, shape=(count,))
+
+    def __len__(self):
+        return len(self.records())
+
+    def read(self, room=None, start=None, end=None):
+        """读取与时间范围 [start, end) 有重叠的区间（归档分区在前，存储中的当前月份在后）；
+        没有相关归档、且不指定房间与开始时间时返回内存映射切片"""
+        records = self._read_hot(room, start, end)
+        archived = list(self.iter_archived(room, start, end))
+        if not archived:
+            return records
+        records = np.concatenate(archived + [np.asarray(records)])
+        if room is None:
+            records = records[np.argsort(records['first_seen'], kind='stable')]
+        return records
+
+    def iter_archived(self, room=None, start=None, end=None):
+        """逐个分区产出与时间范围有重叠的归档区间记录，只打开清单中时间有重叠的分区"""
+        start_us = None if start is None else to_epoch_us(start)
+        end_us = None if end is None else to_epoch_us(end)
+        for part in self.archive.partitions(None if room is None else str(room), start_us, end_us):
+            # 读取路径不修改房间表：房间表中没有的分区（房间表与归档不一致）跳过
+            room_id = self.room_id(part["room"])
+            if room_id is None:
+                continue
+            stored = self.archive.load(part)
+            mask = np.ones(len(stored), dtype=bool)
+            if end_us is not None:
+                mask &= stored['first_seen'] < end_us
+            if start_us is not None:
+                mask &= stored['last_seen'] >= start_us
+            stored = stored[mask]
+            records = np.empty(len(stored), dtype=RECORD_DTYPE)
+            for name in stored.dtype.names:
+                records[name] = stored[name]
+            records['room'] = room_id
+            yield records
+
+    def _read_hot(self, room=None, start=None, end=None):
+        """只读取存储文件（当前月份）中的区间"""
+        records = self.records()
+        if end is not None:
+            records = records[:np.searchsorted(records['first_seen'], to_epoch_us(end))]
+        if start is not None:
+            start_us = to_epoch_us(start)
+            lo = np.searchsorted(records['first_seen'], start_us)
+            # 开始时间之前开始、但一直持续到开始时间之后的区间（每个房间最多一段）
+            head = records[:lo]
+            records = np.concatenate([head[head['last_seen'] >= start_us], records[lo:]])
+        if room is not None:
+            room_id = self.room_id(room)
+            if room_id is None:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            records = records[records['room'] == room_id]
+        return records
+
+    def frame(self, room=DEFAULT_ROOM, start=None, end=None):
+        """读取为DataFrame，每段区间一行：time（首次读到）、last_seen、count、num、unit"""
+        records = self.read(room, start, end)
+        return pd.DataFrame({
+            "time": to_datetime64(records['first_seen']),
+            "last_seen": to_datetime64(records['last_seen']),
+            "count": np.asarray(records['count']),
+            "num": np.asarray(records['value']),
+            "unit": UNIT,
+        })
+
+    def value_at(self, timestamp, room=DEFAULT_ROOM):
+        """时间t的剩余电量：t之前最近一次读到的值；t早于第一条读数时返回None"""
+        records = self.read(room, end=to_datetime64(to_epoch_us(timestamp) + 1))
+        if not len(records):
+            return None
+        return float(records['value'][-1])
+
+    def last_before(self, start):
+        """每个房间在start之前开始的最后一段区间（按房间编号排序，每个房间至多一段），即start时刻仍有效的电量；
+        存储文件中没有时只打开该房间最近的一个归档分区"""
+        start_us = to_epoch_us(start)
+        hot = self.records()
+        head = np.asarray(hot[:np.searchsorted(hot['first_seen'], start_us)])
+        found = {}
+        if len(head):
+            room_ids, last_from_end = np.unique(head['room'][::-1], return_index=True)
+            for room_id, index in zip(room_ids.tolist(), (len(head) - 1 - last_from_end).tolist()):
+                found[room_id] = head[index]
+        latest = {}
+        for part in self.archive.partitions(end_us=start_us):
+            if part["room"] not in latest or part["month"] > latest[part["room"]]["month"]:
+                latest[part["room"]] = part
+        for room, part in latest.items():
+            room_id = self.room_id(room)
+            if room_id is None or room_id in found:
+                continue
+            stored = self.archive.load(part)
+            stored = stored[stored['first_seen'] < start_us]
+            if len(stored):
+                record = np.zeros(1, dtype=RECORD_DTYPE)[0]
+                for name in stored.dtype.names:
+                    record[name] = stored[name][-1]
+                record['room'] = room_id
+                found[room_id] = record
+        records = np.empty(len(found), dtype=RECORD_DTYPE)
+        for i, room_id in enumerate(sorted(found)):
+            records[i] = found[room_id]
+        return records
+
+    def last_checked(self, room=DEFAULT_ROOM):
+        """该房间最后一次读数的时间，没有读数时返回None"""
+        # 每个房间的最后一段始终留在存储文件中，通常不需要打开归档
+        records = self._read_hot(room)
+        if not len(records):
+            records = self.read(room)
+        if not len(records):
+            return None
+        return to_datetime64(records['last_seen'].max()).item()
+
+    def sample_count(self, room=None):
+        """原始读数次数（归档部分只读清单）"""
+        return int(self._read_hot(room)['count'].sum()) + self.archive.sample_count(room)
+
+    def iter_readings(self, room=DEFAULT_ROOM):
+        """逐条产出 (ISO时间字符串, 电量)，格式与JSON历史一致；
+        每段区间产出首次与最后一次读数，区间中间电量不变的重复读数不再单独保存"""
+        records = self.read(room)
+        firsts = np.datetime_as_string(to_datetime64(records['first_seen']), unit='us').tolist()
+        lasts = np.datetime_as_string(to_datetime64(records['last_seen']), unit='us').tolist()
+        for first, last, count, value in zip(firsts, lasts, records['count'].tolist(), records['value'].tolist()):
+            yield first, value
+            if count > 1:
+                yield last, value
+
+    # ---------- 写入 ----------
+
+    def _write_header(self, f):
+        header = np.array([(MAGIC, VERSION, RECORD_DTYPE.itemsize)], dtype=HEADER_DTYPE)
+        f.write(header.tobytes())
+
+    def append(self, timestamp, value, room=DEFAULT_ROOM):
+        """追加一条读数：电量与最后一段相同时只更新该段的最后读到时间和次数"""
+        self.append_many([to_epoch_us(timestamp)], [value], room)
+
+    def append_many(self, times, values, room=DEFAULT_ROOM):
+        """批量追加读数（times为微秒时间戳），返回读数条数；
+        早于该房间已有读数的数据会与已有区间合并后整体重写"""
+        if self._pending is not None:
+            self._pending.append((times, values, room))
+            return len(times)
+        with self.lock:
+            return self._append(times, values, room)
+
+    @contextmanager
+    def batch(self):
+        """组提交：期间的写入先缓存在内存中，正常退出时在一次加锁、一次fsync中写入；出错时全部丢弃"""
+        if self._pending is not None:
+            yield self
+            return
+        self._pending = []
+        try:
+            yield self
+            pending = self._pending
+        finally:
+            self._pending = None
+        by_room = {}
+        for times, values, room in pending:
+            room_times, room_values = by_room.setdefault(str(room), ([], []))
+            room_times.extend(np.asarray(times, dtype=np.int64).tolist())
+            room_values.extend(np.asarray(values, dtype=np.float64).tolist())
+        with self.lock:
+            for room, (times, values) in by_room.items():
+                self._append(times, values, room)
+
+    def _append(self, times, values, room):
+        """在持有写入锁时追加读数"""
+        room_id = self.room_id(room, create=True)
+        batch = coalesce(samples_to_intervals(times, values, room_id))
+        if not len(batch):
+            return 0
+        records = self.records()
+        positions = np.flatnonzero(records['room'] == room_id)
+        last = positions[-1] if len(positions) else None
+        if last is not None and batch['first_seen'][0] < records['last_seen'][last]:
+            # 乱序数据：与该房间已有区间合并排序后重新压缩；
+            # 落在已有区间内部且电量不同的读数无法拆分原区间（中间的读数时间未保存），会作为重叠的区间保留
+            room_records = np.concatenate([np.asarray(records[positions]), batch])
+            room_records = coalesce(room_records[np.argsort(room_records['first_seen'], kind='stable')])
+            others = np.asarray(records[records['room'] != room_id])
+            del records
+            self._rewrite_sorted(np.concatenate([others, room_records]))
+            return len(times)
+
+        updated = None
+        if last is not None and batch['value'][0] == records['value'][last]:
+            # 延长最后一段区间
+            updated = np.array(records[last:last + 1])
+            updated['last_seen'] = batch['last_seen'][0]
+            updated['count'] += batch['count'][0]
+            batch = batch[1:]
+        if len(batch) and len(records) and batch['first_seen'][0] < records['first_seen'][-1]:
+            # 新区间早于其他房间的最后一段，需要整体重写以保持开始时间有序
+            merged = np.concatenate([np.asarray(records), batch])
+            if updated is not None:
+                merged[last] = updated[0]
+            del records
+            self._rewrite_sorted(merged)
+            return len(times)
+        del records
+
+        if not self.exists() or os.path.getsize(self.path) < HEADER_DTYPE.itemsize:
+            with open(self.path, 'wb') as f:
+                self._write_header(f)
+        with open(self.path, 'r+b') as f:
+            if updated is not None:
+                f.seek(HEADER_DTYPE.itemsize + int(last) * RECORD_DTYPE.itemsize)
+                f.write(updated.tobytes())
+            if len(batch):
+                # 从最后一条完整记录之后写入，覆盖可能残留的残缺尾部
+                count = (os.path.getsize(self.path) - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+                f.seek(HEADER_DTYPE.itemsize + count * RECORD_DTYPE.itemsize)
+                f.write(batch.tobytes())
+                f.truncate()
+            flush_and_sync(f)
+        return len(times)
+
+    def bulk_load(self, samples):
+        """批量导入多个房间的历史读数，在一次加锁、一次重写中完成，返回各房间新增的读数条数；
+        samples为 {房间名: (微秒时间戳数组, 电量数组)}，每个房间的时间需已排序且去重。
+        已被存储中同值区间覆盖的读数（重复导入、兼容文件与存储重叠）会被跳过"""
+        with self.lock:
+            records = np.array(self.records())
+            keep = np.ones(len(records), dtype=bool)
+            parts, added = [], {}
+            for room, (times, values) in samples.items():
+                room_id = self.room_id(room, create=True)
+                times = np.asarray(times, dtype=np.int64)
+                values = np.asarray(values, dtype=np.float64)
+                mask = records['room'] == room_id
+                existing = records[mask]
+                known = np.concatenate(list(self.iter_archived(room)) + [existing])
+                known = known[np.argsort(known['first_seen'], kind='stable')]
+                if len(known) and len(times):
+                    # 找到每条读数之前最近开始的区间（包括已归档的区间），落在该区间内且电量相同的读数已经计入
+                    idx = np.searchsorted(known['first_seen'], times, side='right') - 1
+                    prev = known[np.maximum(idx, 0)]
+                    covered = (idx >= 0) & (times <= prev['last_seen']) & (values == prev['value'])
+                    times, values = times[~covered], values[~covered]
+                added[room] = len(times)
+                if not len(times):
+                    continue
+                keep &= ~mask
+                merged = np.concatenate([existing, samples_to_intervals(times, values, room_id)])
+                parts.append(coalesce(merged[np.argsort(merged['first_seen'], kind='stable')]))
+            if parts:
+                self._rewrite_sorted(np.concatenate([records[keep]] + parts))
+        return added
+
+    def roll_months(self, now=None):
+        """把已经结束的月份移入归档，返回移出的区间数；
+        每个房间的最后一段仍可能被新读数延长，始终留在存储文件中"""
+        month_start = to_epoch_us(np.datetime64(now or datetime.now(), 'M').astype('datetime64[us]').item())
+        with self.lock:
+            records = np.array(self.records())
+            closed = records['first_seen'] < month_start
+            if not closed.any():
+                return 0
+            # 倒序后np.unique给出的是每个房间最后一次出现的位置
+            _, last_from_end = np.unique(records['room'][::-1], return_index=True)
+            closed[len(records) - 1 - last_from_end] = False
+            # 上个月开始、仍在延长的最后一段不移出；没有其他区间时不重写存储文件
+            if not closed.any():
+                return 0
+            moving = records[closed]
+            months = month_of(moving['first_seen'])
+            for room_id in np.unique(moving['room']):
+                room = self.rooms()[int(room_id)]
+                for month in np.unique(months[moving['room'] == room_id]):
+                    batch = moving[(moving['room'] == room_id) & (months == month)]
+                    self.archive.write(room, str(month), self._merge_partition(room, str(month), batch))
+            # 分区写入成功后才从存储中删除；中途崩溃时重复的区间在下次归档合并时去除
+            self.rewrite(records[~closed])
+        return int(closed.sum())
+
+    def _merge_partition(self, room, month, batch):
+        """把新移出的区间与已有分区合并：相同开始时间与电量的重复区间只保留读数次数最多的一条"""
+        part = self.archive.find(room, month)
+        if part is not None:
+            stored = self.archive.load(part)
+            existing = np.empty(len(stored), dtype=RECORD_DTYPE)
+            for name in stored.dtype.names:
+                existing[name] = stored[name]
+            existing['room'] = batch['room'][0]
+            batch = np.concatenate([existing, batch])
+        batch = batch[np.lexsort((-batch['count'].astype(np.int64), batch['value'], batch['first_seen']))]
+        duplicate = np.r_[False, (batch['first_seen'][1:] == batch['first_seen'][:-1])
+                          & (batch['value'][1:] == batch['value'][:-1])]
+        batch = batch[~duplicate]
+        return coalesce(batch[np.argsort(batch['first_seen'], kind='stable')])
+
+    def _rewrite_sorted(self, records):
+        self.rewrite(records[np.argsort(records['first_seen'], kind='stable')])
+
+    def rewrite(self, records):
+        """用给定记录整体替换存储文件（先写临时文件再原子替换，正在读取的进程仍看到旧文件）"""
+        with self.lock, atomic_write(self.path, 'wb') as f:
+            self._write_header(f)
+            f.write(np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes())
+
+    def compact(self):
+        """重新压缩整个存储（合并各房间相邻的同值区间），返回压缩前后的记录数"""
+        with self.lock:
+            records = np.array(self.records())
+            parts = [coalesce(records[records['room'] == room_id]) for room_id in np.unique(records['room'])]
+            compacted = np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+            self._rewrite_sorted(compacted)
+        return len(records), len(compacted)
+
+    # ---------- 兼容格式 ----------
+
+    def import_json(self, json_path, room=DEFAULT_ROOM):
+        """导入JSON行格式的历史读数，返回导入条数"""
+        times, values = [], []
+        with open(json_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                    times.append(to_epoch_us(item["timestamp"]))
+                    values.append(float(item["remaining_electricity"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return self.append_many(times, values, room)
+
+    def export_json(self, json_path, room=DEFAULT_ROOM):
+        """导出为原有的JSON行格式"""
+        with atomic_write(json_path) as f:
+            for stamp, value in self.iter_readings(room):
+                f.write(json.dumps({"timestamp": stamp, "remaining_electricity": value, "unit": UNIT},
+                                   ensure_ascii=False) + "\n")
+
+    def export_csv(self, csv_path, room=DEFAULT_ROOM):
+        """导出为原有的CSV格式（time,num,unit）"""
+        with atomic_write(csv_path, newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["time", "num", "unit"])
+            writer.writerows((stamp, value, UNIT) for stamp, value in self.iter_readings(room))
+
+
+def open_store(path=STORE_PATH, json_path=JSON_PATH):
+    """打开读数存储；存储文件不存在时先从原有JSON历史迁移一次"""
+    store = ReadingStore(path)
+    if not store.exists() and json_path and os.path.exists(json_path):
+        with store.lock:
+            # 加锁后再次检查，避免多个进程重复迁移
+            if not store.exists():
+                store.import_json(json_path, DEFAULT_ROOM)
+    return store
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="二进制读数存储工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="显示存储概况")
+    sub.add_parser("compact", help="重新压缩存储中的同值区间")
+    sub.add_parser("roll", help="把已经结束的月份移入归档")
+    migrate = sub.add_parser("migrate", help="从JSON历史导入读数")
+    migrate.add_argument("--json", default=JSON_PATH, help="JSON历史文件")
+    migrate.add_argument("--room", default=DEFAULT_ROOM, help="房间名")
+    migrate.add_argument("--force", action="store_true", help="房间已有读数时仍然导入")
+    export = sub.add_parser("export", help="导出为JSON或CSV")
+    export.add_argument("--format", choices=["json", "csv"], default="csv")
+    export.add_argument("--room", default=DEFAULT_ROOM, help="房间名")
+    export.add_argument("--output", help="输出文件（默认为该房间的兼容文件）")
+    args = parser.parse_args()
+
+    store = ReadingStore() if args.command == "migrate" else open_store()
+    if args.command == "migrate":
+        if len(store.read(args.room)) and not args.force:
+            print(f"房间 {args.room} 已有读数，重复导入会产生重复记录（使用 --force 强制导入）")
+            return 1
+        count = store.import_json(args.json, args.room)
+        print(f"已导入 {count} 条读数（房间 {args.room}）")
+    elif args.command == "compact":
+        before, after = store.compact()
+        print(f"已压缩: {before} 段 -> {after} 段，文件大小 {os.path.getsize(store.path)} 字节")
+    elif args.command == "roll":
+        moved = store.roll_months()
+        print(f"已归档 {moved} 段区间，存储中剩余 {len(store)} 段，归档分区 {len(store.archive.partitions())} 个")
+    elif args.command == "export":
+        json_path, csv_path = mirror_paths(args.room)
+        if args.format == "json":
+            output = args.output or json_path
+            store.export_json(output, args.room)
+        else:
+            output = args.output or csv_path
+            store.export_csv(output, args.room)
+        print(f"已导出到: {output}")
+    else:
+        records = store.read()
+        print(f"存储文件: {store.path}（{os.path.getsize(store.path) if store.exists() else 0} 字节）")
+        print(f"区间记录: {len(records)} 段（存储 {len(store)} 段），原始读数: {store.sample_count()} 条")
+        partitions = store.archive.partitions()
+        if partitions:
+            print(f"归档分区: {len(partitions)} 个（{partitions[0]['format']}），{store.archive.directory}")
+        for room_id, room in enumerate(store.rooms()):
+            room_records = records[records['room'] == room_id]
+            if len(room_records):
+                first = to_datetime64(room_records['first_seen'][0])
+                last = to_datetime64(room_records['last_seen'].max())
+                print(f"  {room}: {len(room_records)} 段 / {int(room_records['count'].sum())} 条读数，"
+                      f"{first} ~ {last}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+访问学校网站的容错层
+远程步骤的错误按类别区分（超时、网站不可用、验证码被拒、认证失败、解析失败），
+每类错误在一次运行内有各自的重试预算，重试间隔为带随机抖动的指数退避；
+网站故障（超时、不可用）连续出现时熔断器打开，在冷却时间内直接跳过运行，
+冷却结束后先用一次轻量HTTP请求探测，网站恢复后才启动浏览器和OCR
+"""
+
+import os
+import json
+import time
+import random
+import socket
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from safe_io import atomic_write
+
+
+class RemoteStepError(Exception):
+    """远程步骤失败，kind为错误类别"""
+
+    kind = "unavailable"
+
+    def __init__(self, message, step=None):
+        super().__init__(message)
+        self.step = step
+
+
+class SiteTimeout(RemoteStepError):
+    """页面或请求超时"""
+    kind = "timeout"
+
+
+class SiteUnavailable(RemoteStepError):
+    """网站无法连接或返回服务器错误"""
+    kind = "unavailable"
+
+
+class CaptchaRejected(RemoteStepError):
+    """验证码被网站拒绝"""
+    kind = "captcha_rejected"
+
+
+class AuthFailed(RemoteStepError):
+    """用户名或密码错误"""
+    kind = "auth_failed"
+
+
+class ParseFailed(RemoteStepError):
+    """页面中找不到电量信息"""
+    kind = "parse_failed"
+
+
+# 计入熔断器的错误类别：网站本身出了问题，其余类别与网站是否可用无关
+OUTAGE_KINDS = ("timeout", "unavailable")
+
+# 各类错误的默认重试预算：attempts为一次运行内的最多尝试次数（含第一次），
+# 间隔在 [0, min(max_delay, base_delay * 2^重试次数)] 内随机
+DEFAULT_POLICIES = {
+    "timeout": {"attempts": 3, "base_delay": 5, "max_delay": 60},
+    "unavailable": {"attempts": 3, "base_delay": 10, "max_delay": 120},
+    "captcha_rejected": {"attempts": 5, "base_delay": 1, "max_delay": 8},
+    # 密码错误时重试无益，还可能导致账号被锁定
+    "auth_failed": {"attempts": 1, "base_delay": 0, "max_delay": 0},
+    "parse_failed": {"attempts": 2, "base_delay": 3, "max_delay": 10},
+}
+
+BREAKER_STATE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'circuit_breaker.json')
+
+
+def classify(error):
+    """返回异常的错误类别，不属于远程故障的异常返回None"""
+    if isinstance(error, RemoteStepError):
+        return error.kind
+    name = type(error).__name__
+    text = str(error)
+    # 不直接依赖selenium，按异常类名与消息识别
+    if name == "TimeoutException" or isinstance(error, (TimeoutError, socket.timeout)) \
+            or "timed out" in text.lower():
+        return "timeout"
+    if "net::ERR_" in text or isinstance(error, (ConnectionError, urllib.error.URLError)):
+        return "unavailable"
+    return None
+
+
+class RetryBudget:
+    """一次运行内各类错误的重试预算，所有远程步骤共用"""
+
+    def __init__(self, policies=None, logger=None, sleep=time.sleep, rng=None):
+        self.policies = {kind: dict(policy) for kind, policy in DEFAULT_POLICIES.items()}
+        for kind, policy in (policies or {}).items():
+            self.policies.setdefault(kind, {}).update(policy)
+        self.logger = logger
+        self.sleep = sleep
+        self.random = rng or random.Random()
+        self.used = {}
+
+    def remaining(self, kind):
+        """该类错误还能重试的次数"""
+        policy = self.policies.get(kind)
+        if policy is None:
+            return 0
+        return max(int(policy.get("attempts", 1)) - 1 - self.used.get(kind, 0), 0)
+
+    def delay(self, kind, retry):
+        """第retry次重试前的等待秒数（全抖动指数退避）"""
+        policy = self.policies.get(kind, {})
+        cap = min(float(policy.get("max_delay", 0)), float(policy.get("base_delay", 0)) * 2 ** retry)
+        return self.random.uniform(0, cap)
+
+    def backoff(self, kind):
+        """消耗一次该类错误的重试预算并等待，预算用完时返回False"""
+        if not self.remaining(kind):
+            return False
+        retry = self.used.get(kind, 0)
+        self.used[kind] = retry + 1
+        wait = self.delay(kind, retry)
+        if self.logger:
+            self.logger.info(f"{kind} 第 {retry + 1} 次重试，等待 {wait:.1f} 秒")
+        self.sleep(wait)
+        return True
+
+    def call(self, step, func, on_retry=None):
+        """执行远程步骤，可重试的错误按预算退避后重试；on_retry在每次重试前调用（如刷新页面）"""
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                kind = classify(e)
+                if kind is None:
+                    raise
+                if self.logger:
+                    self.logger.warning(f"{step} 失败（{kind}）: {e}")
+                if not self.backoff(kind):
+                    if isinstance(e, RemoteStepError):
+                        raise
+                    raise (SiteTimeout if kind == "timeout" else SiteUnavailable)(str(e), step) from e
+                if on_retry is not None:
+                    on_retry()
+
+
+class CircuitBreaker:
+    """持久化的熔断器：closed 正常运行；open 冷却中，跳过运行；冷却结束后为 half_open，探测成功后恢复"""
+
+    def __init__(self, state_path=BREAKER_STATE_PATH, failure_threshold=3, cooldown_seconds=300,
+                 max_cooldown_seconds=6 * 3600):
+        self.state_path = state_path
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.state = self.load_state()
+
+    @classmethod
+    def from_config(cls, config, state_path=BREAKER_STATE_PATH):
+        """从配置字典创建熔断器"""
+        config = config or {}
+        return cls(
+            state_path,
+            failure_threshold=config.get("failure_threshold", 3),
+            cooldown_seconds=config.get("cooldown_seconds", 300),
+            max_cooldown_seconds=config.get("max_cooldown_seconds", 6 * 3600),
+        )
+
+    def load_state(self):
+        """加载熔断器状态"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"state": "closed", "failures": 0}
+
+    def save_state(self):
+        """原子地保存熔断器状态"""
+        with atomic_write(self.state_path) as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+
+    def check(self, now=None):
+        """返回本次运行时熔断器的状态：closed、open（仍在冷却）或 half_open（应先探测）"""
+        if self.state.get("state") != "open":
+            return "closed"
+        now = now or time.time()
+        if now < self.state["opened_at"] + self.state["cooldown"]:
+            return "open"
+        return "half_open"
+
+    def retry_after(self, now=None):
+        """距离冷却结束的秒数"""
+        if self.state.get("state") != "open":
+            return 0.0
+        return max(self.state["opened_at"] + self.state["cooldown"] - (now or time.time()), 0.0)
+
+    def record_success(self):
+        """网站可以访问：关闭熔断器"""
+        if self.state.get("state") == "closed" and not self.state.get("failures"):
+            return
+        self.state = {"state": "closed", "failures": 0}
+        self.save_state()
+
+    def record_failure(self, kind, message="", now=None):
+        """记录一次运行失败；只有网站故障计数，达到阈值或探测失败时打开熔断器，冷却时间逐次加倍"""
+        if kind not in OUTAGE_KINDS:
+            return False
+        now = now or time.time()
+        was_open = self.state.get("state") == "open"
+        failures = self.state.get("failures", 0) + 1
+        state = {"state": "closed", "failures": failures, "last_error": f"{kind}: {message}"[:300]}
+        if was_open or failures >= self.failure_threshold:
+            cooldown = self.cooldown_seconds
+            if was_open:
+                cooldown = min(self.state.get("cooldown", cooldown) * 2, self.max_cooldown_seconds)
+            state.update({
+                "state": "open",
+                "opened_at": now,
+                "cooldown": cooldown,
+                "opened_at_text": datetime.fromtimestamp(now).isoformat(timespec='seconds'),
+            })
+        self.state = state
+        self.save_state()
+        return state["state"] == "open"
+
+
+def probe(url, timeout=5.0):
+    """用一次普通HTTP请求检查网站是否可用（不启动浏览器），不可用时抛出SiteTimeout或SiteUnavailable"""
+    request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (socket.timeout, TimeoutError) as e:
+        raise SiteTimeout(f"探测超时: {e}", "probe") from e
+    except (urllib.error.URLError, OSError) as e:
+        if isinstance(getattr(e, "reason", None), (socket.timeout, TimeoutError)):
+            raise SiteTimeout(f"探测超时: {e}", "probe") from e
+        raise SiteUnavailable(f"探测失败: {e}", "probe") from e
+    # 4xx（如需要登录）说明网站在正常响应
+    if status >= 500:
+        raise SiteUnavailable(f"网站返回 HTTP {status}", "probe")
+    return status
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多房间概览
+一次遍历读数存储，向量化地计算所有房间的当前电量、最近N天的走势（等间隔取样）、
+日均用电与预计可用天数，并把走势渲染为服务端生成的SVG迷你曲线；
+网页面板按数据版本缓存结果，房间再多也只需一次计算、不需要为每个房间生成Plotly图表
+"""
+
+import numpy as np
+
+from reading_store import to_epoch_us, to_datetime64
+
+DAY_US = 86_400_000_000
+# 迷你曲线的取样点数（7天时每2小时一个点）
+SPARK_POINTS = 84
+# 覆盖时间不足该天数时不计算日均用电，避免刚开始监控的房间给出失真的预测
+MIN_USAGE_DAYS = 0.5
+
+
+def room_overview(store, days=7, end=None, points=SPARK_POINTS):
+    """计算全部房间的概览，返回 (房间列表, 走势矩阵[房间数×points], 取样时间)；
+    end默认为存储中最后一次读数的时间，使结果只取决于数据版本"""
+    rooms = store.rooms()
+    n = len(rooms)
+    hot = store.records()
+    if not len(hot):
+        return [], np.empty((0, points)), np.empty(0, dtype='datetime64[us]')
+
+    # 每个房间的最后一段区间始终留在存储文件中：倒序后np.unique给出每个房间最后一次出现的位置
+    room_ids, last_from_end = np.unique(hot['room'][::-1], return_index=True)
+    last = np.asarray(hot[len(hot) - 1 - last_from_end])
+    balance = np.full(n, np.nan)
+    last_seen = np.zeros(n, dtype=np.int64)
+    balance[room_ids] = last['value']
+    last_seen[room_ids] = last['last_seen']
+
+    end_us = int(last_seen.max()) if end is None else to_epoch_us(end)
+    start_us = end_us - int(days * DAY_US)
+    window = store.read(None, start=to_datetime64(start_us))
+    window = np.asarray(window[window['first_seen'] <= end_us])
+    # 窗口开始前已经结束的区间读不到，但它的电量一直有效到下一次读数（与value_at一致）：
+    # 没有区间跨过窗口开始时间的房间补上开始前的最后一段，走势的开头和之后的电量下降才完整
+    carry = store.last_before(to_datetime64(start_us))
+    carry = carry[~np.isin(carry['room'], window['room'][window['first_seen'] <= start_us])]
+    window = np.concatenate([window, carry])
+    # 按（房间，开始时间）排序，之后的计算都不需要按房间循环
+    window = np.asarray(window[np.lexsort((window['first_seen'], window['room']))])
+    w_room = window['room'].astype(np.int64)
+    w_value = window['value']
+
+    # 走势：每个取样时间取该时间之前最近一段区间的电量；组合键 房间*K+偏移 使一次searchsorted覆盖所有房间
+    span = end_us - start_us
+    k = span + 1
+    grid = start_us + (np.arange(1, points + 1) * span) // points
+    keys = w_room * k + np.clip(window['first_seen'] - start_us, 0, span)
+    spark = np.full((n, points), np.nan)
+    if len(window):
+        queries = np.arange(n, dtype=np.int64)[:, None] * k + (grid - start_us)[None, :]
+        index = np.searchsorted(keys, queries, side='right') - 1
+        safe = np.clip(index, 0, None)
+        valid = (index >= 0) & (w_room[safe] == np.arange(n)[:, None])
+        # 房间停止监控之后不再延续最后的电量
+        valid &= grid[None, :] <= last_seen[:, None] + span // points
+        spark[valid] = w_value[safe][valid]
+
+    # 日均用电：同一房间相邻区间的电量下降量之和（充值造成的上升不计），除以覆盖的天数
+    usage = np.zeros(n)
+    covered = np.zeros(n)
+    if len(window):
+        drops = np.where((w_room[1:] == w_room[:-1]) & (w_value[1:] < w_value[:-1]),
+                         w_value[:-1] - w_value[1:], 0.0)
+        usage = np.bincount(w_room[1:], weights=drops, minlength=n)
+        present, first_index = np.unique(w_room, return_index=True)
+        first_seen = np.maximum(window['first_seen'][first_index], start_us)
+        covered[present] = (last_seen[present] - first_seen) / DAY_US
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_day = np.where(covered >= MIN_USAGE_DAYS, usage / covered, np.nan)
+        to_empty = np.where(per_day > 0, np.maximum(balance, 0) / per_day, np.nan)
+
+    result = []
+    for room_id in room_ids:
+        result.append({
+            "room": rooms[room_id],
+            "balance": float(balance[room_id]),
+            "last_seen": str(to_datetime64(last_seen[room_id]).astype('datetime64[s]')).replace('T', ' '),
+            "usage_per_day": None if np.isnan(per_day[room_id]) else round(float(per_day[room_id]), 3),
+            "days_to_empty": None if np.isnan(to_empty[room_id]) else round(float(to_empty[room_id]), 1),
+            "spark_index": int(room_id),
+        })
+    return result, spark, to_datetime64(grid)
+
+
+def sparkline_svg(values, width=160, height=36, color="#1de9b6"):
+    """把走势渲染为内联SVG折线，缺失的取样点处断开"""
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values)
+    if not finite.any():
+        return f'<svg class="sparkline" width="{width}" height="{height}"></svg>'
+    lo, hi = values[finite].min(), values[finite].max()
+    xs = np.linspace(1, width - 1, len(values))
+    ys = np.full(len(values), height / 2) if hi == lo else (height - 2) - (values - lo) / (hi - lo) * (height - 4)
+    segments = np.split(np.arange(len(values)), np.flatnonzero(np.diff(finite.astype(np.int8))) + 1)
+    lines = []
+    for segment in segments:
+        if not finite[segment[0]]:
+            continue
+        points = " ".join(f"{xs[i]:.1f},{ys[i]:.1f}" for i in segment)
+        lines.append(f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="1.5"/>')
+    return (f'<svg class="sparkline" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+            f'<title>{lo:g} ~ {hi:g} 度</title>{"".join(lines)}</svg>')
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行过程计时与运行历史记录
+为监控流程的每个阶段计时，每次运行结束后把结构化记录追加到运行历史文件
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from log_setup import run_id_var, stage_var
+
+RUN_HISTORY_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'run_history.jsonl')
+
+
+def peak_rss_bytes():
+    """返回当前进程的峰值常驻内存（字节），无法获取时返回None"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.PeakWorkingSetSize
+            return None
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux单位为KB，macOS单位为字节
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+class RunRecorder:
+    """记录一次监控运行：各阶段耗时、计数器、结果与峰值内存"""
+
+    def __init__(self, history_path=RUN_HISTORY_PATH):
+        self.history_path = history_path
+        self.run_id = datetime.now().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.samples = {}
+        self.counters = {}
+        self.fields = {}
+        self.current_stage = None
+        self.finished = False
+        # 之后的日志记录都带上本次运行的ID
+        run_id_var.set(self.run_id)
+
+    @contextmanager
+    def span(self, name, sample=False):
+        """为一个阶段计时；同名阶段的耗时累加，sample=True时同时保留每次的耗时"""
+        parent = self.current_stage
+        self.current_stage = name
+        token = stage_var.set(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            if sample:
+                self.samples.setdefault(name, []).append(round(elapsed, 4))
+            stage_var.reset(token)
+            self.current_stage = parent
+
+    def count(self, name, n=1):
+        """增加计数器"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, **fields):
+        """记录附加字段（如提取方法）"""
+        self.fields.update(fields)
+
+    def record(self, outcome):
+        """生成结构化的运行记录"""
+        peak = peak_rss_bytes()
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at.isoformat(timespec='seconds'),
+            "duration": round(time.perf_counter() - self.start, 4),
+            "outcome": outcome,
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "samples": self.samples,
+            "counters": self.counters,
+            "peak_rss_mb": round(peak / 1024 / 1024, 1) if peak else None,
+            **self.fields,
+        }
+
+    def finish(self, outcome):
+        """结束本次运行并追加到运行历史，重复调用时只记录一次"""
+        if self.finished:
+            return None
+        self.finished = True
+        record = self.record(outcome)
+        with open(self.history_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨进程文件锁与崩溃安全的文件写入
+多个监控实例（不同房间或重叠的定时任务）与网页面板可能同时读写数据文件：
+写入方通过文件锁互斥（Linux/macOS使用fcntl，Windows使用msvcrt），
+派生文件先写临时文件、fsync后再原子替换，读取方永远不会看到写了一半的文件
+"""
+
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+# 等待文件锁的默认超时（秒）
+DEFAULT_LOCK_TIMEOUT = 30.0
+LOCK_POLL_INTERVAL = 0.05
+
+
+class FileLock:
+    """基于锁文件的跨进程互斥锁，同一进程内可重入，并对线程互斥"""
+
+    def __init__(self, path, timeout=DEFAULT_LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def _try_lock(self):
+        try:
+            if sys.platform == "win32":
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self):
+        """获取锁，超时后抛出TimeoutError"""
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f"等待文件锁超时: {self.path}")
+        if self._depth:
+            self._depth += 1
+            return
+        try:
+            self._file = open(self.path, 'a+b')
+            deadline = time.monotonic() + self.timeout
+            while not self._try_lock():
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"等待文件锁超时: {self.path}")
+                time.sleep(LOCK_POLL_INTERVAL)
+        except BaseException:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+            raise
+        self._depth = 1
+
+    def release(self):
+        """释放锁"""
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if sys.platform == "win32":
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def fsync_directory(path):
+    """把目录项的变化（新建、重命名）落盘；Windows不支持对目录fsync，直接跳过"""
+    if sys.platform == "win32":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def flush_and_sync(f):
+    """把文件缓冲区写入磁盘"""
+    f.flush()
+    os.fsync(f.fileno())
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8', newline=None):
+    """原子地替换文件：写入同目录下的临时文件，fsync后重命名为目标文件；出错时保留原文件"""
+    root, ext = os.path.splitext(path)
+    # 保留扩展名，便于按扩展名推断格式的写入方（如matplotlib）
+    tmp_path = f"{root}.tmp{os.getpid()}{ext}"
+    kwargs = {} if 'b' in mode else {"encoding": encoding, "newline": newline}
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            flush_and_sync(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_directory(path)
+
+
+def append_line(path, line, encoding='utf-8'):
+    """追加一行并落盘"""
+    with open(path, 'a', encoding=encoding, newline='') as f:
+        f.write(line)
+        flush_and_sync(f)
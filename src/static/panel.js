@@ -0,0 +1,8 @@
+// 南京大学电费监控面板脚本
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('.reload-btn').forEach(function (btn) {
+        btn.addEventListener('click', function () {
+            location.reload();
+        });
+    });
+});
@@ -1,12 +1,53 @@
-import pandas as pd
-from flask import Flask, render_template_string
+from flask import Flask, Response, render_template_string, request, jsonify, make_response, g, stream_with_context
 import os
+import json
+import time
+import gzip
+import hashlib
+import argparse
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from urllib.parse import quote, urlencode
+import threading
+import numpy as np
+import pandas as pd
 import plotly.graph_objs as go
 import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+from consumption_analytics import ConsumptionAnalytics, analytics_state_path, parse_timestamp
+from run_recorder import RUN_HISTORY_PATH
+from reading_store import open_store, trend_points, STORE_PATH, DEFAULT_ROOM
+from export_readings import export_chunks, export_filename, FORMATS
+from room_overview import room_overview, sparkline_svg, DAY_US
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 静态资源统一由带指纹的 /assets/ 路由提供
+app = Flask(__name__, static_folder=None)
+
+
+# 表格分页参数：默认每页条数与允许的最大每页条数
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# 多房间概览：走势的天数范围与对比图最多叠加的房间数
+OVERVIEW_DAYS = 7
+MAX_OVERVIEW_DAYS = 90
+MAX_COMPARE = 8
+DEFAULT_COMPARE = 3
 
-app = Flask(__name__)
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_SIZE = 500
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
 
-CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'electricity_data.csv')
+STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+# 带指纹的静态资源可被浏览器永久缓存
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
 TEMPLATE = """
 <!DOCTYPE html>
@@ -14,80 +55,588 @@ TEMPLATE = """
 <head>
     <meta charset="UTF-8">
     <title>南京大学电费监控面板</title>
-    <style>
-        body { font-family: 'Segoe UI', '微软雅黑', Arial, sans-serif; margin: 0; background: linear-gradient(120deg, #0f2027, #2c5364 80%); min-height: 100vh; }
-        .container { max-width: 950px; margin: 48px auto; background: rgba(20, 30, 48, 0.95); border-radius: 18px; box-shadow: 0 6px 32px #0ff2ff33; padding: 38px 44px; }
-        h1 { text-align: center; color: #00eaff; margin-bottom: 12px; letter-spacing: 2px; text-shadow: 0 2px 8px #0ff2ff44; }
-        .desc { text-align: center; color: #b2e6ff; margin-bottom: 32px; font-size: 1.1em; }
-        table { border-collapse: collapse; width: 100%; margin: 36px 0 0 0; background: rgba(10, 20, 40, 0.95); border-radius: 10px; overflow: hidden; }
-        th, td { border: 1px solid #1de9b6; padding: 12px 18px; text-align: center; color: #fff; }
-        th { background: linear-gradient(90deg, #00eaff 60%, #1de9b6 100%); color: #fff; font-weight: bold; letter-spacing: 1px; }
-        td { color: #fff; }
-        caption { font-size: 1.25em; margin-bottom: 12px; font-weight: bold; color: #00eaff; }
-        tr:nth-child(even) { background: rgba(0, 234, 255, 0.07); }
-        tr:nth-child(odd) { background: rgba(29, 233, 182, 0.07); }
-        .chart-block { text-align: center; margin: 36px 0 10px 0; }
-        .chart-block iframe, .chart-block div { border-radius: 12px; box-shadow: 0 2px 18px #00eaff33; background: #fff; }
-        .reload-btn {
-            display: inline-block;
-            margin: 0 0 18px 0;
-            padding: 8px 22px;
-            font-size: 1em;
-            color: #00eaff;
-            background: linear-gradient(90deg, #232526 0%, #1de9b6 100%);
-            border: none;
-            border-radius: 8px;
-            box-shadow: 0 2px 8px #00eaff33;
-            cursor: pointer;
-            transition: background 0.2s, color 0.2s;
-        }
-        .reload-btn:hover {
-            background: linear-gradient(90deg, #1de9b6 0%, #00eaff 100%);
-            color: #232526;
-        }
-        @media (max-width: 800px) {
-            .container { padding: 10px; }
-            table, th, td { font-size: 13px; }
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('panel.css') }}">
+    <script src="{{ asset_url('plotly.min.js') }}"></script>
+    <script src="{{ asset_url('panel.js') }}" defer></script>
 </head>
 <body>
     <div class="container">
         <h1>南京大学电费监控面板</h1>
-        <div class="desc">展示最近电费数据及变化趋势</div>
+        <div class="desc">展示{% if room != default_room %}房间 {{ room }} {% endif %}最近电费数据及变化趋势 · <a href="/rooms">全部房间</a></div>
+        {% if stats %}
+        <div class="stats">
+            <div class="stat">
+                <div class="stat-label">当前剩余电量</div>
+                <div class="stat-value">{{ '%.2f'|format(stats.balance) }} 度</div>
+            </div>
+            <div class="stat">
+                <div class="stat-label">平均耗电速率</div>
+                <div class="stat-value">{% if stats.burn_rate_per_day is not none %}{{ '%.2f'|format(stats.burn_rate_per_day) }} 度/天{% else %}--{% endif %}</div>
+            </div>
+            <div class="stat">
+                <div class="stat-label">近7日日均用电</div>
+                <div class="stat-value">{% if stats.average_daily_usage is not none %}{{ '%.2f'|format(stats.average_daily_usage) }} 度{% else %}--{% endif %}</div>
+            </div>
+            <div class="stat">
+                <div class="stat-label">预计可用</div>
+                {% if stats.forecast %}
+                <div class="stat-value">{{ '%.1f'|format(stats.forecast.days_to_empty) }} 天</div>
+                <div class="stat-note">{{ '%.1f'|format(stats.forecast.days_to_empty_low) }} ~ {% if stats.forecast.days_to_empty_high is not none %}{{ '%.1f'|format(stats.forecast.days_to_empty_high) }}{% else %}∞{% endif %} 天</div>
+                {% else %}
+                <div class="stat-value">--</div>
+                {% endif %}
+            </div>
+        </div>
+        {% endif %}
         <div class="chart-block">
-            <button class="reload-btn" onclick="location.reload()">更新/重新加载</button>
+            <button class="reload-btn">更新/重新加载</button>
             {{ plot_div|safe }}
         </div>
         <table>
             <caption>电费数据明细</caption>
             <tr>
                 <th>时间</th>
+                <th>最后检查</th>
+                <th>读数次数</th>
                 <th>剩余电量</th>
                 <th>单位</th>
             </tr>
             {% for row in rows %}
             <tr>
                 <td>{{ row['time'] }}</td>
+                <td>{{ row['last_seen'] }}</td>
+                <td>{{ row['count'] }}</td>
                 <td>{{ row['num'] }}</td>
                 <td>{{ row['unit'] }}</td>
             </tr>
             {% endfor %}
         </table>
+        <div class="pager">
+            {% if page > 1 %}
+            <a href="{{ page_url(1) }}">首页</a>
+            <a href="{{ page_url(page - 1) }}">上一页</a>
+            {% else %}
+            <span class="disabled">首页</span>
+            <span class="disabled">上一页</span>
+            {% endif %}
+            <span>第 {{ page }} / {{ total_pages }} 页（共 {{ total }} 条）</span>
+            {% if page < total_pages %}
+            <a href="{{ page_url(page + 1) }}">下一页</a>
+            <a href="{{ page_url(total_pages) }}">末页</a>
+            {% else %}
+            <span class="disabled">下一页</span>
+            <span class="disabled">末页</span>
+            {% endif %}
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+ROOMS_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="zh-cn">
+<head>
+    <meta charset="UTF-8">
+    <title>全部房间 - 南京大学电费监控面板</title>
+    <link rel="stylesheet" href="{{ asset_url('panel.css') }}">
+    <script src="{{ asset_url('plotly.min.js') }}"></script>
+    <script src="{{ asset_url('panel.js') }}" defer></script>
+</head>
+<body>
+    <div class="container">
+        <h1>全部房间</h1>
+        <div class="desc">{{ rooms|length }} 个房间 · 最近 {{ days }} 天 · <a href="/">返回面板</a></div>
+        <form method="get" action="/rooms">
+            {% if plot_div %}
+            <div class="chart-block">{{ plot_div|safe }}</div>
+            {% endif %}
+            <div class="pager">
+                最近 <input type="number" name="days" value="{{ days }}" min="1" max="{{ max_days }}" class="days-input"> 天
+                <button type="submit" class="reload-btn">对比选中的房间（最多 {{ max_compare }} 个）</button>
+            </div>
+            <table>
+                <caption>房间概览（按预计可用天数排序）</caption>
+                <tr>
+                    <th>对比</th>
+                    <th>房间</th>
+                    <th>剩余电量</th>
+                    <th>最近 {{ days }} 天走势</th>
+                    <th>日均用电</th>
+                    <th>预计可用</th>
+                    <th>最后检查</th>
+                </tr>
+                {% for item in rooms %}
+                <tr>
+                    <td><input type="checkbox" name="compare" value="{{ item.room }}"{% if item.room in selected %} checked{% endif %}></td>
+                    <td><a href="/?{{ {'room': item.room, 'days': days}|urlencode }}">{{ item.room }}</a></td>
+                    <td>{{ '%.2f'|format(item.balance) }} 度</td>
+                    <td>{{ item.sparkline|safe }}</td>
+                    <td>{% if item.usage_per_day is not none %}{{ '%.2f'|format(item.usage_per_day) }} 度{% else %}--{% endif %}</td>
+                    <td>{% if item.days_to_empty is not none %}{{ '%.1f'|format(item.days_to_empty) }} 天{% else %}--{% endif %}</td>
+                    <td>{{ item.last_seen }}</td>
+                </tr>
+                {% endfor %}
+            </table>
+        </form>
     </div>
 </body>
 </html>
 """
 
+class AssetRegistry:
+    """带内容指纹的静态资源表：面板自身的CSS/JS与本地plotly.js"""
+
+    MIMETYPES = {'.css': 'text/css', '.js': 'application/javascript'}
+
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        self.assets = None
+        self.build_id = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """首次使用时读取并计算所有资源的指纹"""
+        if self.assets is None:
+            with self.lock:
+                if self.assets is None:
+                    sources = {'plotly.min.js': get_plotlyjs().encode('utf-8')}
+                    for name in sorted(os.listdir(self.static_dir)):
+                        with open(os.path.join(self.static_dir, name), 'rb') as f:
+                            sources[name] = f.read()
+                    assets = {}
+                    for name, data in sources.items():
+                        stem, ext = os.path.splitext(name)
+                        digest = hashlib.sha256(data).hexdigest()[:12]
+                        assets[name] = {
+                            "url_name": f"{stem}.{digest}{ext}",
+                            "etag": digest,
+                            "mimetype": self.MIMETYPES.get(ext, 'application/octet-stream'),
+                            "encoded": {None: data},
+                        }
+                    # 所有资源指纹的摘要：页面引用的资源URL变化时，页面的ETag也随之变化
+                    self.build_id = hashlib.sha256(
+                        "|".join(asset["url_name"] for asset in assets.values()).encode('utf-8')).hexdigest()[:12]
+                    self.loaded_at = datetime.now(timezone.utc).replace(microsecond=0)
+                    self.assets = assets
+        return self.assets
+
+    def url_for(self, name):
+        """返回资源的指纹化URL"""
+        return f"/assets/{self.load()[name]['url_name']}"
+
+    def lookup(self, url_name):
+        """根据指纹化文件名查找资源"""
+        for asset in self.load().values():
+            if asset["url_name"] == url_name:
+                return asset
+        return None
+
+    def body(self, asset, encoding):
+        """返回指定编码的资源内容，压缩结果只计算一次"""
+        encoded = asset["encoded"]
+        if encoding not in encoded:
+            raw = encoded[None]
+            encoded[encoding] = brotli.compress(raw, quality=11) if encoding == 'br' \
+                else gzip.compress(raw, compresslevel=9)
+        return encoded[encoding]
+
+assets = AssetRegistry(STATIC_DIR)
+
+@app.context_processor
+def inject_asset_url():
+    """模板中使用 asset_url('panel.css') 引用静态资源"""
+    return {"asset_url": assets.url_for}
+
+@app.route("/assets/<url_name>")
+def static_asset(url_name):
+    """提供带指纹的静态资源，并设置长期缓存"""
+    asset = assets.lookup(url_name)
+    if asset is None:
+        return make_response('Not Found', 404)
+    encoding = choose_encoding()
+    etag = f"{asset['etag']}-{encoding}" if encoding else asset["etag"]
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(assets.body(asset, encoding))
+        response.mimetype = asset["mimetype"]
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+    return response
+
+registry = metrics.Registry()
+panel_requests = registry.counter(
+    'nju_panel_requests_total', '面板请求数', ('route', 'status'))
+panel_latency = registry.histogram(
+    'nju_panel_request_duration_seconds', '面板请求耗时（秒）', ('route',))
+monitor_runs = registry.counter(
+    'nju_monitor_runs_total', '监控运行次数（按结果）', ('outcome',))
+monitor_successes = registry.counter(
+    'nju_monitor_success_total', '成功获取电量的运行次数')
+captcha_attempts = registry.counter(
+    'nju_monitor_captcha_attempts_total', '验证码识别尝试次数')
+captcha_rejections = registry.counter(
+    'nju_monitor_captcha_rejections_total', '验证码被网站拒绝次数')
+stage_latency = registry.histogram(
+    'nju_monitor_stage_duration_seconds', '监控各阶段耗时（秒）', ('stage',))
+ocr_latency = registry.histogram(
+    'nju_monitor_ocr_duration_seconds', '单次验证码OCR耗时（秒）',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0))
+run_duration = registry.histogram(
+    'nju_monitor_run_duration_seconds', '单次监控运行总耗时（秒）',
+    buckets=(5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600))
+last_run_timestamp = registry.gauge(
+    'nju_monitor_last_run_timestamp_seconds', '最近一次运行的开始时间（Unix时间戳）')
+last_reading_age = registry.gauge(
+    'nju_monitor_last_reading_age_seconds', '最近一次电量读数距今的秒数', ('room',))
+balance_gauge = registry.gauge(
+    'nju_monitor_balance_kwh', '当前剩余电量（度）', ('room',))
+days_to_empty_gauge = registry.gauge(
+    'nju_monitor_days_to_empty', '预计剩余电量可用天数', ('room',))
+
+
+class RunHistoryCollector:
+    """增量读取运行历史文件，把新增的运行记录累计到指标中"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.lock = threading.Lock()
+
+    def collect(self):
+        """读取上次位置之后新增的完整行"""
+        with self.lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                return
+            if size < self.offset:
+                # 文件被截断或替换，从头读取
+                self.offset = 0
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self.offset += len(line)
+                    try:
+                        self.observe(json.loads(line))
+                    except ValueError:
+                        continue
+
+    @staticmethod
+    def observe(record):
+        """把一条运行记录计入指标"""
+        monitor_runs.inc(record.get("outcome", "unknown"))
+        if record.get("outcome") == "success":
+            monitor_successes.inc()
+        counters = record.get("counters", {})
+        captcha_attempts.inc(amount=counters.get("captcha_attempts", 0))
+        captcha_rejections.inc(amount=counters.get("captcha_rejections", 0))
+        for stage, seconds in record.get("stages", {}).items():
+            stage_latency.observe(seconds, stage)
+        for seconds in record.get("samples", {}).get("ocr", []):
+            ocr_latency.observe(seconds)
+        if "duration" in record:
+            run_duration.observe(record["duration"])
+        if record.get("started_at"):
+            last_run_timestamp.set(parse_timestamp(record["started_at"]).timestamp())
+
+run_history = RunHistoryCollector(RUN_HISTORY_PATH)
+
+@app.before_request
+def start_request_timer():
+    """记录请求开始时间"""
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """记录面板请求数与耗时"""
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        panel_requests.inc(route, str(response.status_code))
+        panel_latency.observe(time.perf_counter() - start, route)
+    return response
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus指标接口"""
+    run_history.collect()
+    # 每个房间一组读数指标，以room标签区分
+    for room in open_store().rooms():
+        summary = load_analytics_summary(room)
+        if not summary or not summary.get("last_time"):
+            for gauge in (last_reading_age, balance_gauge, days_to_empty_gauge):
+                gauge.remove(room)
+            continue
+        last_reading_age.set(time.time() - parse_timestamp(summary["last_time"]).timestamp(), room)
+        balance_gauge.set(summary["balance"], room)
+        forecast = summary.get("forecast")
+        if forecast:
+            days_to_empty_gauge.set(forecast["days_to_empty"], room)
+        else:
+            days_to_empty_gauge.remove(room)
+    response = make_response(registry.render())
+    response.headers['Content-Type'] = metrics.CONTENT_TYPE
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def data_version(room=DEFAULT_ROOM):
+    """返回数据文件（读数存储与该房间的用电统计）的版本号（修改时间+大小）与最后修改时间"""
+    parts = []
+    latest = None
+    for path in (STORE_PATH, analytics_state_path(room)):
+        try:
+            st = os.stat(path)
+        except OSError:
+            parts.append("missing")
+            continue
+        parts.append(f"{st.st_mtime_ns:x}-{st.st_size:x}")
+        latest = max(latest or 0, int(st.st_mtime))
+    modified = datetime.fromtimestamp(latest, tz=timezone.utc) if latest is not None else None
+    return "|".join(parts), modified
+
+def load_analytics_summary(room=DEFAULT_ROOM):
+    """读取房间的用电统计摘要，没有统计数据时返回None"""
+    analytics = ConsumptionAnalytics(analytics_state_path(room))
+    if not analytics.load():
+        return None
+    return analytics.summary()
+
+def choose_encoding():
+    """根据Accept-Encoding选择响应压缩方式"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def cached_by_data_version(view):
+    """为依赖数据的页面的成功（200）响应添加强ETag与Last-Modified，数据未变化时返回304；
+    页面中引用了指纹化的资源URL，资源更新（服务重启）后ETag与Last-Modified也随之变化"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version, modified = data_version(request.args.get('room', DEFAULT_ROOM))
+        assets.load()
+        if modified is not None:
+            modified = max(modified, assets.loaded_at)
+        # 同一数据版本下，不同URL、不同资源版本与不同压缩方式对应不同的表示
+        key = f"{version}|{assets.build_id}|{request.full_path}|{choose_encoding() or 'identity'}"
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        if etag in request.if_none_match or (
+                not request.if_none_match and modified is not None
+                and request.if_modified_since is not None
+                and modified <= request.if_modified_since):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            # 错误响应（如导出参数错误的400）不带验证器，之后的条件请求不会对它返回304
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        if modified is not None:
+            response.last_modified = modified
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+@app.after_request
+def compress_response(response):
+    """对文本类响应进行brotli/gzip压缩"""
+    response.vary.add('Accept-Encoding')
+    # 流式响应（导出）由生成器自行压缩，这里读取响应体会把整个流缓存到内存中
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = choose_encoding()
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=5))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=6))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+# 多房间概览的计算结果按数据版本缓存：{(数据版本, 天数): 结果}，数据变化后旧版本的结果被丢弃
+_overview_cache = {}
+_overview_lock = threading.Lock()
+
+def parse_overview_days():
+    """概览的天数参数，取整并限制范围，避免缓存键无限增长"""
+    days = request.args.get('days', OVERVIEW_DAYS, type=float) or OVERVIEW_DAYS
+    return int(min(max(round(days), 1), MAX_OVERVIEW_DAYS))
+
+def cached_room_overview(days):
+    """全部房间的概览（含SVG迷你曲线），同一数据版本只计算一次"""
+    version, _ = data_version()
+    key = (version, days)
+    with _overview_lock:
+        cached = _overview_cache.get(key)
+    if cached is not None:
+        return cached
+    rooms, spark, grid = room_overview(open_store(), days)
+    for item in rooms:
+        values = spark[item.pop("spark_index")]
+        item["sparkline"] = sparkline_svg(values)
+        item["spark"] = [None if v != v else round(float(v), 2) for v in values]
+    # 预计可用天数最少的房间排在最前，无法预测的排在最后
+    rooms.sort(key=lambda item: (item["days_to_empty"] is None, item["days_to_empty"] or 0, item["room"]))
+    # 窗口结束于最后一次读数而不是当前时间，对比图使用同一个时间范围
+    end = grid[-1] if len(grid) else None
+    cached = {"days": days, "times": [str(t) for t in grid.astype('datetime64[s]')], "rooms": rooms,
+              "start": None if end is None else str(end - np.timedelta64(int(days * DAY_US), 'us')),
+              "end": None if end is None else str(end)}
+    with _overview_lock:
+        for stale in [k for k in _overview_cache if k[0] != version]:
+            del _overview_cache[stale]
+        _overview_cache[key] = cached
+    return cached
+
+def load_readings(room=DEFAULT_ROOM, days=None):
+    """读取指定房间的电量数据（存储中已按时间升序排列）；指定days时只读取该房间最后一次读数之前的days天，
+    已归档的月份中只打开时间上有重叠的分区。窗口与room_overview相同以最后一次读数为终点，
+    结果只取决于数据版本，与按数据版本生成的ETag一致（监控停止写入后不会对移动的窗口返回304）"""
+    store = open_store()
+    start = None
+    if days:
+        last = store.last_checked(room)
+        start = last - timedelta(days=days) if last is not None else None
+    return store.frame(room, start)
+
+def parse_pagination():
+    """从查询参数中解析页码与每页条数"""
+    page = request.args.get('page', 1, type=int) or 1
+    page_size = request.args.get('page_size', PAGE_SIZE, type=int) or PAGE_SIZE
+    return max(page, 1), min(max(page_size, 1), MAX_PAGE_SIZE)
+
+def paginate_readings(df_sorted, page, page_size):
+    """按时间倒序截取一页数据，只序列化当前页的行"""
+    total = len(df_sorted)
+    total_pages = max((total + page_size - 1) // page_size, 1)
+    page = min(page, total_pages)
+    # 升序数据中，第page页（最新在前）对应的是末尾的一段
+    end = total - (page - 1) * page_size
+    start = max(end - page_size, 0)
+    page_df = df_sorted.iloc[start:end].iloc[::-1].copy()
+    page_df['time'] = page_df['time'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    if 'last_seen' in page_df:
+        page_df['last_seen'] = page_df['last_seen'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return {
+        "rows": page_df.to_dict(orient="records"),
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "total_pages": total_pages,
+    }
+
+@app.route("/api/readings")
+@cached_by_data_version
+def api_readings():
+    """分页返回电量数据（最新在前）"""
+    page, page_size = parse_pagination()
+    room = request.args.get('room', DEFAULT_ROOM)
+    days = request.args.get('days', type=float)
+    return jsonify(paginate_readings(load_readings(room, days), page, page_size))
+
+@app.route("/api/rooms")
+@cached_by_data_version
+def api_rooms():
+    """全部房间的概览：当前电量、走势取样、日均用电与预计可用天数"""
+    overview = cached_room_overview(parse_overview_days())
+    return jsonify({**overview, "rooms": [{k: v for k, v in item.items() if k != "sparkline"}
+                                          for item in overview["rooms"]]})
+
+@app.route("/rooms")
+@cached_by_data_version
+def rooms_page():
+    """多房间概览页：每个房间一行（SVG迷你曲线由服务端生成），下方为选中房间的对比图"""
+    days = parse_overview_days()
+    overview = cached_room_overview(days)
+    names = [item["room"] for item in overview["rooms"]]
+    selected = [room for room in request.args.getlist('compare') if room in names][:MAX_COMPARE]
+    if not selected:
+        selected = names[:DEFAULT_COMPARE]
+    plot_div = None
+    if selected:
+        traces = []
+        store = open_store()
+        start, end = pd.Timestamp(overview["start"]), pd.Timestamp(overview["end"])
+        for room in selected:
+            points = trend_points(store.frame(room, start, end + pd.Timedelta(microseconds=1)))
+            # 与迷你曲线一致：从窗口开始时仍有效的电量画起
+            at_start = store.value_at(start, room)
+            if at_start is not None:
+                points = pd.concat([pd.DataFrame({"time": [start], "num": [at_start]}),
+                                    points[points['time'] > start]], ignore_index=True)
+            traces.append(go.Scatter(x=points['time'], y=points['num'], mode='lines', name=room,
+                                     line=dict(width=2, shape='hv'),
+                                     hovertemplate=f'{room}: %{{y}} 度<extra></extra>'))
+        layout = go.Layout(
+            title=dict(text='房间电量对比', x=0.5, font=dict(family='Segoe UI,微软雅黑', size=20, color='#00eaff')),
+            xaxis=dict(title='时间', tickformat='%m-%d %H:%M', showgrid=True, gridcolor='rgba(29,233,182,0.15)',
+                       color='#b2e6ff', range=[start, end]),
+            yaxis=dict(title='剩余电量 (度)', showgrid=True, gridcolor='rgba(29,233,182,0.15)', color='#b2e6ff'),
+            hovermode='x unified',
+            plot_bgcolor='rgba(10,20,40,0.95)',
+            paper_bgcolor='rgba(20,30,48,0.95)',
+            margin=dict(l=60, r=30, t=60, b=60),
+            font=dict(family='Segoe UI,微软雅黑', size=14, color='#b2e6ff')
+        )
+        plot_div = pio.to_html(go.Figure(data=traces, layout=layout), full_html=False, include_plotlyjs=False,
+                               config={'displaylogo': False, 'scrollZoom': True})
+    return render_template_string(ROOMS_TEMPLATE, rooms=overview["rooms"], days=days, selected=selected,
+                                  plot_div=plot_div, max_days=MAX_OVERVIEW_DAYS, max_compare=MAX_COMPARE)
+
+@app.route("/api/analytics")
+@cached_by_data_version
+def api_analytics():
+    """返回用电统计摘要：?room=422"""
+    return jsonify(load_analytics_summary(request.args.get('room', DEFAULT_ROOM)))
+
+@app.route("/export")
+@cached_by_data_version
+def export():
+    """流式导出读数：?format=csv|jsonl|parquet&room=422&start=2025-09-01&end=2025-10-01&shape=readings|intervals&gzip=1；
+    不指定gzip参数时，文本格式按Accept-Encoding边生成边压缩"""
+    fmt = request.args.get('format', 'csv')
+    room = request.args.get('room', DEFAULT_ROOM)
+    as_file = request.args.get('gzip', type=int) == 1
+    encode = not as_file and fmt != 'parquet' and request.accept_encodings['gzip']
+    try:
+        chunks = export_chunks(open_store(), fmt, room, request.args.get('start') or None,
+                               request.args.get('end') or None, request.args.get('shape', 'readings'),
+                               gzip=as_file or encode)
+    except (ValueError, RuntimeError) as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+    mimetype = 'application/gzip' if as_file else FORMATS[fmt]['mimetype']
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    if encode:
+        response.headers['Content-Encoding'] = 'gzip'
+    filename = export_filename(fmt, room, as_file)
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    return response
+
 @app.route("/")
+@cached_by_data_version
 def index():
-    df = pd.read_csv(CSV_PATH)
-    df['time'] = pd.to_datetime(df['time'])
-    df_sorted = df.sort_values('time')
-    # 生成plotly曲线，科技感配色
+    room = request.args.get('room', DEFAULT_ROOM)
+    df_sorted = load_readings(room, request.args.get('days', type=float))
+    # 生成plotly曲线，科技感配色；电量不变的区间只画首尾两端，点数与区间数成正比
+    points = trend_points(df_sorted)
     trace = go.Scatter(
-        x=df_sorted['time'],
-        y=df_sorted['num'],
+        x=points['time'],
+        y=points['num'],
         mode='lines+markers',
         marker=dict(color='#00eaff', size=9, line=dict(width=2, color='#1de9b6')),
         line=dict(width=3, color='#1de9b6'),
@@ -125,16 +674,46 @@ def index():
         font=dict(family='Segoe UI,微软雅黑', size=14, color='#b2e6ff')
     )
     fig = go.Figure(data=[trace], layout=layout)
-    plot_div = pio.to_html(fig, full_html=False, include_plotlyjs='cdn', config={
+    plot_div = pio.to_html(fig, full_html=False, include_plotlyjs=False, config={
         'displayModeBar': True,
         'scrollZoom': True,
         'displaylogo': False,
         'modeBarButtonsToRemove': ['select2d', 'lasso2d', 'autoScale2d', 'resetScale2d', 'toggleSpikelines']
     })
-    # 格式化时间为字符串用于表格展示
-    df_sorted['time'] = df_sorted['time'].dt.strftime('%Y-%m-%d %H:%M:%S')
-    rows = df_sorted.to_dict(orient="records")
-    return render_template_string(TEMPLATE, rows=rows, plot_div=plot_div)
+    # 表格只渲染当前页
+    page, page_size = parse_pagination()
+    table = paginate_readings(df_sorted, page, page_size)
+    # 翻页链接保留房间与天数参数
+    query = {key: request.args[key] for key in ('room', 'days') if request.args.get(key)}
+    def page_url(number):
+        return "?" + urlencode({**query, "page": number, "page_size": table["page_size"]})
+    return render_template_string(TEMPLATE, plot_div=plot_div, stats=load_analytics_summary(room),
+                                  room=room, default_room=DEFAULT_ROOM,
+                                  page_url=page_url, **table)
+
+def serve(host="127.0.0.1", port=5000, threads=8):
+    """以生产模式运行面板：优先使用waitress多线程WSGI服务器"""
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("未安装waitress，使用Werkzeug多线程服务器（pip install waitress）")
+        app.run(host=host, port=port, threaded=True, debug=False, use_reloader=False)
+        return
+    print(f"电费监控面板已启动: http://{host}:{port}/ （{threads} 个工作线程）")
+    waitress_serve(app, host=host, port=port, threads=threads)
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="南京大学电费监控网页面板")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，局域网访问请使用0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000, help="监听端口")
+    parser.add_argument("--threads", type=int, default=8, help="工作线程数")
+    parser.add_argument("--dev", action="store_true", help="使用Flask开发服务器（调试模式）")
+    args = parser.parse_args()
+    if args.dev:
+        app.run(host=args.host, port=args.port, debug=True)
+    else:
+        serve(args.host, args.port, args.threads)
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储与面板扩展性基准
+为不同规模（默认1千、10万、100万条）和房间数生成逼真的合成历史读数，
+在临时目录中分别测量保存、完整读取、时间范围查询、聚合统计、曲线图生成和面板请求的耗时，
+每个测试在独立子进程中运行以便记录峰值内存；结果写入JSON并与保存的基线比较
+
+用法：
+    python tests/benchmark_storage.py                          # 默认规模，结果写入 data/benchmark_results.json
+    python tests/benchmark_storage.py --sizes 1000 100000 --rooms 4
+    python tests/benchmark_storage.py --save-baseline          # 把本次结果保存为基线
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+RESULTS_PATH = os.path.join(ROOT, 'data', 'benchmark_results.json')
+BASELINE_PATH = os.path.join(ROOT, 'data', 'benchmark_baseline.json')
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+# 比基线慢超过该比例时标记为退化
+REGRESSION_RATIO = 1.25
+
+# 合成数据参数：轮询间隔约3小时，电表约每6小时更新一次，平均每小时耗电0.3度，低于10度时充值
+POLL_HOURS = 3.0
+METER_UPDATE_HOURS = 6.0
+BURN_PER_HOUR = 0.3
+RECHARGE_AMOUNT = 140.0
+MIN_BALANCE = 10.0
+START_TIME = datetime(2020, 1, 1)
+
+# 各测试项及其说明，按执行顺序排列
+CASES = (
+    ("save", "保存一条读数（写入存储与兼容文件、更新统计、生成曲线图）"),
+    ("load_json", "逐行读取完整JSON历史"),
+    ("load_csv", "pandas读取完整CSV并排序"),
+    ("load_store", "面板从二进制存储读取完整历史"),
+    ("range_query", "从二进制存储查询最近7天"),
+    ("aggregate", "按天聚合用电量并重建用电统计"),
+    ("chart", "生成matplotlib曲线图"),
+    ("panel_index", "面板首页（首次请求与缓存命中）"),
+    ("panel_api", "分页接口第一页"),
+)
+
+
+def synthetic_readings(rows, seed=0):
+    """生成单个房间的合成读数，返回 (时间数组, 电量数组)；电量在电表更新之间保持不变"""
+    rng = np.random.default_rng(seed)
+    intervals = rng.gamma(8.0, POLL_HOURS / 8.0, rows)
+    hours = np.cumsum(intervals)
+    # 电表只在整点周期更新，两次更新之间重复轮询到的是同一个值
+    meter_hours = np.floor(hours / METER_UPDATE_HOURS) * METER_UPDATE_HOURS
+    # 白天用电多、夜间用电少
+    daily = 1.0 + 0.6 * np.sin(2 * np.pi * (meter_hours % 24 - 8) / 24)
+    consumed = np.cumsum(np.diff(meter_hours, prepend=0.0) * BURN_PER_HOUR * daily)
+    balance = MIN_BALANCE + RECHARGE_AMOUNT - np.mod(consumed, RECHARGE_AMOUNT)
+    times = np.datetime64(START_TIME, 'us') + (hours * 3600e6).astype('timedelta64[us]')
+    return times, np.round(balance, 2)
+
+
+def write_history(data_dir, rows, rooms, seed=0):
+    """按房间写入二进制存储与兼容的JSON/CSV历史，第一个房间为监控脚本与面板默认使用的房间"""
+    from reading_store import ReadingStore, DEFAULT_ROOM, mirror_paths
+    store = ReadingStore(os.path.join(data_dir, 'readings.bin'))
+    per_room = max(rows // rooms, 1)
+    for room in range(rooms):
+        times, values = synthetic_readings(per_room, seed + room)
+        name = DEFAULT_ROOM if room == 0 else f"room{room}"
+        store.append_many(times.astype(np.int64), values, name)
+        stamps = np.datetime_as_string(times, unit='us')
+        json_path, csv_path = mirror_paths(name, data_dir)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            f.writelines(f'{{"timestamp": "{t}", "remaining_electricity": {v}, "unit": "度"}}\n'
+                         for t, v in zip(stamps, values.tolist()))
+        pd.DataFrame({"time": stamps, "num": values, "unit": "度"}).to_csv(csv_path, index=False)
+    return per_room
+
+
+def prepare_sandbox(rows, rooms, seed=0):
+    """复制源码并写入合成数据，所有读写都在临时目录中进行"""
+    sandbox = tempfile.mkdtemp(prefix="nju_bench_")
+    shutil.copytree(os.path.join(ROOT, 'src'), os.path.join(sandbox, 'src'),
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    os.makedirs(os.path.join(sandbox, 'data'))
+    os.makedirs(os.path.join(sandbox, 'logs'))
+    write_history(os.path.join(sandbox, 'data'), rows, rooms, seed)
+    return sandbox
+
+
+def timed(func, repeat=1):
+    """运行若干次，返回平均耗时（秒）和最后一次的返回值"""
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def run_case(case, sandbox):
+    """在当前进程中运行一个测试项（由子进程调用），只导入沙箱中的源码"""
+    sys.path.insert(0, os.path.join(sandbox, 'src'))
+    from reading_store import DEFAULT_ROOM
+    data_dir = os.path.join(sandbox, 'data')
+    json_path = os.path.join(data_dir, 'electricity_data.json')
+    csv_path = os.path.join(data_dir, 'electricity_data.csv')
+    result = {}
+
+    if case == "save":
+        import logging
+        from nju_electric_monitor_auto import NJUElectricMonitor
+        # 只测量保存路径，不启动浏览器和OCR
+        monitor = NJUElectricMonitor.__new__(NJUElectricMonitor)
+        monitor.logger = logging.getLogger("benchmark")
+        monitor.alert_manager = None
+        monitor.analytics_summary = None
+        monitor.room = DEFAULT_ROOM
+        monitor.chart_days = 0
+        # 第一次保存会从历史重建用电统计，单独记录
+        result["first_seconds"], _ = timed(lambda: monitor.save_data(50.0))
+        result["seconds"], _ = timed(lambda: monitor.save_data(49.9), repeat=3)
+    elif case == "load_json":
+        from consumption_analytics import read_history
+        result["seconds"], rows = timed(lambda: sum(1 for _ in read_history(json_path)))
+        result["rows"] = rows
+    elif case == "load_csv":
+        def load_csv():
+            df = pd.read_csv(csv_path)
+            df['time'] = pd.to_datetime(df['time'])
+            return df.sort_values('time')
+        result["seconds"], df = timed(load_csv)
+        result["rows"] = len(df)
+    elif case == "load_store":
+        import web_panel
+        result["seconds"], df = timed(web_panel.load_readings)
+        result["rows"] = len(df)
+        result["samples"] = int(df['count'].sum())
+    elif case == "range_query":
+        from reading_store import open_store, to_datetime64
+
+        def query():
+            store = open_store()
+            end = to_datetime64(store.records()['last_seen'].max()) + np.timedelta64(1, 'us')
+            return store.frame(DEFAULT_ROOM, end - np.timedelta64(7, 'D'), end)
+        result["seconds"], matched = timed(query)
+        result["rows"] = len(matched)
+    elif case == "aggregate":
+        import web_panel
+        from consumption_analytics import ConsumptionAnalytics, read_history
+
+        def daily_usage():
+            df = web_panel.load_readings().set_index('time')
+            drop = (-df['num'].diff()).clip(lower=0)
+            return drop.resample('D').sum()
+        result["seconds"], days = timed(daily_usage)
+        result["days"] = len(days)
+        analytics = ConsumptionAnalytics(os.path.join(data_dir, 'bench_analytics.json'))
+        result["rebuild_seconds"], _ = timed(lambda: analytics.rebuild(read_history(json_path)))
+    elif case == "chart":
+        import web_panel
+        from reading_store import trend_points
+        from trend_chart import render_trend_chart
+        png_path = os.path.join(data_dir, 'bench_trend.png')
+        df = trend_points(web_panel.load_readings())
+        result["seconds"], _ = timed(lambda: render_trend_chart(df, png_path))
+    elif case == "panel_index":
+        import web_panel
+        client = web_panel.app.test_client()
+        result["seconds"], response = timed(lambda: client.get('/'))
+        result["status"] = response.status_code
+        result["bytes"] = len(response.data)
+        result["cached_seconds"], _ = timed(lambda: client.get('/'), repeat=5)
+    elif case == "panel_api":
+        import web_panel
+        client = web_panel.app.test_client()
+        result["seconds"], response = timed(lambda: client.get('/api/readings?page=1'))
+        result["status"] = response.status_code
+    else:
+        raise ValueError(f"未知的测试项: {case}")
+
+    from run_recorder import peak_rss_bytes
+    peak = peak_rss_bytes()
+    result["peak_rss_mb"] = round(peak / 1024 / 1024, 1) if peak else None
+    return result
+
+
+def run_isolated(case, sandbox, timeout):
+    """在独立子进程中运行测试项，峰值内存只包含该测试项本身"""
+    try:
+        completed = subprocess.run(
+            [sys.executable, __file__, "--worker", case, "--sandbox", sandbox],
+            capture_output=True, text=True, encoding='utf-8', timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {"error": f"超时（{timeout}秒）"}
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        error = (completed.stderr.strip().splitlines() or ["未知错误"])[-1]
+        return {"error": error}
+    return json.loads(lines[-1])
+
+
+def compare(results, baseline):
+    """与基线比较，返回退化的测试项"""
+    regressions = []
+    for size, cases in results["sizes"].items():
+        for case, result in cases.items():
+            base = baseline.get("sizes", {}).get(size, {}).get(case, {})
+            if "seconds" in result and base.get("seconds"):
+                ratio = result["seconds"] / base["seconds"]
+                result["baseline_seconds"] = base["seconds"]
+                result["ratio"] = round(ratio, 3)
+                if ratio > REGRESSION_RATIO:
+                    regressions.append((size, case, ratio))
+    return regressions
+
+
+def print_results(results):
+    """打印结果表"""
+    for size, cases in results["sizes"].items():
+        print(f"\n--- {int(size):,} 条读数（{results['rooms']} 个房间）---")
+        for case, result in cases.items():
+            if "error" in result:
+                print(f"  {case:<12} 失败: {result['error']}")
+                continue
+            line = f"  {case:<12} {result['seconds'] * 1000:10.1f} ms  峰值内存 {result['peak_rss_mb']} MB"
+            if "ratio" in result:
+                line += f"  基线 {result['baseline_seconds'] * 1000:.1f} ms（×{result['ratio']:.2f}）"
+            print(line)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="存储与面板扩展性基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="读数总条数")
+    parser.add_argument("--rooms", type=int, default=1, help="房间数（读数平均分配到各房间）")
+    parser.add_argument("--cases", nargs="+", choices=[name for name, _ in CASES],
+                        default=[name for name, _ in CASES], help="只运行指定的测试项")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据的随机数种子")
+    parser.add_argument("--timeout", type=int, default=1800, help="单个测试项的超时（秒）")
+    parser.add_argument("--output", default=RESULTS_PATH, help="结果文件")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--sandbox", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_case(args.worker, args.sandbox)))
+        return
+
+    # 生成数据时使用仓库中的存储模块（路径都显式指定为沙箱目录）
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+    print("=" * 60)
+    print("存储与面板扩展性基准")
+    print("=" * 60)
+    results = {
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "rooms": args.rooms,
+        "sizes": {},
+    }
+    for size in args.sizes:
+        print(f"\n生成 {size:,} 条合成读数...")
+        start = time.perf_counter()
+        sandbox = prepare_sandbox(size, args.rooms, args.seed)
+        print(f"  耗时 {time.perf_counter() - start:.1f}s")
+        cases = results["sizes"].setdefault(str(size), {})
+        try:
+            for name, description in CASES:
+                if name in args.cases:
+                    print(f"  {description}...")
+                    cases[name] = run_isolated(name, sandbox, args.timeout)
+        finally:
+            shutil.rmtree(sandbox, ignore_errors=True)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f))
+    print_results(results)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已保存到: {args.output}")
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"已保存为基线: {args.baseline}")
+    if regressions:
+        print(f"\n⚠ 比基线慢超过 {REGRESSION_RATIO:.2f} 倍的测试项:")
+        for size, case, ratio in regressions:
+            print(f"  {int(size):,} 条 {case}: ×{ratio:.2f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
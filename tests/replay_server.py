@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线回放替身服务器
+在本地复现统一身份认证登录页（#username、#password、#captchaImg、#captchaResponse、
+#msg1、auth_login_btn 登录按钮）和电费充值页（基于 data/debug_page_source.html），
+可配置延迟、验证码拒绝率和故障注入，用于端到端测试与性能基准，无需访问真实网站
+
+用法：
+    python tests/replay_server.py --port 8900 --latency 0.2 --captcha-reject-rate 0.3
+然后在 config.json 中设置 "url": "http://127.0.0.1:8900/epay/h5/nju/electric/index"
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import string
+import secrets
+import logging
+import argparse
+import threading
+
+from flask import Flask, request, redirect, make_response, session, abort
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+PAGE_SOURCE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'debug_page_source.html')
+CAPTCHA_SAMPLE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'captcha_debug.png')
+
+INDEX_PATH = "/epay/h5/nju/electric/index"
+LOGIN_PATH = "/authserver/login"
+CAPTCHA_PATH = "/authserver/getCaptcha.htl"
+
+LOGIN_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-cn">
+<head><meta charset="UTF-8"><title>统一身份认证</title></head>
+<body>
+<form id="pwdFromId" method="post" action="{action}">
+    <input id="username" name="username" type="text" placeholder="请输入学号/工号">
+    <input id="password" name="password" type="password" placeholder="请输入密码">
+    <div id="captchaDiv">
+        <input id="captchaResponse" name="captcha" type="text" placeholder="请输入验证码">
+        <img id="captchaImg" src="{captcha_src}" alt="验证码">
+    </div>
+    <span id="msg1" style="display: {msg_display};">{message}</span>
+    <button type="submit" class="auth_login_btn primary full_width">登录</button>
+</form>
+</body>
+</html>
+"""
+
+
+class ReplayOptions:
+    """替身服务器的行为参数"""
+
+    def __init__(self, latency=0.0, latency_jitter=0.0, captcha_reject_rate=0.0,
+                 strict_captcha=False, error_rate=0.0, hang_rate=0.0, hang_seconds=30.0,
+                 balance=27.27, drain_per_login=0.0, username=None, password=None, seed=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.captcha_reject_rate = captcha_reject_rate
+        self.strict_captcha = strict_captcha
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.balance = balance
+        self.drain_per_login = drain_per_login
+        self.username = username
+        self.password = password
+        self.random = random.Random(seed)
+
+
+def load_balance_page():
+    """读取保存的充值页源码，去掉依赖外网的脚本与样式"""
+    with open(PAGE_SOURCE_PATH, 'r', encoding='utf-8') as f:
+        html = f.read()
+    html = re.sub(r'<script\b.*?</script>', '', html, flags=re.S)
+    html = re.sub(r'<link\b[^>]*>', '', html)
+    return html
+
+
+def render_captcha(text, generator=None):
+    """生成验证码图片（PNG字节）；没有Pillow时返回保存的样例图片"""
+    try:
+        from captcha_generator import CaptchaGenerator
+    except ImportError:
+        with open(CAPTCHA_SAMPLE_PATH, 'rb') as f:
+            return f.read()
+    generator = generator or CaptchaGenerator()
+    return generator.png_bytes(text)[0]
+
+
+def create_app(options=None):
+    """创建替身服务器应用"""
+    options = options or ReplayOptions()
+    app = Flask(__name__)
+    app.secret_key = secrets.token_hex(16)
+    app.config["REPLAY_OPTIONS"] = options
+    balance_page = load_balance_page()
+    state = {"balance": options.balance, "logins": 0, "captchas": 0, "rejections": 0}
+    lock = threading.Lock()
+    app.config["REPLAY_STATE"] = state
+    generator = None
+    try:
+        from captcha_generator import CaptchaGenerator
+        # 与其他随机行为共用种子，保证回放可复现
+        generator = CaptchaGenerator(seed=options.random.randrange(2 ** 32))
+    except ImportError:
+        pass
+
+    @app.before_request
+    def inject_faults():
+        """模拟网络延迟、服务器错误和请求挂起"""
+        delay = options.latency + options.random.uniform(0, options.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if options.hang_rate and options.random.random() < options.hang_rate:
+            time.sleep(options.hang_seconds)
+        if options.error_rate and options.random.random() < options.error_rate:
+            abort(503)
+
+    def login_page(message=""):
+        html = LOGIN_TEMPLATE.format(
+            action=f"{LOGIN_PATH}?service={request.args.get('service', INDEX_PATH)}",
+            captcha_src=f"{CAPTCHA_PATH}?t={time.time_ns()}",
+            msg_display="block" if message else "none",
+            message=message,
+        )
+        return make_response(html)
+
+    @app.route(INDEX_PATH)
+    def index():
+        if not session.get("logged_in"):
+            return redirect(f"{LOGIN_PATH}?service={INDEX_PATH}")
+        html = re.sub(r'剩余电量：<i>[\d.]+度</i>', f'剩余电量：<i>{state["balance"]:.2f}度</i>', balance_page)
+        return make_response(html)
+
+    @app.route(LOGIN_PATH, methods=["GET"])
+    def login_form():
+        return login_page()
+
+    @app.route(CAPTCHA_PATH)
+    def captcha():
+        text = "".join(options.random.choice(string.ascii_letters + string.digits) for _ in range(4))
+        session["captcha"] = text
+        with lock:
+            state["captchas"] += 1
+            image = render_captcha(text, generator)
+        response = make_response(image)
+        response.mimetype = "image/png"
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    @app.route(LOGIN_PATH, methods=["POST"])
+    def login_submit():
+        username = request.form.get("username", "")
+        password = request.form.get("password", "")
+        answer = request.form.get("captcha", "")
+        if (options.username is not None and username != options.username) or \
+                (options.password is not None and password != options.password):
+            return login_page("您提供的用户名或者密码有误")
+        expected = session.get("captcha", "")
+        rejected = not answer or options.random.random() < options.captcha_reject_rate
+        if options.strict_captcha and answer.lower() != expected.lower():
+            rejected = True
+        if rejected:
+            with lock:
+                state["rejections"] += 1
+            return login_page("无效的验证码")
+        session["logged_in"] = True
+        with lock:
+            state["logins"] += 1
+            state["balance"] = max(state["balance"] - options.drain_per_login, 0.0)
+        return redirect(request.args.get("service", INDEX_PATH))
+
+    @app.route("/replay/stats")
+    def stats():
+        return dict(state)
+
+    return app
+
+
+class ReplayServer:
+    """在后台线程中运行的替身服务器，便于在测试和基准中嵌入使用"""
+
+    def __init__(self, options=None, host="127.0.0.1", port=0):
+        self.app = create_app(options)
+        # 嵌入测试时不输出每个请求的访问日志
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.server = make_server(host, port, self.app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://{self.server.host}:{self.server.port}"
+
+    @property
+    def index_url(self):
+        return self.base_url + INDEX_PATH
+
+    @property
+    def state(self):
+        return self.app.config["REPLAY_STATE"]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="南京大学电费网站离线回放替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="额外的随机延迟上限（秒）")
+    parser.add_argument("--captcha-reject-rate", type=float, default=0.0, help="验证码被拒绝的概率")
+    parser.add_argument("--strict-captcha", action="store_true", help="要求验证码与图片文字一致")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503错误的概率")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="请求挂起的概率")
+    parser.add_argument("--hang-seconds", type=float, default=30.0, help="请求挂起的时长（秒）")
+    parser.add_argument("--balance", type=float, default=27.27, help="初始剩余电量（度）")
+    parser.add_argument("--drain-per-login", type=float, default=0.0, help="每次登录后减少的电量（度）")
+    parser.add_argument("--username", help="只接受该用户名（默认接受任意用户名）")
+    parser.add_argument("--password", help="只接受该密码（默认接受任意密码）")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+    args = parser.parse_args()
+
+    options = ReplayOptions(
+        latency=args.latency, latency_jitter=args.latency_jitter,
+        captcha_reject_rate=args.captcha_reject_rate, strict_captcha=args.strict_captcha,
+        error_rate=args.error_rate, hang_rate=args.hang_rate, hang_seconds=args.hang_seconds,
+        balance=args.balance, drain_per_login=args.drain_per_login,
+        username=args.username, password=args.password, seed=args.seed,
+    )
+    print(f"替身服务器已启动，监控地址: http://{args.host}:{args.port}{INDEX_PATH}")
+    create_app(options).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
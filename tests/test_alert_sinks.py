@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+告警通知通道测试脚本
+在本地启动SMTP与Webhook替身服务器，验证告警规则与通知发送流程
+"""
+
+import os
+import sys
+import json
+import socketserver
+import tempfile
+import threading
+from datetime import datetime
+from email import message_from_string
+from email.header import decode_header, make_header
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from alerting import AlertManager, AlertEngine, AlertRule, QuietHours
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    """最小化的SMTP替身：接收邮件并保存到server.messages"""
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode('utf-8'))
+
+    def handle(self):
+        self.reply("220 localhost SMTP stand-in")
+        while True:
+            line = self.rfile.readline().decode('utf-8').strip()
+            if not line:
+                return
+            command = line.split(" ", 1)[0].upper()
+            if command in ("HELO", "EHLO"):
+                self.reply("250 localhost")
+            elif command in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline().decode('utf-8')
+                    if data_line.rstrip("\r\n") == ".":
+                        break
+                    lines.append(data_line)
+                self.server.messages.append("".join(lines))
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class WebhookStandInHandler(BaseHTTPRequestHandler):
+    """Webhook替身：记录收到的JSON请求"""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.payloads.append(json.loads(self.rfile.read(length).decode('utf-8')))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_ins():
+    """启动SMTP与Webhook替身服务器，返回 (smtp服务器, webhook服务器)"""
+    smtp_server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPStandInHandler)
+    smtp_server.messages = []
+    webhook_server = HTTPServer(("127.0.0.1", 0), WebhookStandInHandler)
+    webhook_server.payloads = []
+    for server in (smtp_server, webhook_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return smtp_server, webhook_server
+
+
+def test_alert_sinks():
+    """低电量告警应通过SMTP、Webhook与文件通道各发送一次"""
+    smtp_server, webhook_server = start_stand_ins()
+    workdir = tempfile.mkdtemp()
+    alert_file = os.path.join(workdir, "alerts.jsonl")
+    config = {
+        "rules": [
+            {"name": "low_balance", "metric": "balance", "below": 20, "clear_above": 25},
+            {"name": "days_left", "metric": "days_to_empty", "below": 3},
+        ],
+        "batch_seconds": 0.5,
+        "state_path": os.path.join(workdir, "alert_state.json"),
+        "sinks": [
+            {"type": "smtp", "host": "127.0.0.1", "port": smtp_server.server_address[1],
+             "from": "monitor@localhost", "to": ["user@localhost"]},
+            {"type": "webhook", "url": f"http://127.0.0.1:{webhook_server.server_address[1]}/hook"},
+            {"type": "file", "path": alert_file},
+        ],
+    }
+    try:
+        manager = AlertManager.from_config(config)
+        manager.submit({"balance": 15.0, "forecast": {"days_to_empty": 2.0}})
+        # 重复提交同样的状态应被去重
+        manager.submit({"balance": 14.5, "forecast": {"days_to_empty": 1.9}})
+        manager.close()
+
+        assert len(smtp_server.messages) == 1, smtp_server.messages
+        mail = message_from_string(smtp_server.messages[0])
+        print(f"SMTP替身收到邮件: {make_header(decode_header(mail['Subject']))}")
+        assert len(webhook_server.payloads) == 1
+        assert len(webhook_server.payloads[0]["alerts"]) == 2
+        print(f"Webhook替身收到: {webhook_server.payloads[0]['title']}")
+        with open(alert_file, encoding='utf-8') as f:
+            assert len(f.readlines()) == 2
+
+        # 回升到解除阈值以上后应发送解除通知
+        manager = AlertManager.from_config(config)
+        manager.submit({"balance": 80.0, "forecast": {"days_to_empty": 10.0}})
+        manager.close()
+        statuses = [a["status"] for a in webhook_server.payloads[-1]["alerts"]]
+        assert statuses == ["resolved", "resolved"], statuses
+        print("✓ 告警通知通道测试通过")
+    finally:
+        smtp_server.shutdown()
+        webhook_server.shutdown()
+
+
+def test_quiet_hours_resolved():
+    """免打扰时段内解除的告警应在时段结束后补发解除通知"""
+    state_path = os.path.join(tempfile.mkdtemp(), "alert_state.json")
+    engine = AlertEngine([AlertRule("low_balance", "balance", 20, 25)], QuietHours("23:00", "07:00"), state_path)
+    fired = engine.evaluate({"balance": 15.0}, datetime(2025, 9, 20, 21, 0))
+    assert [n["status"] for n in fired] == ["firing"], fired
+    # 夜间充值：免打扰时段内不发送
+    assert engine.evaluate({"balance": 80.0}, datetime(2025, 9, 20, 23, 30)) == []
+    # 补发的解除通知在重新加载状态后仍然保留
+    engine = AlertEngine(engine.rules, engine.quiet_hours, state_path)
+    resolved = engine.evaluate({"balance": 79.0}, datetime(2025, 9, 21, 7, 30))
+    assert [n["status"] for n in resolved] == ["resolved"], resolved
+    assert resolved[0]["time"] == "2025-09-20T23:30:00" and resolved[0]["value"] == 80.0
+    assert engine.evaluate({"balance": 78.0}, datetime(2025, 9, 21, 8, 0)) == []
+
+    # 解除后在免打扰时段内再次触发：告警一直未解除，时段结束后只发送告警通知
+    engine.evaluate({"balance": 15.0}, datetime(2025, 9, 21, 21, 0))
+    engine.evaluate({"balance": 80.0}, datetime(2025, 9, 21, 23, 30))
+    assert engine.evaluate({"balance": 10.0}, datetime(2025, 9, 22, 1, 0)) == []
+    refired = engine.evaluate({"balance": 10.0}, datetime(2025, 9, 22, 7, 30))
+    assert [n["status"] for n in refired] == ["firing"], refired
+    print("✓ 免打扰时段补发解除通知测试通过")
+
+
+def test_rooms_independent():
+    """多个房间的告警状态互不影响，消息中带房间号；旧版本的状态归入默认房间"""
+    state_path = os.path.join(tempfile.mkdtemp(), "alert_state.json")
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump({"low_balance": {"active": True, "last_notified": "2025-09-20T08:00:00"}}, f)
+    engine = AlertEngine([AlertRule("low_balance", "balance", 20, 25)], state_path=state_path)
+    now = datetime(2025, 9, 20, 9, 0)
+    # 默认房间沿用旧状态，仍在冷却时间内
+    assert engine.evaluate({"balance": 15.0}, now) == []
+    fired = engine.evaluate({"balance": 15.0}, now, room="422")
+    assert [(n["status"], n["room"]) for n in fired] == [("firing", "422")], fired
+    assert fired[0]["message"].startswith("房间 422 "), fired[0]["message"]
+    # 另一个房间电量充足，不会解除422的告警
+    assert engine.evaluate({"balance": 120.0}, now, room="501") == []
+    assert engine.evaluate({"balance": 14.0}, now, room="422") == []
+    resolved = engine.evaluate({"balance": 80.0}, now)
+    assert [(n["status"], n["room"]) for n in resolved] == [("resolved", "default")], resolved
+    print("✓ 多房间告警状态测试通过")
+
+
+def main():
+    """主函数"""
+    print("=" * 60)
+    print("告警通知通道测试工具")
+    print("=" * 60)
+    print(f"开始时间: {datetime.now():%Y-%m-%d %H:%M:%S}")
+    test_alert_sinks()
+    test_quiet_hours_resolved()
+    test_rooms_independent()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,11 @@ except ImportError:
 
 import os
 import re
+import sys
+import time
+import argparse
 import numpy as np
 from PIL import Image, ImageFilter, ImageEnhance
-import easyocr
 
 # PIL兼容性补丁 - 解决ANTIALIAS被弃用的问题
 try:
@@ -31,6 +33,8 @@ try:
 except ImportError:
     pass
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
 def test_captcha_recognition(image_path="captcha_debug.png"):
     """测试验证码识别"""
     if not os.path.exists(image_path):
@@ -50,6 +54,7 @@ def test_captcha_recognition(image_path="captcha_debug.png"):
         
         # 初始化OCR读取器
         print("\n初始化OCR读取器...")
+        import easyocr
         ocr_reader = easyocr.Reader(['ch_sim', 'en'], gpu=False)
         print("✓ OCR读取器初始化成功")
         
@@ -129,9 +134,44 @@ def test_captcha_recognition(image_path="captcha_debug.png"):
     except Exception as e:
         print(f"测试过程中出现错误: {e}")
 
+def test_synthetic_captchas(count=200, seed=0, backend="easyocr"):
+    """用合成验证码测量识别准确率和速度（图像经过与监控程序相同的预处理）"""
+    from captcha_generator import CaptchaGenerator
+    from captcha_ocr import create_reader
+
+    print("=" * 60)
+    print(f"合成验证码识别基准（{count} 张，种子 {seed}，后端 {backend}）")
+    print("=" * 60)
+    start = time.perf_counter()
+    try:
+        ocr_reader = create_reader({"backend": backend})
+    except ImportError as e:
+        print(f"✗ OCR后端不可用，跳过测试: {e}")
+        return
+    print(f"模型加载耗时: {(time.perf_counter() - start) * 1000:.0f} ms（{ocr_reader.name}）")
+    correct = 0
+    start = time.perf_counter()
+    for img, label in CaptchaGenerator(seed).stream(count, preprocessed=True):
+        results = ocr_reader.readtext(np.array(img))
+        text = "".join(re.sub(r'[^a-zA-Z0-9]', '', r[1]) for r in results)
+        correct += text.lower() == label.lower()
+    elapsed = time.perf_counter() - start
+    print(f"准确率: {correct / count * 100:.1f}%（{correct}/{count}）")
+    print(f"平均识别耗时: {elapsed / count * 1000:.1f} ms/张")
+
 def main():
     """主函数"""
-    test_captcha_recognition()
+    parser = argparse.ArgumentParser(description="验证码识别测试")
+    parser.add_argument("image", nargs="?", default="captcha_debug.png", help="验证码图片")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="改为用N张合成验证码测量准确率")
+    parser.add_argument("--seed", type=int, default=0, help="合成验证码的随机数种子")
+    parser.add_argument("--backend", choices=("easyocr", "onnx"), default="easyocr", help="合成验证码测试使用的OCR后端")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        test_synthetic_captchas(args.synthetic, args.seed, args.backend)
+    else:
+        test_captcha_recognition(args.image)
     
     print("\n" + "=" * 60)
     print("测试完成！")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+读数存储并发写入测试
+多个进程同时向同一个存储追加读数（部分进程写同一个房间），
+检查没有读数丢失、记录按时间有序，并比较逐条提交与组提交的写入速度
+
+用法：
+    python tests/test_concurrent_writes.py --processes 4 --readings 200
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+
+from reading_store import ReadingStore
+
+BASE_TIME = np.datetime64('2025-01-01T00:00:00', 'us').astype(np.int64)
+
+
+def writer(path, worker, readings, group):
+    """子进程：每个进程写自己的房间，偶数号进程同时写共享房间"""
+    store = ReadingStore(path)
+    rooms = [f"room{worker}"] + (["shared"] if worker % 2 == 0 else [])
+    for i in range(readings):
+        # 时间交错，电量每两次变化一次，同时覆盖原地延长区间与追加新区间两种写入
+        timestamp = int(BASE_TIME + (i * 1000 + worker) * 1_000_000)
+        value = 100.0 - i // 2
+        for room in rooms:
+            if group:
+                with store.batch():
+                    store.append_many([timestamp], [value], room)
+            else:
+                store.append_many([timestamp], [value], room)
+
+
+def run_writers(path, processes, readings, group=False):
+    """启动多个写入进程并等待结束，返回耗时"""
+    start = time.perf_counter()
+    workers = [multiprocessing.Process(target=writer, args=(path, i, readings, group)) for i in range(processes)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+        assert p.exitcode == 0, f"写入进程异常退出: {p.exitcode}"
+    return time.perf_counter() - start
+
+
+def test_concurrent_writes(processes=4, readings=200):
+    """并发写入后读数总数应与写入总数一致，记录按开始时间有序"""
+    tmp = tempfile.mkdtemp(prefix="nju_store_")
+    try:
+        path = os.path.join(tmp, 'readings.bin')
+        elapsed = run_writers(path, processes, readings)
+        store = ReadingStore(path)
+        records = store.records()
+        shared_writers = len(range(0, processes, 2))
+        expected = processes * readings + shared_writers * readings
+        print(f"并发写入 {expected} 条读数，耗时 {elapsed:.2f}s，存储中 {len(records)} 段区间")
+        assert store.sample_count() == expected, f"读数丢失: {store.sample_count()} != {expected}"
+        assert np.all(np.diff(records['first_seen']) >= 0), "记录未按时间排序"
+        for worker in range(processes):
+            assert store.sample_count(f"room{worker}") == readings
+            assert store.value_at(store.last_checked(f"room{worker}"), f"room{worker}") == 100.0 - (readings - 1) // 2
+        print("✓ 没有读数丢失，记录按时间有序")
+
+        # 组提交：单个进程批量写入，一次加锁、一次fsync
+        batch_path = os.path.join(tmp, 'batch.bin')
+        batch_store = ReadingStore(batch_path)
+        times = BASE_TIME + np.arange(readings * 10, dtype=np.int64) * 60_000_000
+        values = 100.0 - np.arange(readings * 10) // 3
+        start = time.perf_counter()
+        for t, v in zip(times.tolist(), values.tolist()):
+            batch_store.append_many([t], [v], "single")
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        with batch_store.batch():
+            for t, v in zip(times.tolist(), values.tolist()):
+                batch_store.append_many([t], [v], "grouped")
+        grouped = time.perf_counter() - start
+        assert batch_store.sample_count("single") == batch_store.sample_count("grouped") == len(times)
+        print(f"逐条提交 {len(times)} 条: {len(times) / single:.0f} 条/秒；组提交: {len(times) / grouped:.0f} 条/秒")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="读数存储并发写入测试")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--readings", type=int, default=200)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("读数存储并发写入测试")
+    print("=" * 60)
+    test_concurrent_writes(args.processes, args.readings)
+
+
+if __name__ == "__main__":
+    main()
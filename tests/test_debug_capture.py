@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+调试现场环形缓冲区测试脚本
+验证没有失败时不产生任何文件、调试文件在后台压缩写入并可按运行ID解压读取，
+以及超过保留次数或总大小时淘汰最旧的记录
+"""
+
+import os
+import sys
+import random
+import tempfile
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from debug_capture import DebugCapture, load_index, read_artifact
+
+
+def test_happy_path(directory=None):
+    """没有记录调试现场的运行不创建目录"""
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = directory or os.path.join(tmp, 'debug_runs')
+        capture = DebugCapture("run-ok", directory)
+        capture.close()
+        assert not capture.captured and not os.path.exists(directory)
+    print("✓ 正常运行不产生调试文件")
+
+
+def test_ring_buffer(directory=None):
+    """写入、读取与淘汰"""
+    with tempfile.TemporaryDirectory() as tmp:
+        check_ring_buffer(directory or os.path.join(tmp, 'debug_runs'))
+    print("✓ 调试文件压缩写入、按运行ID读取与淘汰正常")
+
+
+def check_ring_buffer(directory):
+    """在directory中写入5次运行（最多保留3次），检查索引、解压内容与按总大小淘汰"""
+    html = "<html>" + "剩余电量：12.5度" * 2000 + "</html>"
+    for i in range(5):
+        capture = DebugCapture(f"run-{i}", directory, max_runs=3)
+        capture.add("page_source.html", html, "no_data")
+        capture.add_image("captcha_1.png", Image.new("RGB", (80, 30), "white"), "captcha_rejected")
+        capture.close()
+
+    runs = load_index(directory)["runs"]
+    assert [run["run_id"] for run in runs] == ["run-2", "run-3", "run-4"], runs
+    assert not os.path.exists(os.path.join(directory, "run-0"))
+    assert runs[-1]["reason"] == "no_data"
+    page = runs[-1]["artifacts"][0]
+    assert page["name"] == "page_source.html.gz" and page["bytes"] < len(html.encode('utf-8')) / 10
+    assert read_artifact("run-4", "page_source.html.gz", directory).decode('utf-8') == html
+    assert read_artifact("run-4", "captcha_1.png", directory).startswith(b"\x89PNG")
+
+    # 总大小上限：只保留放得下的最新记录
+    capture = DebugCapture("run-big", directory, max_bytes=1024)
+    capture.add("blob.bin", random.Random(0).randbytes(4096))
+    capture.close()
+    assert [run["run_id"] for run in load_index(directory)["runs"]] == ["run-big"]
+
+
+def main():
+    """主函数"""
+    print("=" * 60)
+    print("调试现场环形缓冲区测试")
+    print("=" * 60)
+    test_happy_path()
+    test_ring_buffer()
+
+
+if __name__ == "__main__":
+    main()
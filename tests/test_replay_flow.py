@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端离线测试与基准脚本
+在临时目录中搭建独立的运行环境（src副本、data、logs），启动回放替身服务器，
+多次运行完整的监控流程，并根据运行历史汇总各阶段耗时
+
+用法：
+    python tests/test_replay_flow.py --runs 5 --latency 0.2 --captcha-reject-rate 0.3
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from replay_server import ReplayServer, ReplayOptions
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+DEFAULT_CHROMEDRIVER = os.path.join(ROOT, 'chromedriver-win64', 'chromedriver.exe')
+
+
+def prepare_sandbox(url, chromedriver_path, extra_config=None):
+    """复制源码并写入指向替身服务器的配置，数据与日志都写在临时目录中"""
+    sandbox = tempfile.mkdtemp(prefix="nju_replay_")
+    shutil.copytree(os.path.join(ROOT, 'src'), os.path.join(sandbox, 'src'),
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    os.makedirs(os.path.join(sandbox, 'data'))
+    os.makedirs(os.path.join(sandbox, 'logs'))
+    models = os.path.join(ROOT, 'models')
+    if os.path.isdir(models):
+        # 复用已下载的OCR模型，避免每次测试重新下载
+        shutil.copytree(models, os.path.join(sandbox, 'models'))
+    config = {
+        "url": url,
+        "chromedriver_path": chromedriver_path,
+        "username": "replay",
+        "password": "replay",
+        "auto_login": True,
+        "headless_mode": True,
+        "captcha_retry_count": 5,
+        "save_captcha_images": False,
+        "log_level": "INFO",
+        **(extra_config or {}),
+    }
+    with open(os.path.join(sandbox, 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=4, ensure_ascii=False)
+    return sandbox
+
+
+def run_monitor(sandbox, timeout=600):
+    """在沙箱中运行一次完整的监控流程"""
+    script = os.path.join(sandbox, 'src', 'nju_electric_monitor_auto.py')
+    return subprocess.run(
+        [sys.executable, script, os.path.join(sandbox, 'config.json')],
+        cwd=sandbox, stdin=subprocess.DEVNULL, timeout=timeout,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    ).returncode
+
+
+def load_run_history(sandbox):
+    """读取沙箱中的运行历史"""
+    path = os.path.join(sandbox, 'data', 'run_history.jsonl')
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records):
+    """汇总运行结果与各阶段耗时"""
+    outcomes = {}
+    stages = {}
+    for record in records:
+        outcomes[record["outcome"]] = outcomes.get(record["outcome"], 0) + 1
+        for stage, seconds in record["stages"].items():
+            stages.setdefault(stage, []).append(seconds)
+    print(f"\n运行结果: {outcomes}")
+    if records:
+        durations = [r["duration"] for r in records]
+        print(f"总耗时: 平均 {statistics.mean(durations):.2f}s，最长 {max(durations):.2f}s")
+    print("各阶段耗时（秒）:")
+    for stage, values in stages.items():
+        print(f"  {stage:<14} 平均 {statistics.mean(values):7.3f}  最长 {max(values):7.3f}")
+    return outcomes
+
+
+def run_replay_flow(runs=1, options=None, chromedriver_path=DEFAULT_CHROMEDRIVER, keep=False):
+    """对替身服务器运行runs次完整流程，返回 (运行历史, 运行结果统计)"""
+    options = options or ReplayOptions(seed=0)
+    with ReplayServer(options) as server:
+        sandbox = prepare_sandbox(server.index_url, os.path.abspath(chromedriver_path))
+        try:
+            for i in range(runs):
+                print(f"第 {i + 1}/{runs} 次运行...")
+                run_monitor(sandbox)
+            records = load_run_history(sandbox)
+            print(f"替身服务器统计: {server.state}")
+            return records, summarize(records)
+        finally:
+            if keep:
+                print(f"沙箱目录已保留: {sandbox}")
+            else:
+                shutil.rmtree(sandbox, ignore_errors=True)
+
+
+def check_replay_flow(runs=1, options=None, chromedriver_path=DEFAULT_CHROMEDRIVER, keep=False):
+    """每次运行都应写入运行历史；替身服务器不注入错误与卡死时所有运行都应成功保存电量"""
+    options = options or ReplayOptions(seed=0)
+    records, outcomes = run_replay_flow(runs, options, chromedriver_path, keep)
+    assert len(records) == runs, f"运行历史记录数 {len(records)} 与运行次数 {runs} 不一致"
+    if options.error_rate == 0 and options.hang_rate == 0:
+        assert outcomes.get("success") == runs, outcomes
+
+
+def test_replay_flow():
+    """对替身服务器运行一次完整流程；没有ChromeDriver时跳过"""
+    # pytest只在以pytest运行时需要，直接运行脚本时不导入
+    import pytest
+    if not os.path.exists(DEFAULT_CHROMEDRIVER):
+        pytest.skip(f"找不到ChromeDriver {DEFAULT_CHROMEDRIVER}")
+    check_replay_flow()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="基于回放替身服务器的端到端测试与基准")
+    parser.add_argument("--runs", type=int, default=3, help="运行次数")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--captcha-reject-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--chromedriver", default=DEFAULT_CHROMEDRIVER, help="ChromeDriver路径")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="保留沙箱目录以便查看日志")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("端到端离线测试")
+    print("=" * 60)
+    options = ReplayOptions(
+        latency=args.latency, captcha_reject_rate=args.captcha_reject_rate,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+    if not os.path.exists(args.chromedriver):
+        print(f"跳过：找不到ChromeDriver {args.chromedriver}")
+        return
+    check_replay_flow(args.runs, options, args.chromedriver, args.keep)
+
+
+if __name__ == "__main__":
+    main()
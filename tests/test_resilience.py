@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+容错层测试脚本
+验证错误分类、各类错误的重试预算与退避、熔断器的打开/冷却/探测/恢复，
+以及对本地替身HTTP服务器的轻量探测（不需要浏览器）
+"""
+
+import os
+import sys
+import random
+import socket
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from resilience import (RetryBudget, CircuitBreaker, SiteTimeout, SiteUnavailable, AuthFailed,
+                        ParseFailed, classify, probe)
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """返回server.status指定的状态码"""
+
+    def do_GET(self):
+        self.send_response(self.server.status)
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def status_server(status=200):
+    """在后台线程中运行的本地替身HTTP服务器，产出服务器对象（可修改status）"""
+    server = HTTPServer(("127.0.0.1", 0), StatusHandler)
+    server.status = status
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def free_port():
+    """一个当前没有监听的本地端口"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_retry_budget():
+    """可重试的错误按预算重试，预算耗尽或不可重试的错误直接抛出"""
+    sleeps = []
+    budget = RetryBudget({"timeout": {"attempts": 3, "base_delay": 2, "max_delay": 5}},
+                         sleep=sleeps.append, rng=random.Random(1))
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise TimeoutError("read timed out")
+        return "ok"
+
+    assert budget.call("open_page", flaky) == "ok"
+    assert len(sleeps) == 2 and sleeps[0] <= 2 and sleeps[1] <= 4, sleeps
+    # 同一次运行内预算共享：超时预算已用完
+    try:
+        budget.call("extract", lambda: (_ for _ in ()).throw(TimeoutError("timed out")))
+        raise AssertionError("预算耗尽后应抛出异常")
+    except SiteTimeout as e:
+        assert e.step == "extract"
+
+    auth_calls = []
+
+    def wrong_password():
+        auth_calls.append(1)
+        raise AuthFailed("您提供的用户名或者密码有误")
+
+    try:
+        budget.call("login", wrong_password)
+    except AuthFailed:
+        pass
+    assert len(auth_calls) == 1, "认证失败不应重试"
+
+    refreshed = []
+    pages = iter([None, 42.0])
+
+    def extract():
+        value = next(pages)
+        if value is None:
+            raise ParseFailed("页面中未找到剩余电量")
+        return value
+
+    assert budget.call("extract", extract, on_retry=lambda: refreshed.append(1)) == 42.0
+    assert refreshed == [1]
+
+    assert classify(ConnectionRefusedError()) == "unavailable"
+    assert classify(Exception("unknown error: net::ERR_CONNECTION_RESET")) == "unavailable"
+    assert classify(ValueError("bad")) is None
+    print("✓ 错误分类与重试预算正常")
+
+
+def test_probe():
+    """HTTP 503视为网站不可用"""
+    with status_server(503) as server:
+        try:
+            probe(f"http://127.0.0.1:{server.server_port}/", timeout=2)
+            raise AssertionError("HTTP 503 应视为网站不可用")
+        except SiteUnavailable:
+            pass
+    print("✓ 探测识别网站不可用")
+
+
+def test_circuit_breaker():
+    """连续故障后打开熔断器，冷却结束后探测，探测失败时冷却时间加倍"""
+    with status_server() as server, tempfile.TemporaryDirectory() as tmp:
+        url_up = f"http://127.0.0.1:{server.server_port}/"
+        url_down = f"http://127.0.0.1:{free_port()}/"
+        path = os.path.join(tmp, 'breaker.json')
+        breaker = CircuitBreaker(path, failure_threshold=2, cooldown_seconds=60, max_cooldown_seconds=200)
+        now = 1_000_000.0
+        assert not breaker.record_failure("parse_failed", "与网站可用性无关", now=now)
+        assert not breaker.record_failure("timeout", "第一次", now=now)
+        assert breaker.record_failure("unavailable", "第二次", now=now)
+        # 状态持久化，下一次运行（新进程）仍处于熔断中
+        breaker = CircuitBreaker(path, failure_threshold=2, cooldown_seconds=60, max_cooldown_seconds=200)
+        assert breaker.check(now + 30) == "open"
+        assert breaker.check(now + 61) == "half_open"
+
+        try:
+            probe(url_down, timeout=2)
+            raise AssertionError("探测未启动的端口应失败")
+        except SiteUnavailable as e:
+            breaker.record_failure(e.kind, str(e), now=now + 61)
+        assert breaker.state["cooldown"] == 120
+        breaker.record_failure("timeout", now=now + 200)
+        assert breaker.state["cooldown"] == 200, "冷却时间不应超过上限"
+
+        assert probe(url_up, timeout=2) == 200
+        breaker.record_success()
+        assert CircuitBreaker(path).check() == "closed"
+    print("✓ 熔断器打开、冷却、探测与恢复正常")
+
+
+def main():
+    """主函数"""
+    print("=" * 60)
+    print("容错层测试")
+    print("=" * 60)
+    test_retry_budget()
+    test_probe()
+    test_circuit_breaker()
+
+
+if __name__ == "__main__":
+    main()